@@ -1,8 +1,23 @@
 # evaluate_results.py
-import librosa
+import os
+import glob
+import argparse
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.spatial.distance import cosine
+
+from voice_features import VoiceFeatureExtractor
+
+# Shared so reference features are extracted once per process
+_extractor = None
+
+def get_extractor():
+    global _extractor
+    if _extractor is None:
+        _extractor = VoiceFeatureExtractor()
+    return _extractor
+
+def quality_rating(similarity):
+    return 'Excellent' if similarity > 0.8 else 'Good' if similarity > 0.6 else 'Needs improvement'
 
 def evaluate_voice_similarity(original_path, generated_path):
     """
@@ -10,38 +25,51 @@ def evaluate_voice_similarity(original_path, generated_path):
     """
     print("🔍 Evaluating voice similarity...")
     
-    # Load both audio files
-    orig_audio, sr1 = librosa.load(original_path, sr=24000)
-    gen_audio, sr2 = librosa.load(generated_path, sr=24000)
+    # Cosine similarity of mean MFCC, spectral centroid and rolloff
+    similarity = float(evaluate_similarity_matrix([generated_path], [original_path])[0, 0])
     
-    # Extract features for comparison
-    def extract_features(audio, sr):
-        # MFCC features (voice characteristics)
-        mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=13)
-        
-        # Spectral features
-        spectral_centroid = librosa.feature.spectral_centroid(y=audio, sr=sr)
-        spectral_rolloff = librosa.feature.spectral_rolloff(y=audio, sr=sr)
-        
-        # Combine features
-        features = np.concatenate([
-            np.mean(mfccs, axis=1),
-            np.mean(spectral_centroid),
-            np.mean(spectral_rolloff)
-        ])
-        
-        return features
+    print(f"Voice similarity score: {similarity:.3f}")
+    print(f"Quality rating: {quality_rating(similarity)}")
     
-    orig_features = extract_features(orig_audio, sr1)
-    gen_features = extract_features(gen_audio, sr2)
+    return similarity
+
+def evaluate_similarity_matrix(generated_paths, reference_paths, extractor=None):
+    """
+    Similarity of every generated clip to every reference clip as an
+    N x M matrix (rows follow generated_paths, columns reference_paths).
+    Features for all clips are extracted in batches; references already
+    seen by the extractor are not recomputed.
+    """
+    extractor = extractor or get_extractor()
+    return extractor.similarity_matrix(list(generated_paths), list(reference_paths))
+
+def evaluate_output_directory(output_dir, reference_paths, pattern="*.wav", extractor=None):
+    """
+    Score every clip in output_dir against the references in one pass.
+    Returns {file: {"similarity": best score, "reference": closest
+    reference, "rating": ...}}.
+    """
+    generated_paths = sorted(glob.glob(os.path.join(output_dir, pattern)))
+    if not generated_paths:
+        print(f"❌ No files matching {pattern} in {output_dir}")
+        return {}
     
-    # Calculate similarity
-    similarity = 1 - cosine(orig_features, gen_features)
+    print(f"🔍 Scoring {len(generated_paths)} clips against {len(reference_paths)} reference(s)...")
+    matrix = evaluate_similarity_matrix(generated_paths, reference_paths, extractor)
     
-    print(f"Voice similarity score: {similarity:.3f}")
-    print(f"Quality rating: {'Excellent' if similarity > 0.8 else 'Good' if similarity > 0.6 else 'Needs improvement'}")
+    scores = {}
+    for path, row in zip(generated_paths, matrix):
+        best = int(np.argmax(row))
+        scores[path] = {
+            "similarity": float(row[best]),
+            "reference": reference_paths[best],
+            "rating": quality_rating(row[best])
+        }
+        print(f"  {os.path.basename(path):40s} {row[best]:.3f}  {scores[path]['rating']}")
     
-    return similarity
+    mean = float(np.mean(matrix.max(axis=1)))
+    print(f"📊 Mean best similarity: {mean:.3f} ({quality_rating(mean)})")
+    return scores
 
 def create_evaluation_report(results_dir="./"):
     """
@@ -80,6 +108,13 @@ def create_evaluation_report(results_dir="./"):
     print("✅ Evaluation report saved: evaluation_report.json")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate generated voice clips")
+    parser.add_argument("--outputs", metavar="DIR", help="Score every WAV in DIR against --reference")
+    parser.add_argument("--reference", nargs="+", default=["processed_voice_sample.wav"])
+    args = parser.parse_args()
+    
     # Evaluate results (update paths as needed)
     # similarity = evaluate_voice_similarity("original_sample.wav", "generated_sample.wav")
+    if args.outputs:
+        evaluate_output_directory(args.outputs, args.reference)
     create_evaluation_report()
\ No newline at end of file
@@ -0,0 +1,174 @@
+# audio_codec.py
+# Audio codecs that turn 24 kHz clips into Orpheus audio tokens and back
+
+import numpy as np
+
+# Orpheus lays SNAC codes out as 7 tokens per frame, each position in its
+# own 4096-entry range starting after the text vocabulary
+AUDIO_TOKEN_OFFSET = 128266
+CODEBOOK_SIZE = 4096
+TOKENS_PER_FRAME = 7
+SAMPLES_PER_FRAME = 2048
+
+def flatten_snac_codes(c0, c1, c2):
+    """
+    Interleave SNAC's three code levels (n, 2n and 4n codes) into the
+    Orpheus 7-tokens-per-frame order, with per-position offsets
+    """
+    frames = np.stack([
+        c0, c1[0::2], c2[0::4], c2[1::4], c1[1::2], c2[2::4], c2[3::4]
+    ], axis=1)
+    offsets = AUDIO_TOKEN_OFFSET + CODEBOOK_SIZE * np.arange(TOKENS_PER_FRAME)
+    return (frames + offsets).astype(np.int32).reshape(-1)
+
+def unflatten_snac_codes(tokens):
+    """
+    Inverse of flatten_snac_codes: Orpheus audio tokens -> SNAC's three
+    code levels. Tokens outside the audio range are ignored, as are frames
+    with a token in the wrong position and an incomplete trailing frame.
+    """
+    tokens = np.asarray(tokens, dtype=np.int64)
+    tokens = tokens[(tokens >= AUDIO_TOKEN_OFFSET) &
+                    (tokens < AUDIO_TOKEN_OFFSET + CODEBOOK_SIZE * TOKENS_PER_FRAME)]
+    n_frames = len(tokens) // TOKENS_PER_FRAME
+    frames = tokens[:n_frames * TOKENS_PER_FRAME].reshape(n_frames, TOKENS_PER_FRAME)
+    frames = frames - (AUDIO_TOKEN_OFFSET + CODEBOOK_SIZE * np.arange(TOKENS_PER_FRAME))
+    frames = frames[((frames >= 0) & (frames < CODEBOOK_SIZE)).all(axis=1)]
+    
+    c0 = frames[:, 0]
+    c1 = np.stack([frames[:, 1], frames[:, 4]], axis=1).reshape(-1)
+    c2 = np.stack([frames[:, 2], frames[:, 3], frames[:, 5], frames[:, 6]], axis=1).reshape(-1)
+    return c0, c1, c2
+
+class SnacEncoder:
+    """
+    The SNAC 24 kHz codec Orpheus was trained with. torch and snac are
+    imported on first use so the rest of the pipeline works without them.
+    """
+    
+    name = "snac_24khz"
+    sample_rate = 24000
+    
+    def __init__(self, device="cpu"):
+        self.device = device
+        self.model = None
+    
+    def _load(self):
+        import torch
+        from snac import SNAC
+        
+        self.torch = torch
+        self.model = SNAC.from_pretrained("hubertsiuzdak/snac_24khz").eval().to(self.device)
+    
+    def encode(self, audio):
+        """Float32 mono clip at 24 kHz -> int32 Orpheus audio tokens"""
+        if self.model is None:
+            self._load()
+        waveform = self.torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32))
+        with self.torch.inference_mode():
+            codes = self.model.encode(waveform.view(1, 1, -1).to(self.device))
+        c0, c1, c2 = (level[0].cpu().numpy() for level in codes)
+        return flatten_snac_codes(c0, c1, c2)
+
+class HashEncoder:
+    """
+    Deterministic local stand-in for SnacEncoder, for tests and dry runs.
+    Emits the same token layout and rate (7 tokens per 2048 samples), with
+    each token a quantized level of one slice of the frame.
+    """
+    
+    name = "hash"
+    sample_rate = 24000
+    
+    def encode(self, audio):
+        audio = np.asarray(audio, dtype=np.float32)
+        n_frames = max(1, -(-len(audio) // SAMPLES_PER_FRAME))
+        frames = np.zeros(n_frames * SAMPLES_PER_FRAME, dtype=np.float32)
+        frames[:len(audio)] = audio
+        
+        # 7 slices per frame; the last 2048 % 7 samples of each frame are ignored
+        slice_len = SAMPLES_PER_FRAME // TOKENS_PER_FRAME
+        slices = frames.reshape(n_frames, SAMPLES_PER_FRAME)[:, :slice_len * TOKENS_PER_FRAME]
+        slices = slices.reshape(n_frames, TOKENS_PER_FRAME, slice_len)
+        rms = np.sqrt(np.mean(np.square(slices), axis=2))
+        codes = np.minimum((rms / 0.5 * (CODEBOOK_SIZE - 1)).astype(np.int64), CODEBOOK_SIZE - 1)
+        
+        offsets = AUDIO_TOKEN_OFFSET + CODEBOOK_SIZE * np.arange(TOKENS_PER_FRAME)
+        return (codes + offsets).astype(np.int32).reshape(-1)
+
+class SnacDecoder:
+    """Orpheus audio tokens -> 24 kHz audio through SNAC (loaded on first use)"""
+    
+    name = "snac_24khz"
+    sample_rate = 24000
+    
+    def __init__(self, device="cpu"):
+        self.device = device
+        self.model = None
+    
+    def _load(self):
+        import torch
+        from snac import SNAC
+        
+        self.torch = torch
+        self.model = SNAC.from_pretrained("hubertsiuzdak/snac_24khz").eval().to(self.device)
+    
+    def decode(self, tokens):
+        """int Orpheus audio tokens -> float32 mono clip (2048 samples per frame)"""
+        c0, c1, c2 = unflatten_snac_codes(tokens)
+        if len(c0) == 0:
+            return np.zeros(0, dtype=np.float32)
+        if self.model is None:
+            self._load()
+        codes = [self.torch.from_numpy(level).view(1, -1).to(self.device) for level in (c0, c1, c2)]
+        with self.torch.inference_mode():
+            audio = self.model.decode(codes)
+        return audio.view(-1).cpu().numpy().astype(np.float32)
+
+class HashDecoder:
+    """
+    Deterministic local stand-in for SnacDecoder. Renders each of a frame's
+    7 slices as a tone whose RMS is the level HashEncoder quantized, so
+    HashEncoder -> HashDecoder roughly preserves the loudness envelope.
+    """
+    
+    name = "hash"
+    sample_rate = 24000
+    
+    def decode(self, tokens):
+        c0, c1, c2 = unflatten_snac_codes(tokens)
+        n_frames = len(c0)
+        frames = np.stack([
+            c0, c1[0::2], c2[0::4], c2[1::4], c1[1::2], c2[2::4], c2[3::4]
+        ], axis=1) if n_frames else np.zeros((0, TOKENS_PER_FRAME), dtype=np.int64)
+        rms = frames / (CODEBOOK_SIZE - 1) * 0.5
+        
+        slice_len = SAMPLES_PER_FRAME // TOKENS_PER_FRAME
+        t = np.arange(SAMPLES_PER_FRAME) / self.sample_rate
+        # Each sample takes its slice's level; the remainder reuses the last slice
+        slice_of = np.minimum(np.arange(SAMPLES_PER_FRAME) // slice_len, TOKENS_PER_FRAME - 1)
+        envelope = rms[:, slice_of] * np.sqrt(2)
+        audio = envelope * np.sin(2 * np.pi * 220.0 * t)
+        return audio.reshape(-1).astype(np.float32)
+
+ENCODERS = {
+    SnacEncoder.name: SnacEncoder,
+    HashEncoder.name: HashEncoder
+}
+
+DECODERS = {
+    SnacDecoder.name: SnacDecoder,
+    HashDecoder.name: HashDecoder
+}
+
+def get_encoder(name="snac_24khz", **kwargs):
+    """Instantiate an encoder by name"""
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown codec: {name} (choose from {', '.join(ENCODERS)})")
+    return ENCODERS[name](**kwargs)
+
+def get_decoder(name="snac_24khz", **kwargs):
+    """Instantiate a decoder by name"""
+    if name not in DECODERS:
+        raise ValueError(f"Unknown codec: {name} (choose from {', '.join(DECODERS)})")
+    return DECODERS[name](**kwargs)
@@ -0,0 +1,171 @@
+# audio_dedup.py
+# Near-duplicate clip detection: spectral-peak landmark fingerprints, MinHash signatures, LSH buckets
+
+import os
+import argparse
+import numpy as np
+import librosa
+from scipy.ndimage import maximum_filter
+
+FINGERPRINT_VERSION = 1
+N_FFT = 1024
+HOP_LENGTH = 256
+MAX_FREQ = 4000.0
+# Peaks are local maxima over this many (frequency bins, frames)
+PEAK_NEIGHBORHOOD = (9, 9)
+PEAKS_PER_SECOND = 20
+PEAK_TOP_DB = 50.0
+# Each peak pairs with up to FAN_OUT later peaks at most MAX_DT frames / MAX_DF bins away
+FAN_OUT = 8
+MAX_DT = 48
+MAX_DF = 48
+# Time steps are hashed in units of DT_QUANT frames, so a peak landing one
+# frame over (a sub-hop shift, e.g. from added leading silence) still matches
+DT_QUANT = 3
+MIN_LANDMARKS = 20
+NUM_PERM = 192
+LSH_BANDS = 64
+# Unrelated clips share at most a few percent of landmarks
+DUPLICATE_THRESHOLD = 0.3
+
+# Multiply-shift hash family (odd 64-bit multipliers, arithmetic wraps mod 2**64)
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(0, 1 << 63, size=NUM_PERM, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+_PERM_B = _rng.randint(0, 1 << 63, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+def landmarks(audio, sr=24000):
+    """
+    Set of landmark hashes for a clip: the strongest spectral peaks below
+    MAX_FREQ, paired with nearby later peaks, each pair hashed as (first
+    peak frequency, frequency step, time step). Pairs only encode relative
+    time, so the set does not change with leading silence or trimming
+    elsewhere, and peaks do not change with gain or re-encoding.
+    """
+    if sr != 24000:
+        audio = librosa.resample(audio, orig_sr=sr, target_sr=24000)
+    magnitude = np.abs(librosa.stft(np.asarray(audio, dtype=np.float32), n_fft=N_FFT, hop_length=HOP_LENGTH))
+    magnitude = magnitude[:int(MAX_FREQ / 24000 * N_FFT)]
+    if not magnitude.size or not magnitude.any():
+        return np.zeros(0, dtype=np.uint64)
+    
+    level = librosa.amplitude_to_db(magnitude, ref=np.max)
+    is_peak = (level == maximum_filter(level, size=PEAK_NEIGHBORHOOD)) & (level > -PEAK_TOP_DB)
+    freqs, frames = np.nonzero(is_peak)
+    keep = max(1, int(PEAKS_PER_SECOND * magnitude.shape[1] * HOP_LENGTH / 24000))
+    strongest = np.argsort(-level[freqs, frames], kind="stable")[:keep]
+    order = strongest[np.lexsort((freqs[strongest], frames[strongest]))]
+    freqs, frames = freqs[order].astype(np.int64), frames[order].astype(np.int64)
+    
+    hashes = []
+    for offset in range(1, FAN_OUT + 1):
+        dt = frames[offset:] - frames[:-offset]
+        df = freqs[offset:] - freqs[:-offset]
+        valid = (dt > 0) & (dt <= MAX_DT) & (np.abs(df) <= MAX_DF)
+        hashes.append((freqs[:-offset][valid] << 16) | ((df[valid] + MAX_DF) << 8)
+                      | ((dt[valid] + DT_QUANT // 2) // DT_QUANT))
+    return np.unique(np.concatenate(hashes)).astype(np.uint64)
+
+def minhash(hashes):
+    """NUM_PERM-value MinHash signature of a hash set; None if it is too small to tell clips apart"""
+    if len(hashes) < MIN_LANDMARKS:
+        return None
+    values = (np.asarray(hashes, dtype=np.uint64)[:, None] * _PERM_A + _PERM_B) >> np.uint64(32)
+    return values.min(axis=0).astype(np.uint32)
+
+def fingerprint_file(path, sr=24000):
+    """MinHash signature of an audio file's landmarks, as a list (None if it has too few)"""
+    signature = minhash(landmarks(librosa.load(path, sr=sr)[0], sr))
+    return None if signature is None else signature.tolist()
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures' landmark sets"""
+    return float(np.mean(np.asarray(a) == np.asarray(b)))
+
+class LSHIndex:
+    """
+    Banded locality-sensitive hashing over MinHash signatures: each of
+    LSH_BANDS bands is a bucket key, and only clips sharing a bucket in
+    some band become candidate pairs. With 3 rows per band, pairs at
+    Jaccard 0.3 collide with probability about 0.83 and 0.4 about 0.98,
+    while unrelated pairs (0.05) collide about 1% of the time, so the
+    candidates verified stay far below all N^2 pairs.
+    """
+    
+    def __init__(self, bands=LSH_BANDS):
+        if NUM_PERM % bands:
+            raise ValueError(f"bands must divide NUM_PERM ({NUM_PERM})")
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+    
+    def add(self, key, signature):
+        signature = np.asarray(signature, dtype=np.uint32)
+        self.signatures[key] = signature
+        for band, bucket in enumerate(self.buckets):
+            bucket.setdefault(signature[band * self.rows:(band + 1) * self.rows].tobytes(), []).append(key)
+    
+    def candidate_pairs(self):
+        """Pairs of keys sharing at least one bucket"""
+        pairs = set()
+        for bucket in self.buckets:
+            for keys in bucket.values():
+                for i in range(len(keys)):
+                    for j in range(i + 1, len(keys)):
+                        pairs.add((keys[i], keys[j]))
+        return pairs
+
+def find_duplicates(signatures, threshold=DUPLICATE_THRESHOLD):
+    """
+    Clusters of near-duplicate clips. signatures: {name: signature or None},
+    in priority order. LSH candidates whose estimated similarity reaches
+    threshold are linked, and linked clips form a cluster. Returns a list
+    of {"keep", "duplicates", "similarity"} (keep is the first clip of the
+    cluster in signatures order; similarity is the lowest linking score).
+    """
+    names = [name for name, signature in signatures.items() if signature is not None]
+    position = {name: i for i, name in enumerate(names)}
+    index = LSHIndex()
+    for name in names:
+        index.add(name, signatures[name])
+    
+    parent = list(range(len(names)))
+    
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    links = []
+    for a, b in index.candidate_pairs():
+        score = similarity(index.signatures[a], index.signatures[b])
+        if score >= threshold:
+            links.append((position[a], position[b], score))
+            ra, rb = root(position[a]), root(position[b])
+            parent[max(ra, rb)] = min(ra, rb)
+    
+    clusters = {}
+    for i in range(len(names)):
+        clusters.setdefault(root(i), []).append(i)
+    weakest = {}
+    for a, _, score in links:
+        weakest[root(a)] = min(weakest.get(root(a), 1.0), score)
+    
+    return [{"keep": names[members[0]],
+             "duplicates": [names[i] for i in members[1:]],
+             "similarity": round(weakest[cluster], 3)}
+            for cluster, members in sorted(clusters.items()) if len(members) > 1]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find near-duplicate clips in a directory")
+    parser.add_argument("directory", nargs="?", default="processed_samples")
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD)
+    args = parser.parse_args()
+    
+    files = sorted(f for f in os.listdir(args.directory) if f.lower().endswith(".wav"))
+    clusters = find_duplicates({f: fingerprint_file(os.path.join(args.directory, f)) for f in files},
+                               args.threshold)
+    print(f"🔍 {len(clusters)} duplicate cluster(s) among {len(files)} clips")
+    for cluster in clusters:
+        print(f"  {cluster['keep']} ~ {', '.join(cluster['duplicates'])} (similarity >= {cluster['similarity']})")
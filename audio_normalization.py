@@ -0,0 +1,174 @@
+# audio_normalization.py
+# Shared loudness normalization for single clips and padded batches
+
+import numpy as np
+from scipy.signal import lfilter
+
+NORMALIZATION_DEFAULTS = {
+    "method": "rms",
+    "target": 0.1,
+    "remove_dc": True,
+    "peak_limit": 0.99
+}
+
+def _biquad_high_shelf(sr, fc=1500.0, gain_db=4.0, q=1 / np.sqrt(2)):
+    """K-weighting stage 1 (head-related high shelf) for any sample rate"""
+    A = 10 ** (gain_db / 40)
+    w0 = 2 * np.pi * fc / sr
+    alpha = np.sin(w0) / (2 * q)
+    cos_w0 = np.cos(w0)
+    b = [A * ((A + 1) + (A - 1) * cos_w0 + 2 * np.sqrt(A) * alpha),
+         -2 * A * ((A - 1) + (A + 1) * cos_w0),
+         A * ((A + 1) + (A - 1) * cos_w0 - 2 * np.sqrt(A) * alpha)]
+    a = [(A + 1) - (A - 1) * cos_w0 + 2 * np.sqrt(A) * alpha,
+         2 * ((A - 1) - (A + 1) * cos_w0),
+         (A + 1) - (A - 1) * cos_w0 - 2 * np.sqrt(A) * alpha]
+    return np.array(b) / a[0], np.array(a) / a[0]
+
+def _biquad_high_pass(sr, fc=38.0, q=0.5):
+    """K-weighting stage 2 (RLB high pass) for any sample rate"""
+    w0 = 2 * np.pi * fc / sr
+    alpha = np.sin(w0) / (2 * q)
+    cos_w0 = np.cos(w0)
+    b = [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2]
+    a = [1 + alpha, -2 * cos_w0, 1 - alpha]
+    return np.array(b) / a[0], np.array(a) / a[0]
+
+def integrated_loudness(batch, mask, sr, block_seconds=0.4):
+    """
+    LUFS-style integrated loudness per row: K-weighted mean square over
+    non-overlapping 400 ms blocks with the BS.1770 absolute (-70 LUFS) and
+    relative (-10 LU) gates. Rows shorter than one block are measured ungated.
+    """
+    # Both K-weighting stages as one 4th-order causal filter, so trailing
+    # padding never leaks into valid samples
+    (b1, a1), (b2, a2) = _biquad_high_shelf(sr), _biquad_high_pass(sr)
+    weighted = lfilter(np.convolve(b1, b2), np.convolve(a1, a2), batch, axis=1)
+    power = np.square(weighted, dtype=np.float64) * mask
+    
+    lengths = mask.sum(axis=1)
+    ungated = power.sum(axis=1) / np.maximum(lengths, 1)
+    
+    block = int(sr * block_seconds)
+    n_blocks = batch.shape[1] // block
+    if n_blocks == 0:
+        return -0.691 + 10 * np.log10(np.maximum(ungated, 1e-20))
+    
+    shape = (batch.shape[0], n_blocks, block)
+    block_power = power[:, :n_blocks * block].reshape(shape).mean(axis=2)
+    block_valid = mask[:, :n_blocks * block].reshape(shape).all(axis=2)
+    block_loudness = -0.691 + 10 * np.log10(np.maximum(block_power, 1e-20))
+    
+    gated = block_valid & (block_loudness > -70)
+    abs_mean = (block_power * gated).sum(axis=1) / np.maximum(gated.sum(axis=1), 1)
+    relative_gate = -0.691 + 10 * np.log10(np.maximum(abs_mean, 1e-20)) - 10
+    gated &= block_loudness > relative_gate[:, None]
+    
+    gated_count = gated.sum(axis=1)
+    mean_power = np.where(
+        gated_count > 0,
+        (block_power * gated).sum(axis=1) / np.maximum(gated_count, 1),
+        ungated
+    )
+    return -0.691 + 10 * np.log10(np.maximum(mean_power, 1e-20))
+
+def _row_gains(audio, counts, valid, sr, method, target, peak_limit):
+    """
+    Per-row gains for an already DC-corrected, zero-padded block of rows
+    """
+    if method == "rms":
+        level = np.sqrt(np.einsum('ij,ij->i', audio, audio).astype(np.float64) / counts)
+        gain = np.divide(target, level, out=np.ones_like(level), where=level > 0)
+    elif method == "peak":
+        level = np.maximum(audio.max(axis=1), -audio.min(axis=1)).astype(np.float64)
+        gain = np.divide(target, level, out=np.ones_like(level), where=level > 0)
+    elif method == "lufs":
+        loudness = integrated_loudness(audio, valid(), sr)
+        gain = np.where(loudness <= -70, 1.0, 10 ** ((target - loudness) / 20))
+    else:
+        raise ValueError(f"Unknown normalization method: {method}")
+    
+    if peak_limit is not None:
+        peaks = np.maximum(audio.max(axis=1), -audio.min(axis=1)) * gain
+        gain = np.where(peaks > peak_limit, gain * peak_limit / np.maximum(peaks, 1e-20), gain)
+    
+    return gain
+
+def normalize_batch(batch, lengths=None, mask=None, sr=24000, method="rms", target=0.1,
+                    remove_dc=True, peak_limit=0.99, copy=True, tile_samples=1 << 18):
+    """
+    Normalize a padded (n_clips, n_samples) batch with vectorized row operations.
+    
+    Valid samples are given by mask (bool, same shape) or lengths (per row);
+    padding is zeroed in the output. method is "rms" (target linear RMS),
+    "peak" (target linear peak) or "lufs" (target integrated loudness in
+    LUFS). If a gain would push a row's peak above peak_limit, that row's
+    gain is reduced. Silent rows are left unchanged. copy=False normalizes
+    a float32 batch in place.
+    
+    Rows are processed in tiles of about tile_samples so each tile stays in
+    cache across the statistics and gain passes. Batches of similar-length
+    clips (sorted by length) waste the least work on padding.
+    """
+    batch = np.asarray(batch)
+    if batch.ndim != 2:
+        raise ValueError(f"Expected a 2-D (clips, samples) batch, got shape {batch.shape}")
+    if method not in ("rms", "peak", "lufs"):
+        raise ValueError(f"Unknown normalization method: {method}")
+    
+    audio = np.array(batch, dtype=np.float32, copy=copy or batch.dtype != np.float32)
+    n_rows, n_samples = audio.shape
+    
+    if mask is None:
+        if lengths is None:
+            lengths = np.full(n_rows, n_samples)
+        lengths = np.asarray(lengths)
+    else:
+        mask = np.asarray(mask, dtype=bool)
+        lengths = mask.sum(axis=1)
+    
+    rows_per_tile = max(1, tile_samples // max(n_samples, 1))
+    for start in range(0, n_rows, rows_per_tile):
+        stop = min(start + rows_per_tile, n_rows)
+        tile = audio[start:stop]
+        counts = np.maximum(lengths[start:stop], 1)
+        
+        if mask is not None:
+            weights = mask[start:stop].astype(np.float32)
+            valid = lambda: mask[start:stop]
+            
+            def zero_padding():
+                tile *= weights
+        else:
+            valid = lambda: np.arange(n_samples)[None, :] < lengths[start:stop, None]
+            
+            def zero_padding():
+                for row, length in enumerate(lengths[start:stop]):
+                    tile[row, length:] = 0
+        
+        zero_padding()
+        
+        if remove_dc:
+            tile -= (tile.sum(axis=1) / counts).astype(np.float32)[:, None]
+            zero_padding()
+        
+        gain = _row_gains(tile, counts, valid, sr, method, target, peak_limit)
+        tile *= gain.astype(np.float32)[:, None]
+    
+    return audio
+
+def normalize_audio(audio, sr=24000, **options):
+    """
+    Normalize a single 1-D clip; options are those of normalize_batch()
+    """
+    return normalize_batch(np.asarray(audio)[None, :], sr=sr, **options)[0]
+
+def pad_batch(clips):
+    """
+    Stack 1-D clips into a zero-padded (n_clips, max_len) array plus lengths
+    """
+    lengths = np.array([len(c) for c in clips])
+    batch = np.zeros((len(clips), lengths.max() if len(clips) else 0), dtype=np.float32)
+    for row, clip in enumerate(clips):
+        batch[row, :len(clip)] = clip
+    return batch, lengths
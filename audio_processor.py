@@ -6,9 +6,71 @@ import soundfile as sf
 import numpy as np
 import os
 
-def preprocess_audio(input_path, output_path, target_sr=24000, max_duration=15):
+from audio_normalization import normalize_audio
+from resampling import DEFAULT_RESAMPLER, make_resampler, resample
+
+def iter_audio_blocks(input_path, target_sr=24000, block_size=65536, resampler=DEFAULT_RESAMPLER):
+    """
+    Yield mono float32 blocks of audio resampled to target_sr, decoding
+    the source incrementally with soundfile.blocks.
+    """
+    info = sf.info(input_path)
+    
+    # Streaming resamplers keep filter state across blocks, so there are no
+    # seams at block boundaries
+    backend = resampler
+    resampler = None
+    if info.samplerate != target_sr:
+        resampler = make_resampler(info.samplerate, target_sr, backend)
+    
+    for block in sf.blocks(input_path, blocksize=block_size, dtype='float32', always_2d=True):
+        mono = np.ascontiguousarray(block.mean(axis=1), dtype=np.float32)
+        if resampler is not None:
+            mono = resampler.resample_chunk(mono)
+        if len(mono):
+            yield mono
+    
+    if resampler is not None:
+        tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+        if len(tail):
+            yield tail
+
+def stream_load(input_path, target_sr=24000, max_duration=None, block_size=65536,
+                resampler=DEFAULT_RESAMPLER):
+    """
+    Decode and resample audio block by block, stopping as soon as
+    max_duration seconds of output are available. Memory and time depend
+    on the output length, not the length of the source file.
+    Returns (mono float32 audio at target_sr, original sample rate, original duration).
+    """
+    info = sf.info(input_path)
+    max_samples = None if max_duration is None else int(max_duration * target_sr)
+    
+    chunks = []
+    total = 0
+    blocks = iter_audio_blocks(input_path, target_sr, block_size, resampler)
+    for mono in blocks:
+        chunks.append(mono)
+        total += len(mono)
+        
+        if max_samples is not None and total >= max_samples:
+            blocks.close()
+            break
+    
+    audio = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+    if max_samples is not None:
+        audio = audio[:max_samples]
+    
+    return audio, info.samplerate, info.duration
+
+def preprocess_audio(input_path, output_path, target_sr=24000, max_duration=15, streaming=True,
+                     resampler=DEFAULT_RESAMPLER):
     """
     Preprocess audio for Orpheus TTS
+    
+    streaming=True decodes only as much of the file as max_duration needs.
+    Formats soundfile cannot read fall back to a full librosa decode.
+    resampler is one of resampling.RESAMPLER_BACKENDS.
     """
     print(f"🎵 Processing: {input_path}")
     
@@ -17,25 +79,39 @@ def preprocess_audio(input_path, output_path, target_sr=24000, max_duration=15):
         return None
     
     try:
-        # Load audio
-        audio, sr = librosa.load(input_path, sr=None)
-        print(f"Original: {sr}Hz, {len(audio)/sr:.2f}s")
+        audio = None
         
-        # Resample to target sample rate
-        if sr != target_sr:
-            audio = librosa.resample(audio, orig_sr=sr, target_sr=target_sr)
-            print(f"Resampled to: {target_sr}Hz")
+        if streaming:
+            try:
+                audio, sr, duration = stream_load(input_path, target_sr, max_duration,
+                                                  resampler=resampler)
+                print(f"Original: {sr}Hz, {duration:.2f}s")
+                if sr != target_sr:
+                    print(f"Resampled to: {target_sr}Hz")
+                if duration > max_duration:
+                    print(f"Trimmed to: {len(audio)/target_sr:.2f}s")
+            except RuntimeError as e:
+                print(f"⚠️  Streaming decode unavailable ({e}), loading full file")
+                audio = None
         
-        # Limit duration
-        max_samples = int(max_duration * target_sr)
-        if len(audio) > max_samples:
-            audio = audio[:max_samples]
-            print(f"Trimmed to: {len(audio)/target_sr:.2f}s")
+        if audio is None:
+            # Load audio
+            audio, sr = librosa.load(input_path, sr=None)
+            print(f"Original: {sr}Hz, {len(audio)/sr:.2f}s")
+            
+            # Resample to target sample rate
+            if sr != target_sr:
+                audio = resample(audio, sr, target_sr, resampler)
+                print(f"Resampled to: {target_sr}Hz")
+            
+            # Limit duration
+            max_samples = int(max_duration * target_sr)
+            if len(audio) > max_samples:
+                audio = audio[:max_samples]
+                print(f"Trimmed to: {len(audio)/target_sr:.2f}s")
         
         # Normalize audio
-        rms = np.sqrt(np.mean(audio**2))
-        if rms > 0:
-            audio = audio / rms * 0.1
+        audio = normalize_audio(audio, sr=target_sr)
         
         # Save processed audio
         sf.write(output_path, audio, target_sr)
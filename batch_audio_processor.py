@@ -2,15 +2,199 @@
 # Process multiple voice samples for training
 
 import os
+import re
+import argparse
+import hashlib
+import shutil
 import librosa
 import soundfile as sf
-import numpy as np
 import json
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
-def batch_process_voice_samples():
+from audio_dedup import DUPLICATE_THRESHOLD, FINGERPRINT_VERSION, find_duplicates, fingerprint_file
+from audio_normalization import NORMALIZATION_DEFAULTS, normalize_audio
+from resampling import DEFAULT_RESAMPLER, RESAMPLER_BACKENDS, resample
+from transcribe_audio import PLACEHOLDER
+
+# Bump MANIFEST_VERSION whenever process_voice_sample() output changes
+MANIFEST_FILENAME = "processing_manifest.json"
+MANIFEST_VERSION = 1
+PROCESSING_PARAMS = {
+    "target_sr": 24000,
+    "max_duration": 15,
+    "resampler": DEFAULT_RESAMPLER,
+    "normalization": dict(NORMALIZATION_DEFAULTS)
+}
+STALE_OUTPUT_PATTERN = re.compile(r"^sample_\d+\.wav$")
+TRANSCRIPT_PATTERN = re.compile(r"^sample_(\d+)\.txt$")
+DEDUP_MODES = ("report", "drop", "off")
+
+def process_voice_sample(input_path, output_path, target_sr=24000, max_duration=15,
+                         resampler=DEFAULT_RESAMPLER):
+    """
+    Load, trim, normalize and save a single voice sample.
+    Returns (duration, None) on success or (None, error message) on failure.
+    """
+    try:
+        # Load and process audio; the resampler reuses its filter for each rate pair
+        audio, sr = librosa.load(input_path, sr=None)
+        audio = resample(audio, sr, target_sr, resampler)
+        
+        # Limit to max_duration seconds
+        max_samples = int(target_sr * max_duration)
+        if len(audio) > max_samples:
+            audio = audio[:max_samples]
+        
+        # Normalize
+        audio = normalize_audio(audio, sr=target_sr, **PROCESSING_PARAMS["normalization"])
+        
+        # Save processed audio
+        sf.write(output_path, audio, target_sr)
+        
+        return len(audio) / target_sr, None
+    
+    except Exception as e:
+        return None, str(e)
+
+def _process_job(job):
+    """Unpack a process_voice_sample() argument tuple for pool workers"""
+    return process_voice_sample(*job)
+
+def file_sha256(path, block_size=1 << 20):
+    """Hash file contents in blocks without loading the whole file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(manifest_path, version=MANIFEST_VERSION):
+    """
+    Load the processing manifest (output file -> source hash and params)
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+    
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Ignoring unreadable manifest: {e}")
+        return {}
+    
+    if manifest.get("version") != version:
+        return {}
+    
+    return manifest.get("samples", {})
+
+def save_manifest(manifest_path, samples, version=MANIFEST_VERSION):
+    """Write the manifest atomically so an interrupted run never leaves it half-written"""
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": version, "samples": samples}, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def dedup_samples(processed_files, manifest, output_dir, mode="report", threshold=DUPLICATE_THRESHOLD):
+    """
+    Find near-duplicate processed samples (re-exports and retakes of one
+    recording) with audio_dedup fingerprints, which are computed once per
+    output and stored in its manifest entry. Each cluster keeps its first
+    clip in processed_files order; with mode="drop" the others are removed
+    from processed_files. Returns the clusters.
+    """
+    signatures = {}
+    for entry in processed_files:
+        manifest_entry = manifest[entry["processed_file"]]
+        fingerprint = manifest_entry.get("fingerprint")
+        if not fingerprint or fingerprint.get("version") != FINGERPRINT_VERSION:
+            fingerprint = {
+                "version": FINGERPRINT_VERSION,
+                "minhash": fingerprint_file(os.path.join(output_dir, entry["processed_file"]))
+            }
+            manifest_entry["fingerprint"] = fingerprint
+        signatures[entry["processed_file"]] = fingerprint["minhash"]
+    
+    clusters = find_duplicates(signatures, threshold)
+    originals = {entry["processed_file"]: entry["original_file"] for entry in processed_files}
+    if clusters:
+        print(f"\n🔁 {len(clusters)} near-duplicate cluster(s):")
+    for cluster in clusters:
+        for name in [cluster["keep"]] + cluster["duplicates"]:
+            marker = "keep" if name == cluster["keep"] else "drop" if mode == "drop" else "dup "
+            print(f"  {marker} {name} ({originals[name]})")
+        print(f"       similarity >= {cluster['similarity']}")
+    
+    if mode == "drop":
+        dropped = {name for cluster in clusters for name in cluster["duplicates"]}
+        processed_files[:] = [entry for entry in processed_files if entry["processed_file"] not in dropped]
+        if dropped:
+            print(f"🗑️  Left {len(dropped)} duplicate(s) out of the dataset")
+    elif clusters:
+        print("💡 Re-run with --dedup drop to leave the duplicates out of the dataset")
+    
+    return clusters
+
+def write_dataset_metadata(processed_files, output_dir="processed_samples", dedup="report"):
+    """
+    Write dataset_metadata.json for processed_files, the processed samples
+    and the segment_audio.py clips together. Near-duplicates are found
+    across all of them first (see dedup_samples), with fingerprints cached
+    in the processing and segment manifests. Returns the clusters.
+    """
+    from segment_audio import SEGMENT_MANIFEST_FILENAME, SEGMENT_MANIFEST_VERSION
+    
+    clusters = []
+    if dedup != "off":
+        sample_manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+        segment_manifest_path = os.path.join(output_dir, SEGMENT_MANIFEST_FILENAME)
+        samples = load_manifest(sample_manifest_path)
+        segments = load_manifest(segment_manifest_path, SEGMENT_MANIFEST_VERSION)
+        
+        # Segment clips carry source offsets
+        fingerprints = {}
+        for entry in processed_files:
+            manifest = segments if "offset" in entry else samples
+            fingerprints[entry["processed_file"]] = manifest.setdefault(entry["processed_file"], {})
+        clusters = dedup_samples(processed_files, fingerprints, output_dir, dedup)
+        
+        # New fingerprints land in the manifests, so the next run reuses them
+        if samples:
+            save_manifest(sample_manifest_path, samples)
+        if segments:
+            save_manifest(segment_manifest_path, segments, SEGMENT_MANIFEST_VERSION)
+    
+    metadata = {
+        "created": datetime.now().isoformat(),
+        "total_samples": len(processed_files),
+        "processed_files": processed_files,
+        "duplicate_clusters": clusters
+    }
+    
+    with open("dataset_metadata.json", "w") as f:
+        json.dump(metadata, f, indent=2)
+    
+    return clusters
+
+def batch_process_voice_samples(num_workers=1, incremental=True, resampler=None, dedup="report"):
     """
     Process multiple voice samples for training dataset
+    
+    num_workers > 1 spreads files across a process pool. Results are
+    collected in input order, so numbering and metadata match a serial run.
+    
+    With incremental=True, outputs whose source hash and processing params
+    match the manifest are kept as-is, and outputs that moved to a new sample
+    number are copied instead of re-decoded. Transcripts follow their audio:
+    when a slot's source changes, its transcript is replaced by the one
+    recorded for the new source (or a fresh template). Stale outputs and
+    their transcripts are removed.
+    
+    resampler overrides PROCESSING_PARAMS["resampler"] for this run.
+    
+    dedup ("report", "drop" or "off") controls near-duplicate detection
+    over all clips before dataset_metadata.json is written (see
+    write_dataset_metadata).
     """
     print("🎵 BATCH AUDIO PROCESSING")
     print("="*50)
@@ -18,6 +202,7 @@ def batch_process_voice_samples():
     input_dir = "voice_samples"
     output_dir = "processed_samples"
     transcript_dir = "transcripts"
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
     
     # Check input directory
     if not os.path.exists(input_dir):
@@ -38,69 +223,207 @@ def batch_process_voice_samples():
         print(f"❌ No audio files found in {input_dir}")
         return False
     
+    audio_files = sorted(audio_files)
     print(f"📁 Found {len(audio_files)} audio files")
     
+    params = dict(PROCESSING_PARAMS)
+    if resampler is not None:
+        params["resampler"] = resampler
+    
+    # Transcript ownership comes from the recorded manifest even with
+    # incremental=False, so a full rebuild never misattributes transcripts
+    recorded = load_manifest(manifest_path)
+    old_manifest = recorded if incremental else {}
+    new_manifest = {}
+    
+    # Transcripts by the source hash they were written for
+    transcript_owners = {}
+    for output_filename, entry in recorded.items():
+        transcript_filename = entry.get("transcript", f"{os.path.splitext(output_filename)[0]}.txt")
+        if os.path.exists(os.path.join(transcript_dir, transcript_filename)):
+            transcript_owners.setdefault(entry.get("source_sha256"), transcript_filename)
+    
+    # Existing outputs by source hash, used to reuse outputs that were renumbered
+    reusable = {}
+    for output_filename, entry in old_manifest.items():
+        if entry.get("params") == params and os.path.exists(os.path.join(output_dir, output_filename)):
+            reusable.setdefault(entry.get("source_sha256"), output_filename)
+    
+    # Plan each sample slot: keep, reuse (copy from another slot) or process.
+    # Sample numbers follow sorted input order, independent of worker scheduling
+    plan = []
+    jobs = []
+    staged = {}
+    # Transcript filename -> staged copy of the new source's transcript (None: start from a template)
+    staged_transcripts = {}
+    
+    for i, filename in enumerate(audio_files):
+        input_path = os.path.join(input_dir, filename)
+        output_filename = f"sample_{i+1:03d}.wav"
+        output_path = os.path.join(output_dir, output_filename)
+        
+        try:
+            source_sha256 = file_sha256(input_path)
+        except OSError as e:
+            plan.append((filename, output_filename, None, "error", str(e)))
+            continue
+        
+        # The source's transcript follows it to this slot; a slot whose source
+        # changed must not keep the old source's transcript
+        transcript_filename = f"sample_{i+1:03d}.txt"
+        owner = transcript_owners.get(source_sha256)
+        previous = recorded.get(output_filename)
+        if owner is not None and owner != transcript_filename:
+            staged_transcript = os.path.join(transcript_dir, f".reuse_{transcript_filename}")
+            shutil.copyfile(os.path.join(transcript_dir, owner), staged_transcript)
+            staged_transcripts[transcript_filename] = staged_transcript
+        elif previous and previous.get("source_sha256") != source_sha256:
+            staged_transcripts[transcript_filename] = None
+        
+        cached = old_manifest.get(output_filename)
+        if (cached and cached.get("source_sha256") == source_sha256
+                and cached.get("params") == params and os.path.exists(output_path)):
+            plan.append((filename, output_filename, source_sha256, "keep", cached))
+        elif source_sha256 in reusable:
+            # Copy before any slot is overwritten, since the donor may be rewritten below
+            donor = reusable[source_sha256]
+            staged_path = os.path.join(output_dir, f".reuse_{output_filename}")
+            shutil.copyfile(os.path.join(output_dir, donor), staged_path)
+            staged[output_filename] = staged_path
+            plan.append((filename, output_filename, source_sha256, "reuse", old_manifest[donor]))
+        else:
+            jobs.append((input_path, output_path, params["target_sr"],
+                         params["max_duration"], params["resampler"]))
+            plan.append((filename, output_filename, source_sha256, "process", None))
+    
+    if incremental:
+        kept = sum(1 for p in plan if p[3] != "process")
+        print(f"♻️  Up to date: {kept}, to process: {len(jobs)}")
+    
     # Process each file
     processed_files = []
+    executor = None
     
-    for i, filename in enumerate(sorted(audio_files)):
-        try:
-            input_path = os.path.join(input_dir, filename)
-            output_filename = f"sample_{i+1:03d}.wav"
+    if num_workers > 1 and len(jobs) > 1:
+        print(f"⚡ Using {num_workers} worker processes")
+        executor = ProcessPoolExecutor(max_workers=num_workers)
+        chunksize = max(1, len(jobs) // (num_workers * 4))
+        results = executor.map(_process_job, jobs, chunksize=chunksize)
+    else:
+        results = map(_process_job, jobs)
+    
+    try:
+        for i, (filename, output_filename, source_sha256, action, value) in enumerate(plan):
             output_path = os.path.join(output_dir, output_filename)
-            transcript_path = os.path.join(transcript_dir, f"sample_{i+1:03d}.txt")
+            transcript_filename = f"sample_{i+1:03d}.txt"
+            transcript_path = os.path.join(transcript_dir, transcript_filename)
             
             print(f"\n🎵 Processing {i+1}/{len(audio_files)}: {filename}")
             
-            # Load and process audio
-            audio, sr = librosa.load(input_path, sr=24000)
+            if transcript_filename in staged_transcripts:
+                staged_transcript = staged_transcripts.pop(transcript_filename)
+                if staged_transcript is not None:
+                    os.replace(staged_transcript, transcript_path)
+                    print("  📝 Moved transcript with its audio")
+                elif os.path.exists(transcript_path):
+                    os.remove(transcript_path)
             
-            # Limit to 15 seconds
-            if len(audio) > 24000 * 15:
-                audio = audio[:24000 * 15]
+            error = None
+            fingerprint = None
+            if action == "process":
+                duration, error = next(results)
+            elif action == "reuse":
+                os.replace(staged.pop(output_filename), output_path)
+                duration, fingerprint = value["duration"], value.get("fingerprint")
+            elif action == "keep":
+                duration, fingerprint = value["duration"], value.get("fingerprint")
+            else:
+                error = value
             
-            # Normalize
-            audio = audio - np.mean(audio)
-            rms = np.sqrt(np.mean(audio**2))
-            if rms > 0:
-                audio = audio / rms * 0.1
+            if error is not None:
+                # Don't leave a previous run's audio behind in a failed slot
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                print(f"  ❌ Failed: {error}")
+                continue
             
-            # Save processed audio
-            sf.write(output_path, audio, 24000)
+            new_manifest[output_filename] = {
+                "original_file": filename,
+                "source_sha256": source_sha256,
+                "params": params,
+                "duration": duration,
+                "transcript": transcript_filename
+            }
+            if fingerprint is not None:
+                new_manifest[output_filename]["fingerprint"] = fingerprint
             
             # Create transcript template
             if not os.path.exists(transcript_path):
                 with open(transcript_path, 'w') as f:
                     f.write(f"# Transcript for {filename}\n")
-                    f.write(f"# Duration: {len(audio)/24000:.2f}s\n\n")
-                    f.write("[Replace with your actual transcription]")
+                    f.write(f"# Duration: {duration:.2f}s\n\n")
+                    f.write(PLACEHOLDER)
             
             processed_files.append({
                 "original_file": filename,
                 "processed_file": output_filename,
-                "duration": len(audio) / 24000
+                "duration": duration
             })
             
-            print(f"  ✅ {output_filename}")
-            
-        except Exception as e:
-            print(f"  ❌ Failed: {e}")
+            status = "unchanged" if action == "keep" else "reused" if action == "reuse" else None
+            print(f"  ✅ {output_filename}" + (f" ({status})" if status else ""))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        for staged_path in list(staged.values()) + list(staged_transcripts.values()):
+            if staged_path is not None and os.path.exists(staged_path):
+                os.remove(staged_path)
     
-    # Save metadata
-    metadata = {
-        "created": datetime.now().isoformat(),
-        "total_samples": len(processed_files),
-        "processed_files": processed_files
-    }
+    # Remove outputs that no longer correspond to any input
+    stale_files = [
+        f for f in os.listdir(output_dir)
+        if STALE_OUTPUT_PATTERN.match(f) and f not in new_manifest
+    ]
+    for stale in sorted(stale_files):
+        os.remove(os.path.join(output_dir, stale))
+        print(f"🗑️  Removed stale output: {stale}")
     
-    with open("dataset_metadata.json", "w") as f:
-        json.dump(metadata, f, indent=2)
+    # Transcripts of sample slots past the last input
+    for transcript_filename in sorted(os.listdir(transcript_dir)):
+        match = TRANSCRIPT_PATTERN.match(transcript_filename)
+        if match and int(match.group(1)) > len(audio_files):
+            os.remove(os.path.join(transcript_dir, transcript_filename))
+            print(f"🗑️  Removed stale transcript: {transcript_filename}")
+    
+    save_manifest(manifest_path, new_manifest)
     
-    print(f"\n✅ Processed {len(processed_files)} samples")
+    # Keep clips registered by segment_audio.py, which carry source offsets
+    processed_count = len(processed_files)
+    if os.path.exists("dataset_metadata.json"):
+        with open("dataset_metadata.json", "r") as f:
+            previous = json.load(f).get("processed_files", [])
+        processed_files.extend(entry for entry in previous if "offset" in entry)
+    
+    # Duplicates are found across samples and segments before the metadata is written
+    write_dataset_metadata(processed_files, output_dir, dedup)
+    
+    print(f"\n✅ Processed {processed_count} samples")
     print(f"📁 Outputs: {output_dir}/")
-    print(f"📝 Transcripts: {transcript_dir}/")
+    print(f"📝 Transcripts: {transcript_dir}/ (python transcribe_audio.py fills in the templates)")
     
     return True
 
 if __name__ == "__main__":
-    batch_process_voice_samples()
+    parser = argparse.ArgumentParser(description="Process voice samples for training")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes (default: 1, serial)")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the manifest and rebuild every sample")
+    parser.add_argument("--resampler", choices=RESAMPLER_BACKENDS, default=DEFAULT_RESAMPLER,
+                        help=f"Resampler backend (default: {DEFAULT_RESAMPLER})")
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default="report",
+                        help="Near-duplicate samples: report them, drop them from the dataset, or skip the check")
+    args = parser.parse_args()
+    
+    batch_process_voice_samples(num_workers=args.workers, incremental=not args.full,
+                                resampler=args.resampler, dedup=args.dedup)
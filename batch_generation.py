@@ -0,0 +1,192 @@
+# batch_generation.py
+# Submit many (text, sampling params) requests to the engine together
+
+import time
+import asyncio
+import itertools
+import numpy as np
+
+from audio_codec import get_decoder
+from reference_cache import reference_prompt_ids
+from training_data import END_OF_SPEECH, HFTokenizer
+
+DEFAULT_SAMPLING = {
+    "temperature": 0.7,
+    "top_k": 50,
+    "repetition_penalty": 1.1
+}
+DEFAULT_MAX_TOKENS = 1200
+
+_request_ids = itertools.count()
+
+def make_request(text, **options):
+    """
+    One generation request: text plus sampling params (temperature, top_k,
+    repetition_penalty, max_tokens, seed), voice, reference_audio (a path)
+    and reference (an encoded ReferenceCache entry). Missing sampling
+    params take DEFAULT_SAMPLING.
+    """
+    request = dict(DEFAULT_SAMPLING, max_tokens=DEFAULT_MAX_TOKENS)
+    request.update(options)
+    request["text"] = text
+    return request
+
+def sampling_params_for(model, request):
+    """vLLM SamplingParams (or the model's stand-in) for one request"""
+    params_class = getattr(model, "sampling_params_class", None)
+    if params_class is None:
+        from vllm import SamplingParams as params_class
+    
+    return params_class(
+        temperature=request["temperature"],
+        top_k=request["top_k"],
+        repetition_penalty=request["repetition_penalty"],
+        max_tokens=request["max_tokens"],
+        seed=request.get("seed"),
+        stop_token_ids=[END_OF_SPEECH]
+    )
+
+def format_prompt(model, request):
+    """
+    Engine prompt for one request: a token-id prompt conditioned on the
+    cached reference when the request has one, else the model's own
+    text prompt for the request's voice
+    """
+    if request.get("reference") is None:
+        return model._format_prompt(request["text"], request.get("voice"))
+    
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        tokenizer = model.tokenizer = HFTokenizer(model.model_name)
+    return {"prompt_token_ids": reference_prompt_ids(request["reference"], tokenizer, request["text"])}
+
+def _result(index, request, audio=None, sample_rate=24000, tokens=0, first_token=None, seconds=0.0, error=None):
+    return {
+        "index": index,
+        "text": request["text"],
+        "audio": audio,
+        "sample_rate": sample_rate,
+        "tokens": tokens,
+        "first_token_seconds": first_token,
+        "seconds": seconds,
+        "cached": False,
+        "error": error
+    }
+
+async def generate_one(model, decoder, index, request, submitted):
+    """Stream one request through the engine, then decode its audio tokens"""
+    prompt = format_prompt(model, request)
+    request_id = f"batch-{next(_request_ids)}"
+    first_token = None
+    token_ids = []
+    
+    try:
+        async for output in model.engine.generate(prompt, sampling_params_for(model, request), request_id):
+            token_ids = output.outputs[0].token_ids
+            if first_token is None and len(token_ids):
+                first_token = time.perf_counter() - submitted
+        
+        # Decode off the event loop so the engine keeps stepping other requests
+        loop = asyncio.get_running_loop()
+        audio = await loop.run_in_executor(None, decoder.decode, np.asarray(token_ids))
+        return _result(index, request, audio, decoder.sample_rate, len(token_ids), first_token,
+                       time.perf_counter() - submitted)
+    except Exception as e:
+        return _result(index, request, tokens=len(token_ids), first_token=first_token,
+                       seconds=time.perf_counter() - submitted, error=str(e))
+
+async def generate_batch_async(model, requests, decoder=None):
+    """
+    Submit every request to the model's engine at once; vLLM schedules them
+    in one continuous batch even with different sampling params. Returns
+    one result per request, in request order.
+    """
+    if decoder is None:
+        decoder = get_decoder(getattr(model, "codec", "snac_24khz"))
+    submitted = time.perf_counter()
+    return await asyncio.gather(*(
+        generate_one(model, decoder, i, request, submitted) for i, request in enumerate(requests)
+    ))
+
+def _generate_sequential(model, requests):
+    """Fallback for models without an engine: one generate_speech call each"""
+    results = []
+    for i, request in enumerate(requests):
+        start = time.perf_counter()
+        try:
+            audio = model.generate_speech(
+                text=request["text"],
+                reference_audio=request.get("reference_audio"),
+                temperature=request["temperature"],
+                top_k=request["top_k"],
+                repetition_penalty=request["repetition_penalty"]
+            )
+            results.append(_result(i, request, np.asarray(audio, dtype=np.float32),
+                                   seconds=time.perf_counter() - start))
+        except Exception as e:
+            results.append(_result(i, request, seconds=time.perf_counter() - start, error=str(e)))
+    return results
+
+def generate_batch(model, requests, decoder=None, cache=None):
+    """
+    Generate audio for a list of requests (see make_request). Models with
+    an engine (OrpheusModel's vLLM AsyncLLMEngine) get every request
+    submitted together; others fall back to sequential generate_speech.
+    
+    Each result has index, text, audio (float32 or None), sample_rate,
+    tokens, first_token_seconds, seconds (submission to decoded audio),
+    cached and error. Failures are reported per request, not raised.
+    
+    On the engine path a request's cached reference conditions the prompt
+    (see format_prompt); the generate_speech path passes reference_audio.
+    
+    With a ResultCache, deterministic requests (temperature 0 or a seed)
+    that were generated before are served from it and only the rest go
+    to the model. generate_speech takes no seed, so on that path only
+    greedy results are stored.
+    """
+    requests = [make_request(**request) for request in requests]
+    results = [None] * len(requests)
+    keys = [None] * len(requests)
+    
+    if cache is not None:
+        from result_cache import model_id_for
+        
+        model_id = model_id_for(model)
+        for i, request in enumerate(requests):
+            start = time.perf_counter()
+            keys[i], audio, sample_rate = cache.get(request, model_id)
+            if audio is not None:
+                results[i] = dict(_result(i, request, audio, sample_rate, seconds=time.perf_counter() - start),
+                                  cached=True)
+    
+    pending = [i for i in range(len(requests)) if results[i] is None]
+    if pending:
+        batch = [requests[i] for i in pending]
+        seeded = hasattr(model, "engine")
+        if seeded:
+            generated = asyncio.run(generate_batch_async(model, batch, decoder))
+        else:
+            generated = _generate_sequential(model, batch)
+        
+        for i, result in zip(pending, generated):
+            results[i] = dict(result, index=i)
+            reproducible = seeded or requests[i]["temperature"] == 0
+            if keys[i] is not None and result["error"] is None and reproducible:
+                cache.put(keys[i], result["audio"], result["sample_rate"], requests[i]["text"])
+    
+    return results
+
+def summarize_batch(results, wall_seconds):
+    """Throughput summary for one generate_batch call"""
+    ok = [r for r in results if r["error"] is None]
+    audio_seconds = sum(len(r["audio"]) / r["sample_rate"] for r in ok)
+    return {
+        "requests": len(results),
+        "failed": len(results) - len(ok),
+        "wall_seconds": wall_seconds,
+        "audio_seconds": audio_seconds,
+        "requests_per_sec": len(results) / wall_seconds if wall_seconds else 0.0,
+        "real_time_factor": wall_seconds / audio_seconds if audio_seconds else None,
+        "mean_latency": float(np.mean([r["seconds"] for r in results])) if results else 0.0
+    }
@@ -0,0 +1,206 @@
+# benchmark_audio.py
+# Benchmarks for the audio preprocessing pipeline
+
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import soundfile as sf
+
+def write_synthetic_recording(path, minutes, sr=44100, block_seconds=60):
+    """
+    Write a long synthetic speech-like recording block by block
+    """
+    rng = np.random.RandomState(0)
+    t = np.arange(sr * block_seconds) / sr
+    with sf.SoundFile(path, 'w', samplerate=sr, channels=1, subtype='PCM_16') as f:
+        for block in range(int(np.ceil(minutes * 60 / block_seconds))):
+            # Amplitude-modulated tones plus noise, roughly syllable-rate envelope
+            envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t + block)
+            tone = np.sin(2 * np.pi * (180 + 20 * block % 60) * t)
+            audio = 0.3 * envelope * tone + 0.02 * rng.randn(len(t))
+            f.write(audio.astype(np.float32))
+
+def _measure(func):
+    """Run func and return (wall seconds, peak traced memory in MB)"""
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1e6
+
+def benchmark_streaming_decode(minutes=30):
+    """
+    Compare full-file decode against streaming decode in preprocess_audio()
+    """
+    from audio_processor import preprocess_audio
+    
+    print(f"⏱️  STREAMING DECODE BENCHMARK ({minutes} min source)")
+    print("="*50)
+    
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "long_recording.wav")
+        write_synthetic_recording(source, minutes)
+        output = os.path.join(tmp, "out.wav")
+        
+        for name, streaming in [("full decode", False), ("streaming", True)]:
+            elapsed, peak_mb = _measure(lambda: preprocess_audio(source, output, streaming=streaming))
+            results[name] = {"seconds": elapsed, "peak_mb": peak_mb}
+    
+    print()
+    for name, result in results.items():
+        print(f"  {name:12s} {result['seconds']:8.3f}s  peak {result['peak_mb']:9.1f} MB")
+    
+    return results
+
+def _legacy_rms_normalize(audio):
+    """Per-file normalization as batch_audio_processor did it before audio_normalization"""
+    audio = audio - np.mean(audio)
+    rms = np.sqrt(np.mean(audio**2))
+    if rms > 0:
+        audio = audio / rms * 0.1
+    return audio
+
+def benchmark_normalization(n_clips=500, batch_size=64, sr=24000):
+    """
+    Compare per-file RMS normalization with batched normalize_batch()
+    """
+    from audio_normalization import normalize_batch, pad_batch
+    
+    print(f"⏱️  NORMALIZATION BENCHMARK ({n_clips} clips)")
+    print("="*50)
+    
+    rng = np.random.RandomState(0)
+    clips = [
+        (0.05 * rng.randn(int(rng.uniform(2, 15) * sr)) + 0.01).astype(np.float32)
+        for _ in range(n_clips)
+    ]
+    
+    def per_file():
+        return [_legacy_rms_normalize(clip) for clip in clips]
+    
+    # A batch loader pads length-sorted clips and hands over batches it owns,
+    # so padding happens outside the timed region and normalization is in place
+    order = sorted(range(n_clips), key=lambda i: len(clips[i]))
+    
+    def make_batches():
+        return [pad_batch([clips[i] for i in order[start:start + batch_size]])
+                for start in range(0, n_clips, batch_size)]
+    
+    def batched(method, batches):
+        out = []
+        for batch, lengths in batches:
+            normalized = normalize_batch(batch, lengths=lengths, sr=sr, method=method,
+                                         target=-23 if method == "lufs" else 0.1, copy=False)
+            out.extend(row[:length] for row, length in zip(normalized, lengths))
+        return out
+    
+    results = {}
+    for name, method in [("per-file rms", None), ("batched rms", "rms"),
+                         ("batched peak", "peak"), ("batched lufs", "lufs")]:
+        batches = make_batches()
+        start_time = time.perf_counter()
+        if method is None:
+            per_file()
+        else:
+            batched(method, batches)
+        results[name] = {"seconds": time.perf_counter() - start_time}
+    
+    per_file_output = per_file()
+    reference = [per_file_output[i] for i in order]
+    max_error = max(np.abs(a - b).max() for a, b in zip(reference, batched("rms", make_batches())))
+    
+    print()
+    for name, result in results.items():
+        rate = n_clips / result["seconds"]
+        print(f"  {name:14s} {result['seconds']:8.3f}s  {rate:9.1f} clips/s")
+    print(f"  max |per-file - batched rms|: {max_error:.2e}")
+    
+    return results
+
+def _test_tones(sr, seconds, max_freq, freqs=(220, 1000, 3150, 5100, 7000, 9000)):
+    """Sum of sines below max_freq, so the ideal resampled output is known exactly"""
+    freqs = [f for f in freqs if f < max_freq]
+    t = np.arange(int(sr * seconds)) / sr
+    return (sum(np.sin(2 * np.pi * f * t + f) for f in freqs) / len(freqs)).astype(np.float32)
+
+def _spectral_error_db(output, reference):
+    """Error energy relative to the reference spectrum, edges excluded"""
+    n = min(len(output), len(reference))
+    edge = n // 10
+    window = np.hanning(n - 2 * edge)
+    out_spec = np.abs(np.fft.rfft(output[edge:n - edge] * window))
+    ref_spec = np.abs(np.fft.rfft(reference[edge:n - edge] * window))
+    return 10 * np.log10(np.sum((out_spec - ref_spec) ** 2) / np.sum(ref_spec ** 2))
+
+def benchmark_resampling(n_clips=200, clip_seconds=5, target_sr=24000):
+    """
+    Compare resampler backends to 24 kHz on speed (many short clips, so
+    filter reuse shows) and spectral error against ideal tones
+    """
+    import soxr
+    from scipy.signal import resample_poly
+    from resampling import RESAMPLER_BACKENDS, resample
+    
+    print(f"⏱️  RESAMPLING BENCHMARK ({n_clips} x {clip_seconds}s clips per rate)")
+    print("="*50)
+    
+    # Uncached one-shot calls, as librosa.resample and resample_poly make them
+    baselines = {
+        "soxr one-shot": lambda x, sr: soxr.resample(x, sr, target_sr, quality='HQ'),
+        "resample_poly": lambda x, sr: resample_poly(x, target_sr // np.gcd(sr, target_sr),
+                                                     sr // np.gcd(sr, target_sr)),
+    }
+    backends = {name: (lambda name: lambda x, sr: resample(x, sr, target_sr, name))(name)
+                for name in RESAMPLER_BACKENDS}
+    backends.update(baselines)
+    
+    results = {}
+    for orig_sr in (44100, 48000, 16000):
+        # Stay inside both passbands, clear of the anti-aliasing transition band
+        max_freq = 0.4 * min(orig_sr, target_sr)
+        clip = _test_tones(orig_sr, clip_seconds, max_freq)
+        reference = _test_tones(target_sr, clip_seconds, max_freq)
+        
+        for name, func in backends.items():
+            func(clip, orig_sr)  # warm-up, fills the filter cache
+            start_time = time.perf_counter()
+            for _ in range(n_clips):
+                output = func(clip, orig_sr)
+            elapsed = time.perf_counter() - start_time
+            
+            results[f"{orig_sr}/{name}"] = {
+                "clips_per_second": n_clips / elapsed,
+                "realtime_factor": n_clips * clip_seconds / elapsed,
+                "spectral_error_db": _spectral_error_db(output, reference)
+            }
+    
+    print()
+    for key, result in results.items():
+        orig_sr, name = key.split("/")
+        print(f"  {orig_sr:>5s} Hz  {name:14s} {result['clips_per_second']:8.1f} clips/s  "
+              f"{result['realtime_factor']:8.0f}x realtime  error {result['spectral_error_db']:7.1f} dB")
+    
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audio pipeline benchmarks")
+    parser.add_argument("benchmark", nargs="?", default="all",
+                        choices=["all", "streaming", "normalization", "resampling"])
+    parser.add_argument("--minutes", type=float, default=30,
+                        help="Length of the synthetic source recording")
+    parser.add_argument("--clips", type=int, default=500,
+                        help="Number of synthetic clips for batch benchmarks")
+    args = parser.parse_args()
+    
+    if args.benchmark in ("all", "streaming"):
+        benchmark_streaming_decode(args.minutes)
+    if args.benchmark in ("all", "normalization"):
+        benchmark_normalization(args.clips)
+    if args.benchmark in ("all", "resampling"):
+        benchmark_resampling()
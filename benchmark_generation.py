@@ -0,0 +1,218 @@
+# benchmark_generation.py
+# Timing harness for speech generation: warm-up, repeated trials, confidence intervals
+
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import numpy as np
+import soundfile as sf
+from scipy import stats
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from batch_generation import generate_batch, make_request
+from result_cache import model_id_for
+
+SCHEMA_VERSION = 1
+# Direction that counts as better for each metric
+LOWER_IS_BETTER = {
+    "wall_seconds": True,
+    "time_to_first_token": True,
+    "tokens_per_sec": False,
+    "real_time_factor": True,
+    "peak_rss_mb": True,
+    "peak_gpu_mb": True
+}
+
+def _read_hwm_mb():
+    """VmHWM (peak RSS) from /proc in MB, or None off Linux"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def reset_peak_rss():
+    """
+    Reset the kernel's peak-RSS watermark so the next reading covers only
+    what follows. Returns False where that isn't possible (the reading is
+    then the peak for the whole process so far).
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    """Peak resident set size in MB (since reset_peak_rss where supported)"""
+    hwm = _read_hwm_mb()
+    if hwm is not None:
+        return hwm
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+def _cuda():
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch.cuda if torch.cuda.is_available() else None
+
+def summarize(values, confidence=0.95):
+    """Mean, spread and Student-t confidence interval of the non-missing values"""
+    values = np.asarray([v for v in values if v is not None], dtype=np.float64)
+    if not len(values):
+        return {"n": 0}
+    mean = float(values.mean())
+    std = float(values.std(ddof=1)) if len(values) > 1 else 0.0
+    half_width = 0.0
+    if len(values) > 1:
+        half_width = float(stats.t.ppf((1 + confidence) / 2, len(values) - 1) * std / np.sqrt(len(values)))
+    return {
+        "n": len(values),
+        "mean": mean,
+        "std": std,
+        "min": float(values.min()),
+        "median": float(np.median(values)),
+        "max": float(values.max()),
+        "ci_low": mean - half_width,
+        "ci_high": mean + half_width
+    }
+
+def run_trial(model, request):
+    """
+    One timed generation. Returns the metrics dict and the result; time to
+    first token is only known on the engine path (None otherwise).
+    """
+    cuda = _cuda()
+    if cuda is not None:
+        cuda.reset_peak_memory_stats()
+    reset_peak_rss()
+    
+    start = time.perf_counter()
+    result = generate_batch(model, [request])[0]
+    wall = time.perf_counter() - start
+    
+    audio_seconds = len(result["audio"]) / result["sample_rate"] if result["audio"] is not None else 0.0
+    metrics = {
+        "wall_seconds": wall,
+        "time_to_first_token": result["first_token_seconds"],
+        "tokens_per_sec": result["tokens"] / wall if result["tokens"] else None,
+        "real_time_factor": wall / audio_seconds if audio_seconds else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_gpu_mb": cuda.max_memory_allocated() / (1 << 20) if cuda is not None else None
+    }
+    return metrics, result
+
+def benchmark(model, request, warmup=1, trials=5, confidence=0.95, output_file=None):
+    """
+    Time one request: warmup untimed runs (engine compilation, caches,
+    allocator growth), then trials timed runs. Returns success, trials,
+    failures, errors and per-metric summaries (see summarize). The last
+    successful trial's audio is written to output_file if given.
+    """
+    request = make_request(**request)
+    for _ in range(warmup):
+        generate_batch(model, [request])
+    
+    samples = {name: [] for name in LOWER_IS_BETTER}
+    errors = []
+    last_audio = None
+    for _ in range(trials):
+        metrics, result = run_trial(model, request)
+        if result["error"] is not None:
+            errors.append(result["error"])
+            continue
+        for name, value in metrics.items():
+            samples[name].append(value)
+        last_audio = result
+    
+    if output_file and last_audio is not None:
+        sf.write(output_file, last_audio["audio"], last_audio["sample_rate"])
+    
+    return {
+        "success": len(errors) < trials,
+        "trials": trials,
+        "failures": len(errors),
+        "errors": sorted(set(errors)),
+        "metrics": {name: summarize(values, confidence) for name, values in samples.items()}
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment(model):
+    """What a run was measured on, so runs can be compared fairly"""
+    info = {
+        "model": model_id_for(model),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "git_commit": _git_commit()
+    }
+    cuda = _cuda()
+    if cuda is not None:
+        info["gpu"] = cuda.get_device_name(0)
+    return info
+
+def make_report(model, experiments, warmup, trials, confidence):
+    """Top-level benchmark JSON; experiments maps name -> list of rows from benchmark()"""
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(model),
+        "settings": {"warmup": warmup, "trials": trials, "confidence": confidence},
+        "experiments": experiments
+    }
+
+def compare_reports(baseline, current, tolerance=0.05):
+    """
+    Regressions of current against baseline. Rows are matched on
+    experiment name and parameters; a metric regresses when it moved in
+    the worse direction by more than tolerance (relative) and the two
+    confidence intervals don't overlap.
+    """
+    if baseline.get("schema_version") != current.get("schema_version"):
+        raise ValueError("Reports use different schema versions")
+    
+    regressions = []
+    for name, rows in current["experiments"].items():
+        baseline_rows = {json.dumps(row["parameters"], sort_keys=True): row
+                         for row in baseline["experiments"].get(name, [])}
+        for row in rows:
+            old = baseline_rows.get(json.dumps(row["parameters"], sort_keys=True))
+            if old is None:
+                continue
+            for metric, lower_is_better in LOWER_IS_BETTER.items():
+                new_stats = row.get("metrics", {}).get(metric, {})
+                old_stats = old.get("metrics", {}).get(metric, {})
+                if not new_stats.get("n") or not old_stats.get("n") or not old_stats["mean"]:
+                    continue
+                change = (new_stats["mean"] - old_stats["mean"]) / abs(old_stats["mean"])
+                if lower_is_better:
+                    worse = change > tolerance and new_stats["ci_low"] > old_stats["ci_high"]
+                else:
+                    worse = change < -tolerance and new_stats["ci_high"] < old_stats["ci_low"]
+                if worse:
+                    regressions.append({"experiment": name, "parameters": row["parameters"], "metric": metric,
+                                        "baseline": old_stats["mean"], "current": new_stats["mean"],
+                                        "change": change})
+    return regressions
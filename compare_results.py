@@ -3,11 +3,117 @@
 
 import os
 import json
+import time
+import argparse
+import yaml
+import soundfile as sf
 from datetime import datetime
 
-def compare_voice_models():
+from batch_generation import generate_batch, make_request, summarize_batch
+from objective_metrics import ObjectiveScorer, aggregate, find_parallel_targets
+from pack_dataset import read_transcript
+from reference_cache import ReferenceCache
+from result_cache import ResultCache
+from voice_features import VoiceFeatureExtractor
+
+SYSTEMS = {"zero_shot": "Zero-shot", "finetuned": "Fine-tuned"}
+REFERENCE_AUDIO = "processed_voice_sample.wav"
+REFERENCE_TRANSCRIPT = "voice_sample_transcript.txt"
+TRAINING_CONFIG = "configs/training_config.yaml"
+# Recorded utterances added to the test texts (targets for MCD / F0 RMSE)
+PARALLEL_TEXTS = 2
+
+def _file_key(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}|{stat.st_mtime_ns}"
+
+def _load_previous(results_path):
+    """Scored entries from an earlier run, by output file"""
+    if not os.path.exists(results_path):
+        return {}
+    with open(results_path, "r") as f:
+        previous = json.load(f)
+    return {entry["output_file"]: entry
+            for key in SYSTEMS for entry in previous.get(f"{key}_results", []) if "output_file" in entry}
+
+def finetuned_model_path(config_path=TRAINING_CONFIG):
+    """The trainer's final/ export under the configured training output_dir"""
+    output_dir = "models/finetuned_orpheus"
+    if os.path.exists(config_path):
+        with open(config_path, "r", encoding="utf-8-sig") as f:
+            output_dir = (yaml.safe_load(f).get("training") or {}).get("output_dir", output_dir)
+    return os.path.join(output_dir, "final")
+
+def _clone_options(model):
+    """Request options that clone the reference voice (as zero_shot_test.py does)"""
+    if not os.path.exists(REFERENCE_AUDIO):
+        print(f"⚠️  {REFERENCE_AUDIO} not found; zero-shot clips use the model's default voice")
+        return {}
+    reference_cache = ReferenceCache(encoder=getattr(model, "codec", "snac_24khz"))
+    reference = reference_cache.get_reference([REFERENCE_AUDIO], transcripts=[read_transcript(REFERENCE_TRANSCRIPT)])
+    return {"reference_audio": REFERENCE_AUDIO, "reference": reference}
+
+def _generate(models, test_texts, output_dir):
+    """
+    Generate every system's clips (one batch per model); returns {system: entries}.
+    models are (key, label, model name, clone) where clone conditions the
+    model on the reference recording.
     """
-    Compare zero-shot vs fine-tuned model performance
+    from model_registry import get_registry
+    
+    registry = get_registry()
+    result_cache = ResultCache()
+    entries = {}
+    
+    # One model at a time, so under a memory budget the registry can
+    # unload the zero-shot model before the fine-tuned one loads
+    for key, label, model_name, clone in models:
+        print(f"📥 Loading {label.lower()} model...")
+        with registry.model(model_name) as model:
+            options = _clone_options(model) if clone else {}
+            # All test texts go to the engine together
+            start = time.perf_counter()
+            batch = generate_batch(model, [make_request(text, seed=42, **options) for text in test_texts],
+                                   cache=result_cache)
+            summary = summarize_batch(batch, time.perf_counter() - start)
+        
+        entries[key] = []
+        for i, (text, result) in enumerate(zip(test_texts, batch)):
+            print(f"\n🎵 Test {i+1}: '{text[:30]}...'")
+            
+            if result["error"] is not None:
+                print(f"  ❌ {label} failed: {result['error']}")
+                continue
+            
+            output_file = os.path.join(output_dir, f"{key}_test_{i+1}.wav")
+            sf.write(output_file, result["audio"], result["sample_rate"])
+            print(f"  ✅ {label}: {output_file}")
+            entries[key].append({"text": text, "output_file": output_file,
+                                 "generation_seconds": result["seconds"]})
+        
+        print(f"\n⏱️  {label}: {summary['requests']} clips in {summary['wall_seconds']:.2f}s")
+    return entries
+
+def _existing(test_texts, output_dir, previous):
+    """Entries for clips already in output_dir (no generation)"""
+    entries = {}
+    for key in SYSTEMS:
+        entries[key] = []
+        for i, text in enumerate(test_texts):
+            output_file = os.path.join(output_dir, f"{key}_test_{i+1}.wav")
+            if os.path.exists(output_file):
+                seconds = previous.get(output_file, {}).get("generation_seconds")
+                entries[key].append({"text": text, "output_file": output_file, "generation_seconds": seconds})
+    return entries
+
+def compare_voice_models(score_only=False, output_dir="outputs", reference_paths=None):
+    """
+    Compare zero-shot vs fine-tuned model performance. Both systems'
+    clips are generated in batches (or, with score_only, taken from
+    output_dir as they are) and scored objectively: speaker similarity to
+    the reference, estimated SNR, and MCD / F0 RMSE on utterances with a
+    recorded target. Clips whose file is unchanged since the last run
+    keep their earlier scores, so re-runs only score what is new.
     """
     print("📊 COMPARING MODELS")
     print("="*50)
@@ -18,71 +124,118 @@ def compare_voice_models():
         "The goal is natural-sounding speech.",
         "Lightning AI provides excellent GPU resources."
     ]
+    # Texts that were also recorded give MCD and F0 RMSE a target
+    targets = find_parallel_targets()
+    test_texts += list(targets)[:PARALLEL_TEXTS]
+    
+    if reference_paths is None:
+        reference_paths = ([REFERENCE_AUDIO] if os.path.exists(REFERENCE_AUDIO)
+                           else list(targets.values())[:PARALLEL_TEXTS])
     
     results = {
         "comparison_date": datetime.now().isoformat(),
         "test_texts": test_texts,
+        "references": reference_paths,
         "zero_shot_results": [],
         "finetuned_results": []
     }
     
     try:
-        from orpheus_tts import OrpheusModel
+        os.makedirs(output_dir, exist_ok=True)
+        results_path = os.path.join(output_dir, "comparison_results.json")
+        previous = _load_previous(results_path)
         
-        # Load models
-        print("📥 Loading zero-shot model...")
-        zero_shot_model = OrpheusModel("canopylabs/orpheus-3b-0.1-ft")
-        
-        finetuned_model_path = "models/finetuned_orpheus"
-        if os.path.exists(finetuned_model_path):
-            print("📥 Loading fine-tuned model...")
-            finetuned_model = OrpheusModel(finetuned_model_path)
-            has_finetuned = True
+        if score_only:
+            entries = _existing(test_texts, output_dir, previous)
         else:
-            print("⚠️  Fine-tuned model not found")
-            has_finetuned = False
-        
-        # Generate comparisons
-        for i, text in enumerate(test_texts):
-            print(f"\n🎵 Test {i+1}: '{text[:30]}...'")
+            # Zero-shot clones the reference; the fine-tuned model learned the voice
+            models = [("zero_shot", "Zero-shot", "canopylabs/orpheus-3b-0.1-ft", True)]
             
-            # Zero-shot generation
-            try:
-                zero_shot_output = f"outputs/zero_shot_test_{i+1}.wav"
-                print(f"  ✅ Zero-shot: {zero_shot_output}")
-                
-                results["zero_shot_results"].append({
-                    "text": text,
-                    "output_file": zero_shot_output
-                })
-                
-            except Exception as e:
-                print(f"  ❌ Zero-shot failed: {e}")
+            model_path = finetuned_model_path()
+            if os.path.exists(model_path):
+                models.append(("finetuned", "Fine-tuned", model_path, False))
+            else:
+                print(f"⚠️  Fine-tuned model not found at {model_path}")
+            entries = _generate(models, test_texts, output_dir)
+        
+        if not reference_paths:
+            print("⚠️  No reference audio; skipping objective scoring")
+        else:
+            # Reuse earlier scores for unchanged files, score the rest in one pass
+            to_score = []
+            for entry in (entry for key in entries for entry in entries[key]):
+                entry["file_key"] = _file_key(entry["output_file"])
+                old = previous.get(entry["output_file"], {})
+                unchanged = all(old.get(field) == entry[field] for field in ("file_key", "text"))
+                if unchanged and "metrics" in old and old.get("references") == reference_paths:
+                    entry["metrics"] = old["metrics"]
+                else:
+                    to_score.append(entry)
             
-            # Fine-tuned generation
-            if has_finetuned:
-                try:
-                    finetuned_output = f"outputs/finetuned_test_{i+1}.wav"
-                    print(f"  ✅ Fine-tuned: {finetuned_output}")
-                    
-                    results["finetuned_results"].append({
-                        "text": text,
-                        "output_file": finetuned_output
-                    })
-                    
-                except Exception as e:
-                    print(f"  ❌ Fine-tuned failed: {e}")
+            reused = sum(map(len, entries.values())) - len(to_score)
+            print(f"\n🔍 Scoring {len(to_score)} clip(s) ({reused} unchanged)...")
+            extractor = VoiceFeatureExtractor(cache_dir=os.path.join(output_dir, "feature_cache"))
+            scorer = ObjectiveScorer(reference_paths, targets, extractor=extractor)
+            for entry, metrics in zip(to_score, scorer.score([(e["output_file"], e["text"]) for e in to_score])):
+                entry["metrics"] = metrics
+            for key in entries:
+                for entry in entries[key]:
+                    entry["references"] = reference_paths
+        
+        for key in entries:
+            results[f"{key}_results"] = entries[key]
+        results["aggregate"] = {key: aggregate([e["metrics"] for e in entries[key] if "metrics" in e])
+                                for key in entries}
+        results["deltas"] = utterance_deltas(results["zero_shot_results"], results["finetuned_results"])
+        
+        print_comparison(results)
         
         # Save results
-        os.makedirs("outputs", exist_ok=True)
-        with open("outputs/comparison_results.json", "w") as f:
+        with open(results_path, "w") as f:
             json.dump(results, f, indent=2)
         
         print("\n✅ Comparison complete!")
-        print("📁 Results saved to: outputs/comparison_results.json")
-        
+        print(f"📁 Results saved to: {results_path}")
+    
     except Exception as e:
         print(f"❌ Comparison failed: {e}")
+    
+    return results
+
+def utterance_deltas(zero_shot, finetuned):
+    """Per-utterance fine-tuned minus zero-shot, for every metric both clips have"""
+    by_text = {entry["text"]: entry for entry in zero_shot if "metrics" in entry}
+    deltas = []
+    for entry in finetuned:
+        base = by_text.get(entry["text"])
+        if base is None or "metrics" not in entry:
+            continue
+        deltas.append({"text": entry["text"], **{
+            name: entry["metrics"][name] - base["metrics"][name]
+            for name in entry["metrics"]
+            if entry["metrics"][name] is not None and base["metrics"].get(name) is not None
+        }})
+    return deltas
+
+def print_comparison(results):
+    print("\n📈 Objective metrics (mean ± std)")
+    for key, label in SYSTEMS.items():
+        summary = results["aggregate"].get(key)
+        if not summary:
+            continue
+        parts = [f"{name} {stats['mean']:.3f}±{stats['std']:.3f}" for name, stats in summary.items() if stats["n"]]
+        print(f"  {label:11s} " + ", ".join(parts))
+    for delta in results["deltas"]:
+        parts = [f"{name} {value:+.3f}" for name, value in delta.items() if name != "text"]
+        print(f"  Δ '{delta['text'][:30]}...': " + ", ".join(parts))
 
 if __name__ == "__main__":
-    compare_voice_models()
+    parser = argparse.ArgumentParser(description="Compare zero-shot and fine-tuned outputs")
+    parser.add_argument("--score-only", action="store_true",
+                        help="Score the clips already in --output-dir instead of generating")
+    parser.add_argument("--output-dir", default="outputs")
+    parser.add_argument("--reference", nargs="+", default=None,
+                        help=f"Speaker reference clips (default: {REFERENCE_AUDIO})")
+    args = parser.parse_args()
+    
+    compare_voice_models(args.score_only, args.output_dir, args.reference)
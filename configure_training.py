@@ -6,6 +6,8 @@ import yaml
 import os
 from datetime import datetime
 
+from transcribe_audio import needs_transcription
+
 def create_training_config():
     """
     Create training configuration for Orpheus
@@ -35,6 +37,10 @@ def create_training_config():
         "dataset": {
             "processed_audio_dir": "processed_samples",
             "transcript_dir": "transcripts", 
+            "packed_dir": "packed_dataset",
+            "token_cache_dir": "token_cache",
+            "codec": "snac_24khz",
+            "qc_manifest": "qc_manifest.json",
             "sample_rate": 24000,
             "total_samples": sample_count
         },
@@ -43,6 +49,7 @@ def create_training_config():
             "num_train_epochs": 5 if sample_count >= 20 else 10,
             "per_device_train_batch_size": 1,
             "gradient_accumulation_steps": 8,
+            "packing": True,
             "learning_rate": 5e-5,
             "warmup_steps": min(100, sample_count * 2),
             "logging_steps": 10,
@@ -68,13 +75,12 @@ def create_training_config():
     
     return True
 
-def check_transcripts():
+def check_transcripts(transcript_dir="transcripts"):
     """
     Check if transcripts are ready
     """
     print("\n📝 Checking transcripts...")
     
-    transcript_dir = "transcripts"
     if not os.path.exists(transcript_dir):
         print("❌ No transcripts directory!")
         return False
@@ -85,16 +91,15 @@ def check_transcripts():
     for filename in transcript_files:
         filepath = os.path.join(transcript_dir, filename)
         
-        with open(filepath, 'r') as f:
-            content = f.read().strip()
-        
-        if ('[Replace with your actual transcription]' not in content and 
-            content and len(content.split()) > 3):
+        # Header comment lines don't count as transcribed words
+        if not needs_transcription(filepath):
             valid_transcripts += 1
         else:
             print(f"⚠️  {filename}: Needs transcription")
     
     print(f"✅ Valid transcripts: {valid_transcripts}/{len(transcript_files)}")
+    if valid_transcripts < len(transcript_files):
+        print("💡 Run python transcribe_audio.py to transcribe the rest automatically")
     return valid_transcripts >= len(transcript_files) * 0.8
 
 if __name__ == "__main__":
@@ -0,0 +1,245 @@
+# dataset_qc.py
+# Dataset quality gate: vectorized per-clip metrics over the packed dataset, filter manifest for training
+
+import os
+import json
+import time
+import argparse
+import numpy as np
+from datetime import datetime
+
+from pack_dataset import PackedDataset
+from transcribe_audio import is_untranscribed
+
+QC_VERSION = 1
+QC_THRESHOLDS = {
+    "min_duration": 1.0,
+    "max_duration": 15.5,
+    "min_rms_db": -40.0,
+    "max_clipping_ratio": 0.001,
+    "min_snr_db": 15.0,
+    "max_silence_ratio": 0.6,
+    # A clip that starts or ends this close to its loudest frame was cut mid-speech
+    "max_edge_db": -12.0,
+    "min_words_per_second": 0.8,
+    "max_words_per_second": 6.0
+}
+FRAME_SECONDS = 0.02
+# Frames this far below the clip's loudest frame (or below SILENCE_FLOOR_DB) are silence
+SILENCE_TOP_DB = 40.0
+SILENCE_FLOOR_DB = -60.0
+CLIP_LEVEL = 0.999
+# Clips are analyzed a contiguous run of the pack at a time, about this many samples per run
+CHUNK_SAMPLES = 1 << 22
+
+def clip_metrics(audio, lengths, sr=24000):
+    """
+    Metrics for clips laid end to end in one float array (as in a pack):
+    every statistic is computed over the whole array at once and reduced
+    per clip with ufunc.reduceat on the clip (or frame) offsets. Each clip
+    must be at least one frame long. Returns a dict of per-clip arrays.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    frame = int(sr * FRAME_SECONDS)
+    
+    square = np.square(audio, dtype=np.float32)
+    magnitude = np.abs(audio)
+    peak = np.maximum.reduceat(magnitude, starts)
+    clipped = np.add.reduceat(magnitude >= CLIP_LEVEL, starts, dtype=np.int64)
+    
+    # Zero-crossing rate as in analyze_tokenization.py, not counted across clip boundaries
+    crossings = np.abs(np.diff(np.sign(audio).astype(np.int8)))
+    crossings[starts[1:] - 1] = 0
+    zero_crossing_rate = np.add.reduceat(crossings, starts, dtype=np.int64) * 0.5 / (lengths - 1)
+    
+    # Non-overlapping frames of each clip plus its leftover tail: one reduceat
+    # over all segment starts gives every frame's energy and, summed, the clip's
+    n_frames = lengths // frame
+    has_tail = lengths % frame > 0
+    n_segments = n_frames + has_tail
+    first_segment = np.concatenate(([0], np.cumsum(n_segments)[:-1]))
+    segment_clip = np.repeat(np.arange(len(lengths)), n_segments)
+    segment_starts = starts[segment_clip] + (np.arange(n_segments.sum()) - first_segment[segment_clip]) * frame
+    energy = np.add.reduceat(square, segment_starts, dtype=np.float64)
+    rms = np.sqrt(np.add.reduceat(energy, first_segment) / lengths)
+    
+    is_frame = np.arange(len(segment_starts)) - first_segment[segment_clip] < n_frames[segment_clip]
+    frame_power = energy[is_frame] / frame
+    frame_clip = segment_clip[is_frame]
+    first_frame = np.concatenate(([0], np.cumsum(n_frames)[:-1]))
+    frame_db = 10 * np.log10(np.maximum(frame_power, 1e-10))
+    
+    loudest = np.maximum.reduceat(frame_db, first_frame)
+    threshold = np.maximum(loudest - SILENCE_TOP_DB, SILENCE_FLOOR_DB)
+    silent = np.add.reduceat((frame_db < threshold[frame_clip]).astype(np.int32), first_frame)
+    edge_db = np.maximum(frame_db[first_frame], frame_db[first_frame + n_frames - 1]) - loudest
+    
+    # SNR as objective_metrics.estimate_snr_db: louder half of frames over
+    # the quietest 10%, ranking frames within each clip with one sort
+    order = np.lexsort((frame_power, frame_clip))
+    ranked = frame_power[order]
+    rank = np.arange(len(ranked)) - first_frame[frame_clip]
+    noise = rank < np.maximum(n_frames // 10, 1)[frame_clip]
+    signal = rank >= (n_frames // 2)[frame_clip]
+    noise_power = np.add.reduceat(ranked * noise, first_frame) / np.add.reduceat(noise, first_frame)
+    signal_power = np.add.reduceat(ranked * signal, first_frame) / np.add.reduceat(signal, first_frame)
+    snr_db = 10 * np.log10(np.maximum(signal_power, 1e-12) / np.maximum(noise_power, 1e-12))
+    
+    return {
+        "duration": lengths / sr,
+        "rms_db": 20 * np.log10(np.maximum(rms, 1e-10)),
+        "peak": peak.astype(np.float64),
+        "clipping_ratio": clipped / lengths,
+        "snr_db": np.where(n_frames >= 10, snr_db, np.nan),
+        "silence_ratio": silent / n_frames,
+        "edge_db": edge_db,
+        "active_seconds": (n_frames - silent) * frame / sr,
+        "zero_crossing_rate": zero_crossing_rate
+    }
+
+def _chunks(lengths, min_length):
+    """(first clip, end clip) runs of clips at least min_length long, about CHUNK_SAMPLES samples each"""
+    first = None
+    total = 0
+    for i, length in enumerate(lengths):
+        if length < min_length or (first is not None and total + length > CHUNK_SAMPLES):
+            if first is not None:
+                yield first, i
+            first, total = None, 0
+        if length >= min_length:
+            if first is None:
+                first = i
+            total += length
+    if first is not None:
+        yield first, len(lengths)
+
+def dataset_metrics(dataset):
+    """
+    Metrics for every clip of a PackedDataset, one chunk of the mapped
+    array at a time (clips shorter than a frame get NaN)
+    """
+    lengths = dataset.lengths().astype(np.int64)
+    offsets = np.asarray(dataset.index[:, 0])
+    scale = 1 / 32768.0 if dataset.dtype == "int16" else 1.0
+    metrics = {}
+    
+    for first, end in _chunks(lengths, max(int(dataset.sample_rate * FRAME_SECONDS), 2)):
+        start = offsets[first]
+        audio = np.asarray(dataset.audio[start:offsets[end - 1] + lengths[end - 1]], dtype=np.float32) * scale
+        for name, values in clip_metrics(audio, lengths[first:end], dataset.sample_rate).items():
+            if name not in metrics:
+                metrics[name] = np.full(len(lengths), np.nan)
+            metrics[name][first:end] = values
+    metrics["duration"] = lengths / dataset.sample_rate
+    return metrics
+
+def rejection_reasons(metrics, transcripts, thresholds=None):
+    """Failed checks per clip (an empty list passes)"""
+    thresholds = {**QC_THRESHOLDS, **(thresholds or {})}
+    words = np.array([len(text.split()) for text in transcripts])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        words_per_second = words / metrics["active_seconds"]
+    metrics["words_per_second"] = words_per_second
+    
+    # NaN (not measurable) never fails a check except where noted
+    checks = {
+        "too_short": metrics["duration"] < thresholds["min_duration"],
+        "too_long": metrics["duration"] > thresholds["max_duration"],
+        "silent": ~(metrics["rms_db"] >= thresholds["min_rms_db"]),
+        "clipped": metrics["clipping_ratio"] > thresholds["max_clipping_ratio"],
+        "noisy": metrics["snr_db"] < thresholds["min_snr_db"],
+        "mostly_silence": metrics["silence_ratio"] > thresholds["max_silence_ratio"],
+        "truncated": metrics["edge_db"] > thresholds["max_edge_db"],
+        "no_transcript": np.array([is_untranscribed(text) for text in transcripts], dtype=bool),
+        "speech_rate": ((words_per_second < thresholds["min_words_per_second"]) |
+                        (words_per_second > thresholds["max_words_per_second"]))
+    }
+    # Speech rate means nothing without a transcript
+    checks["speech_rate"] &= ~checks["no_transcript"]
+    
+    return [[name for name, failed in checks.items() if failed[i]] for i in range(len(transcripts))]
+
+def run_qc(packed_dir="packed_dataset", manifest_path="qc_manifest.json", thresholds=None):
+    """
+    Check every packed clip and write the filter manifest: one entry per
+    clip (keyed by audio hash, as the token cache is) with its metrics and
+    failed checks. pretokenize.py and start_training.py skip rejected clips.
+    """
+    print("🔍 DATASET QC")
+    print("="*50)
+    
+    if not os.path.exists(packed_dir):
+        print(f"❌ {packed_dir} not found!")
+        print("Run pack_dataset.py first")
+        return None
+    
+    start = time.perf_counter()
+    dataset = PackedDataset(packed_dir)
+    metrics = dataset_metrics(dataset)
+    reasons = rejection_reasons(metrics, [sample["transcript"] for sample in dataset.samples], thresholds)
+    elapsed = time.perf_counter() - start
+    
+    clips = []
+    for i, sample in enumerate(dataset.samples):
+        clips.append({
+            "id": sample["id"],
+            "audio_sha256": dataset.audio_hash(i),
+            "passed": not reasons[i],
+            "reasons": reasons[i],
+            "metrics": {name: None if np.isnan(values[i]) else round(float(values[i]), 4)
+                        for name, values in metrics.items()}
+        })
+    
+    rejected = sum(not clip["passed"] for clip in clips)
+    manifest = {
+        "version": QC_VERSION,
+        "created": datetime.now().isoformat(),
+        "packed_dir": packed_dir,
+        "thresholds": {**QC_THRESHOLDS, **(thresholds or {})},
+        "total": len(clips),
+        "rejected": rejected,
+        "clips": clips
+    }
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    
+    counts = {}
+    for clip_reasons in reasons:
+        for reason in clip_reasons:
+            counts[reason] = counts.get(reason, 0) + 1
+    print(f"📊 {len(clips)} clips ({metrics['duration'].sum() / 60:.1f} min) checked in {elapsed:.2f}s")
+    for reason, count in sorted(counts.items(), key=lambda item: -item[1]):
+        print(f"  ⚠️  {reason}: {count}")
+    print(f"✅ {len(clips) - rejected} passed, ❌ {rejected} rejected")
+    print(f"📁 Manifest: {manifest_path}")
+    return manifest
+
+def rejected_hashes(manifest_path="qc_manifest.json"):
+    """Audio hashes of clips the QC manifest rejects; None if there is no manifest"""
+    if not manifest_path or not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != QC_VERSION:
+        raise ValueError(f"Unsupported QC manifest version in {manifest_path}: {manifest.get('version')}")
+    return {clip["audio_sha256"] for clip in manifest["clips"] if not clip["passed"]}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check packed clips and write the QC filter manifest")
+    parser.add_argument("--packed-dir", default="packed_dataset")
+    parser.add_argument("--manifest", default="qc_manifest.json")
+    parser.add_argument("--set", nargs="*", default=[], metavar="NAME=VALUE",
+                        help=f"Override thresholds ({', '.join(QC_THRESHOLDS)})")
+    args = parser.parse_args()
+    
+    overrides = {}
+    for item in args.set:
+        name, _, value = item.partition("=")
+        if name not in QC_THRESHOLDS:
+            parser.error(f"Unknown threshold '{name}'")
+        overrides[name] = float(value)
+    
+    run_qc(args.packed_dir, args.manifest, overrides)
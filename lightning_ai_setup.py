@@ -65,20 +65,18 @@ def quick_orpheus_test():
     print("\n🚀 Quick Orpheus GPU Test...")
     
     try:
-        from orpheus_tts import OrpheusModel
+        from model_registry import shared_model
         
         print("📥 Loading model (this may take a few minutes)...")
-        model = OrpheusModel(
-            model_name="canopylabs/orpheus-3b-0.1-ft",
-            max_model_len=1024
-        )
-        print("✅ Model loaded successfully on GPU!")
-        
-        # Basic test
-        print("🎵 Testing basic generation...")
-        test_text = "Hello, this is a GPU test."
-        print(f"Test text: '{test_text}'")
-        
+        # Same key as the test scripts, so they reuse this instance
+        with shared_model("canopylabs/orpheus-3b-0.1-ft", max_model_len=2048) as model:
+            print("✅ Model loaded successfully on GPU!")
+            
+            # Basic test
+            print("🎵 Testing basic generation...")
+            test_text = "Hello, this is a GPU test."
+            print(f"Test text: '{test_text}'")
+            
         print("✅ Basic test completed!")
         print("🎯 Ready for voice cloning experiments!")
         
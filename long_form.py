@@ -0,0 +1,212 @@
+# long_form.py
+# Synthesize long text: split at sentence/clause boundaries, generate chunks in batches, stitch
+
+import re
+import sys
+import time
+import argparse
+import numpy as np
+
+from audio_codec import SAMPLES_PER_FRAME, TOKENS_PER_FRAME
+from batch_generation import DEFAULT_MAX_TOKENS, generate_batch, make_request
+from streaming_generation import IncrementalWavWriter
+
+# SNAC at 24 kHz: 7 tokens per 2048-sample frame, ~82 tokens per second of audio
+TOKENS_PER_SECOND = TOKENS_PER_FRAME * 24000 / SAMPLES_PER_FRAME
+# Typical read-speech rate, and headroom so a slow chunk isn't cut off
+CHARS_PER_SECOND = 15
+BUDGET_MARGIN = 0.75
+
+SENTENCE_END = re.compile(r"(?<=[.!?…])[\"')\]]*\s+")
+CLAUSE_END = re.compile(r"(?<=[,;:—–])\s+|\s+(?=[—–-]\s)")
+
+def max_chars_for_tokens(max_new_tokens):
+    """Longest text chunk expected to fit in max_new_tokens of speech"""
+    seconds = max_new_tokens / TOKENS_PER_SECOND
+    return max(20, int(seconds * CHARS_PER_SECOND * BUDGET_MARGIN))
+
+def _split_long(piece, max_chars):
+    """Split one over-long sentence at clauses, then at word boundaries"""
+    parts = []
+    for clause in CLAUSE_END.split(piece):
+        if len(clause) <= max_chars:
+            parts.append(clause)
+            continue
+        line = ""
+        for word in clause.split():
+            if line and len(line) + 1 + len(word) > max_chars:
+                parts.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        if line:
+            parts.append(line)
+    return _merge(parts, max_chars)
+
+def _merge(pieces, max_chars):
+    """Greedily join consecutive pieces while they fit in max_chars"""
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + 1 + len(piece) <= max_chars:
+            chunks[-1] = f"{chunks[-1]} {piece}"
+        else:
+            chunks.append(piece)
+    return chunks
+
+def split_text(text, max_chars):
+    """
+    Chunks of at most max_chars that end at sentence boundaries where
+    possible, clause boundaries next, and word boundaries only as a last
+    resort. Whitespace (including paragraph breaks) is normalized.
+    """
+    sentences = [s.strip() for s in SENTENCE_END.split(" ".join(text.split())) if s.strip()]
+    pieces = []
+    for sentence in sentences:
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+        else:
+            pieces.extend(_split_long(sentence, max_chars))
+    return _merge(pieces, max_chars)
+
+class CrossfadeStitcher:
+    """
+    Joins independently generated chunks into one stream: each chunk's last
+    crossfade samples are held back and blended (equal power) into the
+    next chunk's start. write() returns the audio that is now final.
+    """
+    
+    def __init__(self, crossfade):
+        self.crossfade = crossfade
+        self.tail = None
+        t = np.linspace(0, np.pi / 2, crossfade, dtype=np.float32)
+        self.fade_in, self.fade_out = np.sin(t), np.cos(t)
+    
+    def write(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if self.tail is not None:
+            if len(self.tail) == self.crossfade and len(chunk) >= self.crossfade:
+                blend = self.tail * self.fade_out + chunk[:self.crossfade] * self.fade_in
+                chunk = np.concatenate([blend, chunk[self.crossfade:]])
+            else:
+                # Chunk shorter than the crossfade: just butt-join
+                chunk = np.concatenate([self.tail, chunk])
+        if len(chunk) <= self.crossfade:
+            self.tail = chunk
+            return np.zeros(0, dtype=np.float32)
+        self.tail = chunk[len(chunk) - self.crossfade:]
+        return chunk[:len(chunk) - self.crossfade]
+    
+    def finish(self):
+        tail, self.tail = self.tail, None
+        return tail if tail is not None else np.zeros(0, dtype=np.float32)
+
+def synthesize_long_form(model, text, output_path, batch_size=8, max_new_tokens=DEFAULT_MAX_TOKENS,
+                         crossfade_ms=50, sample_rate=24000, **request_options):
+    """
+    Synthesize text of any length into output_path. Chunks sized for
+    max_new_tokens are generated batch_size at a time (each batch goes to
+    the engine together, so wall time grows with the number of batches,
+    not chunks) and written as soon as their batch finishes, joined with
+    crossfade_ms crossfades. request_options (sampling params, reference,
+    voice) apply to every chunk. Returns timing stats.
+    """
+    chunks = split_text(text, max_chars_for_tokens(max_new_tokens))
+    if not chunks:
+        raise ValueError("No text to synthesize")
+    
+    stitcher = CrossfadeStitcher(int(sample_rate * crossfade_ms / 1000))
+    stats = {"chunks": len(chunks), "batches": 0, "failed": 0, "time_to_first_audio": None,
+             "audio_seconds": 0.0, "wall_seconds": 0.0, "real_time_factor": None}
+    start = time.perf_counter()
+    
+    with IncrementalWavWriter(output_path, sample_rate) as writer:
+        for first in range(0, len(chunks), batch_size):
+            batch = chunks[first:first + batch_size]
+            results = generate_batch(model, [
+                make_request(chunk, max_tokens=max_new_tokens, **request_options) for chunk in batch
+            ])
+            stats["batches"] += 1
+            
+            for chunk_text, result in zip(batch, results):
+                if result["error"] is not None:
+                    stats["failed"] += 1
+                    print(f"  ❌ Chunk failed ('{chunk_text[:30]}...'): {result['error']}")
+                    continue
+                if result["sample_rate"] != sample_rate:
+                    raise ValueError(f"Model produced {result['sample_rate']}Hz audio, expected {sample_rate}Hz")
+                audio = stitcher.write(result["audio"])
+                writer.write(audio)
+                stats["audio_seconds"] += len(audio) / sample_rate
+                if stats["time_to_first_audio"] is None and len(audio):
+                    stats["time_to_first_audio"] = time.perf_counter() - start
+            
+            print(f"  🔄 Batch {stats['batches']}: chunks {first + 1}-{first + len(batch)} of {len(chunks)}")
+        
+        tail = stitcher.finish()
+        writer.write(tail)
+        stats["audio_seconds"] += len(tail) / sample_rate
+    
+    stats["wall_seconds"] = time.perf_counter() - start
+    if stats["audio_seconds"]:
+        stats["real_time_factor"] = stats["wall_seconds"] / stats["audio_seconds"]
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthesize long text into one WAV file")
+    parser.add_argument("text_file", help="Text to synthesize (UTF-8)")
+    parser.add_argument("--output", default="long_form_output.wav")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=DEFAULT_MAX_TOKENS,
+                        help="Per-chunk token budget; chunk length is derived from it")
+    parser.add_argument("--crossfade-ms", type=float, default=50)
+    parser.add_argument("--reference", nargs="*", default=None,
+                        help="Reference clips for zero-shot cloning (encoded once, cached)")
+    parser.add_argument("--voice-like", metavar="FILE", default=None,
+                        help="Use the voice_index library clip closest to FILE as the reference")
+    parser.add_argument("--stand-in", action="store_true",
+                        help="Use the lightweight stand-in model (no GPU needed)")
+    args = parser.parse_args()
+    
+    from model_registry import StandInModel, shared_model
+    
+    with open(args.text_file, "r", encoding="utf-8") as f:
+        text = f.read()
+    
+    print("📖 LONG-FORM SYNTHESIS")
+    print("="*50)
+    max_chars = max_chars_for_tokens(args.max_new_tokens)
+    print(f"📝 {len(text)} characters -> {len(split_text(text, max_chars))} chunks of <= {max_chars} characters")
+    
+    if args.voice_like:
+        from voice_index import closest_references
+        
+        args.reference = closest_references(args.voice_like, k=1)
+        print(f"🎙️  Closest library voice: {args.reference[0]}")
+    
+    def run(model):
+        options = {}
+        if args.reference:
+            from reference_cache import ReferenceCache
+            
+            options["reference"] = ReferenceCache(encoder=getattr(model, "codec", "snac_24khz")).get_reference(args.reference)
+        return synthesize_long_form(model, text, args.output, args.batch_size, args.max_new_tokens,
+                                    args.crossfade_ms, **options)
+    
+    if args.stand_in:
+        stats = run(StandInModel("stand-in", 2048))
+    else:
+        with shared_model("canopylabs/orpheus-3b-0.1-ft", max_model_len=2048) as model:
+            stats = run(model)
+    
+    # Both are None when no chunk produced audio
+    rtf = stats["real_time_factor"]
+    first_audio = stats["time_to_first_audio"]
+    print(f"✅ {stats['audio_seconds']:.1f}s of audio from {stats['chunks']} chunks "
+          f"in {stats['batches']} batches ({stats['wall_seconds']:.2f}s, "
+          f"RTF {'n/a' if rtf is None else f'{rtf:.3f}'})")
+    print(f"⏱️  Time to first audio: {'n/a' if first_audio is None else f'{first_audio:.2f}s'}")
+    print(f"📁 Saved: {args.output}")
+    
+    if stats["failed"] == stats["chunks"]:
+        print("❌ Every chunk failed")
+        sys.exit(1)
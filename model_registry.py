@@ -0,0 +1,302 @@
+# model_registry.py
+# Process-wide model cache: each model is loaded once and shared by every caller
+
+import os
+import gc
+import time
+import zlib
+import asyncio
+import threading
+import numpy as np
+from types import SimpleNamespace
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DEFAULT_MAX_MODEL_LEN = 2048
+
+def load_orpheus(model_name, max_model_len):
+    """The vLLM-backed inference model"""
+    from orpheus_tts import OrpheusModel
+    
+    return OrpheusModel(model_name=model_name, max_model_len=max_model_len)
+
+def load_causal_lm(model_name, max_model_len):
+    """The underlying transformers LM, for fine-tuning"""
+    from transformers import AutoModelForCausalLM
+    
+    return AutoModelForCausalLM.from_pretrained(model_name)
+
+LOADERS = {
+    "orpheus": load_orpheus,
+    "causal_lm": load_causal_lm
+}
+
+class StandInSamplingParams:
+    """Keyword holder standing in for vllm.SamplingParams"""
+    
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class StandInEngine:
+    """
+    Offline stand-in for vLLM's AsyncLLMEngine. generate() yields
+    cumulative outputs (.outputs[0].token_ids, .finished) one 7-token audio
+    frame per engine step. Concurrent requests share each step, the way
+    vLLM batches everything in flight, so N requests submitted together
+    take about as long as the longest one.
+    """
+    
+    def __init__(self, step_seconds=0.002, seconds_per_char=0.06):
+        self.step_seconds = step_seconds
+        self.seconds_per_char = seconds_per_char
+        self._step = None
+    
+    async def _next_step(self):
+        loop = asyncio.get_running_loop()
+        if self._step is None or self._step.done() or self._step.get_loop() is not loop:
+            self._step = asyncio.ensure_future(asyncio.sleep(self.step_seconds))
+        await self._step
+    
+    def tokens_for(self, prompt, sampling_params):
+        """The full deterministic token sequence for one request"""
+        from audio_codec import AUDIO_TOKEN_OFFSET, CODEBOOK_SIZE, SAMPLES_PER_FRAME, TOKENS_PER_FRAME
+        
+        text_length = len(prompt)
+        if isinstance(prompt, dict):
+            # Token-id prompt: the final human turn (text + 4 markers) is what gets spoken
+            from training_data import START_OF_HUMAN
+            
+            ids = list(prompt["prompt_token_ids"])
+            text_length = ids[::-1].index(START_OF_HUMAN) - 4
+            prompt = str(zlib.crc32(str(ids).encode()))
+        key = (f"{prompt}|{getattr(sampling_params, 'temperature', None)}|"
+               f"{getattr(sampling_params, 'top_k', None)}|{getattr(sampling_params, 'repetition_penalty', None)}")
+        rng = np.random.RandomState(zlib.crc32(key.encode()))
+        n_frames = max(1, int((0.3 + self.seconds_per_char * text_length) * 24000 / SAMPLES_PER_FRAME))
+        max_tokens = getattr(sampling_params, "max_tokens", None)
+        if max_tokens:
+            n_frames = min(n_frames, max(1, max_tokens // TOKENS_PER_FRAME))
+        
+        codes = rng.randint(CODEBOOK_SIZE // 5, CODEBOOK_SIZE // 2, size=(n_frames, TOKENS_PER_FRAME))
+        return (codes + AUDIO_TOKEN_OFFSET + CODEBOOK_SIZE * np.arange(TOKENS_PER_FRAME)).reshape(-1).tolist()
+    
+    async def generate(self, prompt, sampling_params, request_id):
+        tokens = self.tokens_for(prompt, sampling_params)
+        for end in range(7, len(tokens) + 1, 7):
+            await self._next_step()
+            yield SimpleNamespace(
+                request_id=request_id,
+                outputs=[SimpleNamespace(token_ids=tokens[:end])],
+                finished=end == len(tokens)
+            )
+
+class StandInModel:
+    """
+    Lightweight stand-in for OrpheusModel, for tests and dry runs. Loads
+    instantly, reports a fixed memory footprint and "generates" a
+    deterministic tone whose length follows the text. Its engine emits
+    tokens for the "hash" codec.
+    """
+    
+    sample_rate = 24000
+    codec = "hash"
+    sampling_params_class = StandInSamplingParams
+    
+    def __init__(self, model_name, max_model_len, memory_bytes=1 << 20):
+        self.model_name = model_name
+        self.max_model_len = max_model_len
+        self.memory_bytes = memory_bytes
+        self.engine = StandInEngine()
+        self.closed = False
+        
+        from training_data import ByteTokenizer
+        
+        self.tokenizer = ByteTokenizer()
+    
+    def _format_prompt(self, prompt, voice=None):
+        return f"{voice}: {prompt}" if voice else prompt
+    
+    def generate_speech(self, text, reference_audio=None, temperature=0.7, top_k=50,
+                        repetition_penalty=1.1, **kwargs):
+        seed = zlib.crc32(f"{self.model_name}|{text}|{temperature}|{top_k}|{repetition_penalty}".encode())
+        rng = np.random.RandomState(seed)
+        duration = 0.3 + 0.06 * len(text)
+        t = np.arange(int(duration * self.sample_rate)) / self.sample_rate
+        audio = 0.3 * np.sin(2 * np.pi * rng.uniform(100, 300) * t)
+        return (audio + 0.01 * rng.randn(len(t))).astype(np.float32)
+    
+    def close(self):
+        self.closed = True
+
+def model_memory_bytes(model, cuda_delta):
+    """
+    Memory a loaded model holds: its own memory_bytes if it reports one,
+    else its parameter bytes, else the CUDA allocation measured across the load
+    """
+    if hasattr(model, "memory_bytes"):
+        return int(model.memory_bytes)
+    if hasattr(model, "parameters"):
+        return sum(p.numel() * p.element_size() for p in model.parameters())
+    return max(int(cuda_delta), 0)
+
+def _cuda_allocated():
+    try:
+        import torch
+        
+        if torch.cuda.is_available():
+            return torch.cuda.memory_allocated()
+    except ImportError:
+        pass
+    return 0
+
+class ModelRegistry:
+    """
+    Lazily loaded, reference-counted models keyed by
+    (model_name, max_model_len, kind). kind picks the loader, so the vLLM
+    engine and the training LM for one checkpoint are separate entries.
+    
+    Models stay loaded after their last release. When loading another
+    model would exceed memory_budget_bytes, idle models (refcount 0) are
+    unloaded least recently used first; models still in use are never
+    evicted, and MemoryError is raised if the new model can't fit.
+    A model's size is only known once it has loaded, so room is made
+    after the first load and before any reload.
+    """
+    
+    def __init__(self, memory_budget_bytes=None, loaders=None):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.loaders = dict(LOADERS if loaders is None else loaders)
+        # key -> {"model", "refcount", "bytes", "last_used"}; order is LRU first
+        self.entries = OrderedDict()
+        self.stats = {"loads": 0, "hits": 0, "evictions": 0, "load_seconds": 0.0}
+        # Sizes of models loaded before, so a reload can make room first
+        self.known_bytes = {}
+        self._lock = threading.RLock()
+    
+    def acquire(self, model_name, max_model_len=DEFAULT_MAX_MODEL_LEN, kind="orpheus"):
+        """Return the shared model for this key, loading it on first use"""
+        key = (model_name, max_model_len, kind)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.stats["hits"] += 1
+            else:
+                entry = self._load(key)
+            
+            entry["refcount"] += 1
+            entry["last_used"] = time.time()
+            self.entries.move_to_end(key)
+            return entry["model"]
+    
+    def release(self, model_name, max_model_len=DEFAULT_MAX_MODEL_LEN, kind="orpheus"):
+        """Drop one reference; the model stays cached until evicted"""
+        with self._lock:
+            entry = self.entries[(model_name, max_model_len, kind)]
+            if entry["refcount"] <= 0:
+                raise RuntimeError(f"{model_name} released more times than acquired")
+            entry["refcount"] -= 1
+    
+    @contextmanager
+    def model(self, model_name, max_model_len=DEFAULT_MAX_MODEL_LEN, kind="orpheus"):
+        """with registry.model(name, max_len) as model: ... (acquire + release)"""
+        model = self.acquire(model_name, max_model_len, kind)
+        try:
+            yield model
+        finally:
+            self.release(model_name, max_model_len, kind)
+    
+    def _load(self, key):
+        model_name, max_model_len, kind = key
+        if kind not in self.loaders:
+            raise ValueError(f"Unknown model kind: {kind} (choose from {', '.join(self.loaders)})")
+        
+        # Make room before loading when the size is known from an earlier load
+        self._evict_until(self.known_bytes.get(key, 0))
+        
+        start = time.perf_counter()
+        before = _cuda_allocated()
+        model = self.loaders[kind](model_name, max_model_len)
+        size = model_memory_bytes(model, _cuda_allocated() - before)
+        self.known_bytes[key] = size
+        self.stats["loads"] += 1
+        self.stats["load_seconds"] += time.perf_counter() - start
+        
+        entry = {"model": model, "refcount": 0, "bytes": size, "last_used": time.time()}
+        self.entries[key] = entry
+        
+        if not self._evict_until(0, keep=key):
+            del self.entries[key]
+            self._unload(model)
+            raise MemoryError(f"{model_name} needs {size / 1e9:.2f} GB but models in use hold "
+                              f"{self.memory_in_use() / 1e9:.2f} GB of the "
+                              f"{self.memory_budget_bytes / 1e9:.2f} GB budget")
+        return entry
+    
+    def _evict_until(self, extra_bytes, keep=None):
+        """
+        Unload idle models, LRU first, until the cached total plus
+        extra_bytes fits the budget. Returns whether it fits.
+        """
+        if self.memory_budget_bytes is None:
+            return True
+        
+        for key in list(self.entries):
+            if self.memory_in_use() + extra_bytes <= self.memory_budget_bytes:
+                break
+            entry = self.entries[key]
+            if key != keep and entry["refcount"] == 0:
+                del self.entries[key]
+                self.stats["evictions"] += 1
+                print(f"♻️  Unloaded {key[0]} ({entry['bytes'] / 1e9:.2f} GB) to stay within memory budget")
+                self._unload(entry["model"])
+        
+        return self.memory_in_use() + extra_bytes <= self.memory_budget_bytes
+    
+    def _unload(self, model):
+        for method in ("shutdown", "close"):
+            if callable(getattr(model, method, None)):
+                getattr(model, method)()
+                break
+        del model
+        gc.collect()
+        try:
+            import torch
+            
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+    
+    def memory_in_use(self):
+        """Bytes held by every cached model, idle or not"""
+        return sum(entry["bytes"] for entry in self.entries.values())
+    
+    def clear(self):
+        """Unload every idle model"""
+        with self._lock:
+            for key in [k for k, e in self.entries.items() if e["refcount"] == 0]:
+                self._unload(self.entries.pop(key)["model"])
+
+_registry = None
+
+def get_registry():
+    """
+    The process-wide registry. ORPHEUS_MODEL_BUDGET_GB sets its memory
+    budget; ORPHEUS_STAND_IN=1 loads StandInModel in place of OrpheusModel
+    so the inference scripts can run without a GPU or model download.
+    """
+    global _registry
+    if _registry is None:
+        budget = os.environ.get("ORPHEUS_MODEL_BUDGET_GB")
+        loaders = None
+        if os.environ.get("ORPHEUS_STAND_IN") == "1":
+            loaders = dict(LOADERS, orpheus=StandInModel)
+        _registry = ModelRegistry(
+            memory_budget_bytes=int(float(budget) * 1e9) if budget else None,
+            loaders=loaders
+        )
+    return _registry
+
+def shared_model(model_name, max_model_len=DEFAULT_MAX_MODEL_LEN, kind="orpheus"):
+    """Context manager over the process-wide registry (see ModelRegistry.model)"""
+    return get_registry().model(model_name, max_model_len, kind)
@@ -0,0 +1,158 @@
+# objective_metrics.py
+# Objective speech metrics: speaker similarity, MCD, F0 RMSE and estimated SNR
+
+import os
+import glob
+import numpy as np
+import librosa
+
+from pack_dataset import read_transcript
+from result_cache import normalize_text
+from transcribe_audio import is_untranscribed
+from voice_features import HOP_LENGTH, N_FFT, VoiceFeatureExtractor
+
+N_CEPSTRA = 13
+F0_MIN = 65.0
+F0_MAX = 400.0
+# 10 / ln(10) * sqrt(2): the usual MCD scaling to decibels
+MCD_SCALE = 10.0 / np.log(10) * np.sqrt(2.0)
+
+def estimate_snr_db(audio, sr=24000):
+    """
+    Single-ended SNR estimate: mean power of the louder half of frames
+    over the mean power of the quietest 10% (taken as the noise floor)
+    """
+    power = librosa.feature.rms(y=audio, frame_length=N_FFT, hop_length=HOP_LENGTH)[0] ** 2
+    if len(power) < 10 or not power.any():
+        return None
+    power = np.sort(power)
+    noise = power[:max(1, len(power) // 10)].mean()
+    signal = power[len(power) // 2:].mean()
+    return float(10 * np.log10(signal / max(noise, 1e-12)))
+
+# librosa's MFCCs are in dB of power; MCD is defined on natural-log amplitude
+DB_TO_LOG_AMPLITUDE = np.log(10) / 20
+
+def _cepstra(audio, sr):
+    """Mel cepstra without c0 (energy), frames on the voice_features hop"""
+    mfcc = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=N_CEPSTRA + 1, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    return mfcc[1:] * DB_TO_LOG_AMPLITUDE
+
+def mcd_dtw(audio, target, sr=24000):
+    """
+    Mel-cepstral distortion (dB) between audio and a target recording of
+    the same text, over the DTW alignment of their cepstra (MFCC-based,
+    so comparable between runs here rather than with SPTK mcep numbers).
+    Returns (mcd, path) where path is the (audio frame, target frame) pairs.
+    """
+    a, b = _cepstra(audio, sr), _cepstra(target, sr)
+    _, path = librosa.sequence.dtw(X=a, Y=b, metric="euclidean")
+    path = path[::-1]
+    diff = a[:, path[:, 0]] - b[:, path[:, 1]]
+    return float(MCD_SCALE * np.mean(np.sqrt(np.sum(diff ** 2, axis=0)))), path
+
+def f0_contour(audio, sr=24000):
+    """pYIN F0 per frame (Hz), NaN where unvoiced"""
+    f0, voiced, _ = librosa.pyin(audio, fmin=F0_MIN, fmax=F0_MAX, sr=sr, frame_length=N_FFT,
+                                 hop_length=HOP_LENGTH)
+    return np.where(voiced, f0, np.nan)
+
+def f0_rmse(audio, target, path, sr=24000, target_f0=None):
+    """F0 RMSE (Hz) over aligned frames voiced in both; None if none are"""
+    f0_a = f0_contour(audio, sr)
+    f0_b = target_f0 if target_f0 is not None else f0_contour(target, sr)
+    rows = np.clip(path[:, 0], 0, len(f0_a) - 1)
+    cols = np.clip(path[:, 1], 0, len(f0_b) - 1)
+    diff = f0_a[rows] - f0_b[cols]
+    diff = diff[~np.isnan(diff)]
+    return float(np.sqrt(np.mean(diff ** 2))) if len(diff) else None
+
+def find_parallel_targets(pairs=(("voice_sample_transcript.txt", "processed_voice_sample.wav"),),
+                          transcripts_dir="transcripts", audio_dir="processed_samples"):
+    """
+    {normalized text: recording} for every recording whose transcript is
+    known: the explicit (transcript, audio) pairs plus the dataset's
+    transcripts/<stem>.txt next to processed_samples/<stem>.wav. Templates
+    that were never transcribed are skipped.
+    """
+    candidates = list(pairs)
+    for transcript_path in sorted(glob.glob(os.path.join(transcripts_dir, "*.txt"))):
+        stem = os.path.splitext(os.path.basename(transcript_path))[0]
+        candidates.append((transcript_path, os.path.join(audio_dir, f"{stem}.wav")))
+    
+    targets = {}
+    for transcript_path, audio_path in candidates:
+        if not os.path.exists(audio_path):
+            continue
+        try:
+            text = read_transcript(transcript_path)
+        except UnicodeDecodeError:
+            print(f"⚠️  Skipping {transcript_path}: can't decode it")
+            continue
+        # Untranscribed templates are not recordings of their (placeholder) text
+        if not is_untranscribed(text):
+            targets.setdefault(normalize_text(text), audio_path)
+    return targets
+
+class ObjectiveScorer:
+    """
+    Scores clips against a speaker's reference recordings. Speaker
+    similarity is the best cosine similarity of voice features to any
+    reference (features come from one VoiceFeatureExtractor, so references
+    are extracted once). When a recording of the clip's own text is known
+    (targets), MCD and F0 RMSE are measured against it; otherwise they
+    are None. SNR needs no reference.
+    """
+    
+    def __init__(self, reference_paths, targets=None, sr=24000, extractor=None):
+        self.reference_paths = list(reference_paths)
+        self.targets = targets or {}
+        self.sr = sr
+        self.extractor = extractor or VoiceFeatureExtractor(sr=sr)
+        self._target_audio = {}
+    
+    def _target(self, text):
+        """(audio, F0 contour) of the recording of text, loaded once; None if there is none"""
+        path = self.targets.get(normalize_text(text))
+        if path is None:
+            return None
+        if path not in self._target_audio:
+            audio = librosa.load(path, sr=self.sr)[0]
+            self._target_audio[path] = (audio, f0_contour(audio, self.sr))
+        return self._target_audio[path]
+    
+    def score(self, clips):
+        """
+        clips: list of (audio path, text). Returns one metrics dict per
+        clip; speaker similarity for all clips comes from one batched
+        feature extraction.
+        """
+        if not clips:
+            return []
+        similarity = self.extractor.similarity_matrix([path for path, _ in clips], self.reference_paths)
+        
+        scores = []
+        for (path, text), row in zip(clips, similarity):
+            audio = librosa.load(path, sr=self.sr)[0]
+            metrics = {
+                "speaker_similarity": float(row.max()),
+                "snr_db": estimate_snr_db(audio, self.sr),
+                "mcd_db": None,
+                "f0_rmse_hz": None
+            }
+            target = self._target(text)
+            if target is not None:
+                target_audio, target_f0 = target
+                metrics["mcd_db"], path_pairs = mcd_dtw(audio, target_audio, self.sr)
+                metrics["f0_rmse_hz"] = f0_rmse(audio, target_audio, path_pairs, self.sr, target_f0)
+            scores.append(metrics)
+        return scores
+
+def aggregate(metric_dicts):
+    """Mean, std and count per metric, ignoring missing values"""
+    summary = {}
+    for name in sorted({name for metrics in metric_dicts for name in metrics}):
+        values = np.array([m[name] for m in metric_dicts if m.get(name) is not None], dtype=np.float64)
+        summary[name] = ({"mean": float(values.mean()), "std": float(values.std()), "n": len(values)}
+                         if len(values) else {"n": 0})
+    return summary
@@ -0,0 +1,211 @@
+# pack_dataset.py
+# Pack processed clips into one memory-mapped array for fast loading
+
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import numpy as np
+import soundfile as sf
+from datetime import datetime
+
+PACK_VERSION = 1
+PACK_DTYPES = ("int16", "float16")
+
+def read_transcript(path):
+    """
+    Read a transcript file, dropping the '#' header lines the batch processor writes.
+    UTF-16 files (with a BOM, as some Windows editors save them) and UTF-8
+    with or without a BOM are both accepted.
+    """
+    if not os.path.exists(path):
+        return ""
+    with open(path, "rb") as f:
+        raw = f.read()
+    text = raw.decode("utf-16") if raw[:2] in (b"\xff\xfe", b"\xfe\xff") else raw.decode("utf-8-sig")
+    lines = [line for line in text.splitlines() if not line.lstrip().startswith("#")]
+    return " ".join(line.strip() for line in lines if line.strip())
+
+def audio_sha256(clip, sample_rate):
+    """Hash of a clip's decoded samples, independent of the file it came from"""
+    clip = np.ascontiguousarray(clip)
+    digest = hashlib.sha256(f"{sample_rate}:{clip.dtype.str}:".encode())
+    digest.update(clip.data)
+    return digest.hexdigest()
+
+def load_dataset_entries(source="dataset_metadata.json"):
+    """
+    List (sample id, audio path, transcript path, original file) for a dataset.
+    
+    Accepts batch_audio_processor's dataset_metadata.json (clips in
+    processed_samples/, transcripts in transcripts/) or Create_dataset.py's
+    voice_dataset/metadata.json (paths relative to the dataset directory).
+    """
+    with open(source, "r") as f:
+        metadata = json.load(f)
+    
+    entries = []
+    if "processed_files" in metadata:
+        for item in metadata["processed_files"]:
+            sample_id = os.path.splitext(item["processed_file"])[0]
+            entries.append((
+                sample_id,
+                os.path.join("processed_samples", item["processed_file"]),
+                os.path.join("transcripts", f"{sample_id}.txt"),
+                item.get("original_file")
+            ))
+    elif "samples" in metadata:
+        root = os.path.dirname(source)
+        for item in metadata["samples"]:
+            entries.append((
+                item["id"],
+                os.path.join(root, item["audio_file"]),
+                os.path.join(root, item["transcript_file"]),
+                item.get("audio_file")
+            ))
+    else:
+        raise ValueError(f"{source} has neither 'processed_files' nor 'samples'")
+    
+    return entries
+
+def pack_dataset(source="dataset_metadata.json", output_dir="packed_dataset", dtype="int16"):
+    """
+    Concatenate every clip into output_dir/audio.npy with an offsets index
+    (index.npy, rows of [start, length]) and the transcript table
+    (samples.json). The pack is built in a temporary directory and moved
+    into place, so readers never see a half-written pack.
+    """
+    print("📦 PACKING DATASET")
+    print("="*50)
+    
+    if dtype not in PACK_DTYPES:
+        raise ValueError(f"dtype must be one of {PACK_DTYPES}, got {dtype}")
+    
+    if not os.path.exists(source):
+        print(f"❌ {source} not found!")
+        print("Run batch_audio_processor.py first")
+        return False
+    
+    entries = load_dataset_entries(source)
+    
+    # Read headers only, so the packed array can be allocated at its final size
+    infos = []
+    for sample_id, audio_path, transcript_path, original in entries:
+        if not os.path.exists(audio_path):
+            print(f"  ⚠️  Missing audio, skipped: {audio_path}")
+            continue
+        infos.append((sample_id, audio_path, transcript_path, original, sf.info(audio_path)))
+    
+    if len(infos) == 0:
+        print("❌ No clips to pack")
+        return False
+    
+    sample_rates = {info.samplerate for *_, info in infos}
+    if len(sample_rates) != 1:
+        print(f"❌ Clips have mixed sample rates: {sorted(sample_rates)}")
+        return False
+    sample_rate = sample_rates.pop()
+    
+    lengths = np.array([info.frames for *_, info in infos], dtype=np.int64)
+    index = np.stack([np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths], axis=1)
+    
+    tmp_dir = output_dir.rstrip("/") + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    
+    audio = np.lib.format.open_memmap(os.path.join(tmp_dir, "audio.npy"), mode="w+",
+                                      dtype=dtype, shape=(int(lengths.sum()),))
+    samples = []
+    for (sample_id, audio_path, transcript_path, original, info), (start, length) in zip(infos, index):
+        # int16 is read straight from the PCM data; float16 goes through float32
+        clip, _ = sf.read(audio_path, dtype="int16" if dtype == "int16" else "float32", always_2d=True)
+        audio[start:start + length] = clip[:, 0] if clip.shape[1] == 1 else clip.mean(axis=1)
+        
+        samples.append({
+            "id": sample_id,
+            "audio_sha256": audio_sha256(audio[start:start + length], sample_rate),
+            "audio_file": audio_path,
+            "original_file": original,
+            "transcript": read_transcript(transcript_path),
+            "duration": float(length) / sample_rate
+        })
+    
+    audio.flush()
+    del audio
+    np.save(os.path.join(tmp_dir, "index.npy"), index)
+    
+    with open(os.path.join(tmp_dir, "samples.json"), "w") as f:
+        json.dump({
+            "version": PACK_VERSION,
+            "created": datetime.now().isoformat(),
+            "source": source,
+            "sample_rate": sample_rate,
+            "dtype": dtype,
+            "total_samples": len(samples),
+            "samples": samples
+        }, f, indent=2)
+    
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.replace(tmp_dir, output_dir)
+    
+    print(f"✅ Packed {len(samples)} clips ({lengths.sum() / sample_rate / 60:.1f} min) into {output_dir}/")
+    return True
+
+class PackedDataset:
+    """
+    Read-only view of a pack written by pack_dataset(). Opening it only maps
+    the files; dataset[i] returns a zero-copy slice of the mapped array and
+    the transcript.
+    """
+    
+    def __init__(self, path="packed_dataset"):
+        with open(os.path.join(path, "samples.json"), "r") as f:
+            table = json.load(f)
+        if table.get("version") != PACK_VERSION:
+            raise ValueError(f"Unsupported pack version in {path}: {table.get('version')}")
+        
+        self.path = path
+        self.sample_rate = table["sample_rate"]
+        self.dtype = table["dtype"]
+        self.samples = table["samples"]
+        self.audio = np.load(os.path.join(path, "audio.npy"), mmap_mode="r")
+        self.index = np.load(os.path.join(path, "index.npy"), mmap_mode="r")
+    
+    def __len__(self):
+        return len(self.samples)
+    
+    def __getitem__(self, i):
+        start, length = self.index[i]
+        return self.audio[start:start + length], self.samples[i]["transcript"]
+    
+    def float_audio(self, i):
+        """Sample i as float32 in [-1, 1] (copies, unlike indexing)"""
+        clip, _ = self[i]
+        if self.dtype == "int16":
+            return clip.astype(np.float32) / 32768.0
+        return clip.astype(np.float32)
+    
+    def audio_hash(self, i):
+        """Content hash of sample i, as recorded at pack time"""
+        sample = self.samples[i]
+        if "audio_sha256" not in sample:
+            sample["audio_sha256"] = audio_sha256(self[i][0], self.sample_rate)
+        return sample["audio_sha256"]
+    
+    def lengths(self):
+        """Clip lengths in samples, without touching the audio"""
+        return np.asarray(self.index[:, 1])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack processed clips into a memory-mapped dataset")
+    parser.add_argument("--source", default="dataset_metadata.json",
+                        help="dataset_metadata.json or voice_dataset/metadata.json")
+    parser.add_argument("--output", default="packed_dataset",
+                        help="Output directory (default: packed_dataset)")
+    parser.add_argument("--dtype", choices=PACK_DTYPES, default="int16")
+    args = parser.parse_args()
+    
+    pack_dataset(args.source, args.output, args.dtype)
@@ -1,36 +1,58 @@
 # parameter_experiments.py
 import json
-import time
+import argparse
 
-def experiment_with_parameters():
+from benchmark_generation import benchmark, compare_reports, make_report
+from sweep import expand_grid, one_at_a_time, print_table, run_sweep, write_table
+
+# Parameter ranges to test
+EXPERIMENTS = {
+    "temperature_test": {
+        "base_params": {"top_k": 50, "repetition_penalty": 1.1},
+        "variable": "temperature",
+        "values": [0.3, 0.5, 0.7, 0.9, 1.1]
+    },
+    "top_k_test": {
+        "base_params": {"temperature": 0.7, "repetition_penalty": 1.1},
+        "variable": "top_k", 
+        "values": [10, 25, 50, 75, 100]
+    },
+    "repetition_penalty_test": {
+        "base_params": {"temperature": 0.7, "top_k": 50},
+        "variable": "repetition_penalty",
+        "values": [1.0, 1.05, 1.1, 1.15, 1.2]
+    }
+}
+
+TEST_TEXT = "This is a parameter testing experiment for voice cloning."
+
+def sweep_points(experiments=EXPERIMENTS):
+    """All points of the one-variable-at-a-time experiments (run_sweep drops the repeated centre point)"""
+    return [point for config in experiments.values()
+            for point in one_at_a_time(config["base_params"], config["variable"], config["values"])]
+
+def parse_grid(specs):
+    """["temperature=0.5,0.7", "top_k=25,50"] -> {"temperature": [0.5, 0.7], "top_k": [25, 50]}"""
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        grid[name] = [int(v) if name in ("top_k", "max_tokens", "seed") else float(v) for v in values.split(",")]
+    return grid
+
+def experiment_with_parameters(model, warmup=1, trials=5, confidence=0.95, output="parameter_experiments.json"):
     """
-    Systematic experimentation with different parameters
+    Systematic experimentation with different parameters. Each setting
+    gets warmup untimed runs and trials timed ones; the report (see
+    benchmark_generation.make_report) records wall time, time to first
+    token, tokens/s, real-time factor and peak memory with confidence
+    intervals, so runs can be compared with --compare.
     """
     print("🔬 Starting parameter experiments...")
-    
-    # Parameter ranges to test
-    experiments = {
-        "temperature_test": {
-            "base_params": {"top_k": 50, "repetition_penalty": 1.1},
-            "variable": "temperature",
-            "values": [0.3, 0.5, 0.7, 0.9, 1.1]
-        },
-        "top_k_test": {
-            "base_params": {"temperature": 0.7, "repetition_penalty": 1.1},
-            "variable": "top_k", 
-            "values": [10, 25, 50, 75, 100]
-        },
-        "repetition_penalty_test": {
-            "base_params": {"temperature": 0.7, "top_k": 50},
-            "variable": "repetition_penalty",
-            "values": [1.0, 1.05, 1.1, 1.15, 1.2]
-        }
-    }
+    print(f"   {warmup} warm-up run(s), {trials} timed trial(s) per setting")
     
     results = {}
-    test_text = "This is a parameter testing experiment for voice cloning."
     
-    for exp_name, exp_config in experiments.items():
+    for exp_name, exp_config in EXPERIMENTS.items():
         print(f"\n📊 Running {exp_name}...")
         results[exp_name] = []
         
@@ -41,24 +63,18 @@ def experiment_with_parameters():
             print(f"  Testing {exp_config['variable']}={value}")
             
             try:
-                start_time = time.time()
-                
-                # Generate audio with current parameters
-                # (Replace with actual Orpheus API call)
                 output_file = f"experiment_{exp_name}_{exp_config['variable']}_{value}.wav"
-                
-                generation_time = time.time() - start_time
-                
-                result = {
-                    "parameters": params,
-                    "output_file": output_file,
-                    "generation_time": generation_time,
-                    "success": True
-                }
+                result = benchmark(model, dict(params, text=TEST_TEXT), warmup, trials, confidence, output_file)
+                result.update(parameters=params, output_file=output_file)
                 
                 results[exp_name].append(result)
-                print(f"    ✅ Success in {generation_time:.2f}s")
-                
+                wall = result["metrics"]["wall_seconds"]
+                if result["success"]:
+                    print(f"    ✅ {wall['mean']:.2f}s (CI {wall['ci_low']:.2f}-{wall['ci_high']:.2f}s), "
+                          f"{result['failures']} failed trial(s)")
+                else:
+                    print(f"    ❌ All trials failed: {result['errors'][0]}")
+            
             except Exception as e:
                 result = {
                     "parameters": params,
@@ -69,11 +85,67 @@ def experiment_with_parameters():
                 print(f"    ❌ Failed: {e}")
     
     # Save experiment results
-    with open("parameter_experiments.json", "w") as f:
-        json.dump(results, f, indent=2)
+    report = make_report(model, results, warmup, trials, confidence)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
     
-    print("\n📋 Experiment results saved to parameter_experiments.json")
-    return results
+    print(f"\n📋 Experiment results saved to {output}")
+    return report
+
+def sweep_parameters(model, points, texts=(TEST_TEXT,), output_dir="sweep_outputs", table="sweep_results.csv",
+                     batch_size=32):
+    """
+    Generate (rather than time) every point: duplicates are dropped,
+    points go to the engine in batches and finished points are
+    checkpointed, so an interrupted sweep picks up where it stopped.
+    """
+    print(f"🔬 Sweeping {len(points)} parameter points...")
+    rows = run_sweep(model, points, list(texts), output_dir, batch_size=batch_size)
+    write_table(rows, table)
+    print()
+    print_table(rows)
+    print(f"\n📋 Sweep table saved to {table}")
+    return rows
 
 if __name__ == "__main__":
-    experiment_with_parameters()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Benchmark generation across sampling parameters")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--output", default="parameter_experiments.json")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="Report regressions against an earlier parameter_experiments.json")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="Relative change below which a difference is ignored")
+    parser.add_argument("--sweep", action="store_true",
+                        help="Generate every point in batches with checkpoint/resume instead of timing")
+    parser.add_argument("--grid", nargs="+", metavar="NAME=V1,V2",
+                        help="Sweep the full Cartesian product of these values (implies --sweep)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--stand-in", action="store_true",
+                        help="Use the lightweight stand-in model (no GPU needed)")
+    args = parser.parse_args()
+    
+    from model_registry import StandInModel, shared_model
+    
+    def run(model):
+        if args.grid:
+            return sweep_parameters(model, expand_grid(parse_grid(args.grid)), batch_size=args.batch_size)
+        if args.sweep:
+            return sweep_parameters(model, sweep_points(), batch_size=args.batch_size)
+        return experiment_with_parameters(model, args.warmup, args.trials, args.confidence, args.output)
+    
+    if args.stand_in:
+        report = run(StandInModel("stand-in", 2048))
+    else:
+        with shared_model("canopylabs/orpheus-3b-0.1-ft", max_model_len=2048) as model:
+            report = run(model)
+    
+    if args.compare and not (args.sweep or args.grid):
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_reports(baseline, report, args.tolerance)
+        print(f"\n🔍 {len(regressions)} regression(s) against {args.compare}")
+        for regression in regressions:
+            print(f"  ⚠️  {regression['experiment']} {regression['parameters']}: {regression['metric']} "
+                  f"{regression['baseline']:.3f} -> {regression['current']:.3f} ({regression['change']:+.0%})")
\ No newline at end of file
@@ -0,0 +1,172 @@
+# pretokenize.py
+# Encode packed clips into codec tokens once, for every training epoch to reuse
+
+import os
+import json
+import argparse
+import numpy as np
+from datetime import datetime
+
+from audio_codec import ENCODERS, get_encoder
+from dataset_qc import rejected_hashes
+from pack_dataset import PackedDataset
+
+CACHE_VERSION = 1
+
+class TokenCache:
+    """
+    Append-only token store for one codec: int32 shards (shard_NNNNN.npy)
+    plus index.json mapping audio hash -> [shard, start, length].
+    Shards are memory-mapped on first use; get() returns a zero-copy slice.
+    """
+    
+    def __init__(self, cache_dir, encoder_name):
+        self.cache_dir = os.path.join(cache_dir, encoder_name)
+        self.encoder_name = encoder_name
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        self.entries = {}
+        self.shard_count = 0
+        self._shards = {}
+        
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            if index.get("version") == CACHE_VERSION and index.get("encoder") == encoder_name:
+                self.entries = index["entries"]
+                self.shard_count = index["shard_count"]
+    
+    def __contains__(self, audio_hash):
+        return audio_hash in self.entries
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def get(self, audio_hash):
+        shard, start, length = self.entries[audio_hash]
+        if shard not in self._shards:
+            self._shards[shard] = np.load(self._shard_path(shard), mmap_mode="r")
+        return self._shards[shard][start:start + length]
+    
+    def _shard_path(self, shard):
+        return os.path.join(self.cache_dir, f"shard_{shard:05d}.npy")
+    
+    def append(self, tokens_by_hash):
+        """
+        Write new token sequences as one shard, then publish them in the index.
+        Both files are replaced atomically; a crash leaves the old index valid.
+        """
+        if not tokens_by_hash:
+            return
+        
+        os.makedirs(self.cache_dir, exist_ok=True)
+        shard = self.shard_count
+        lengths = [len(tokens) for tokens in tokens_by_hash.values()]
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        
+        tmp_path = self._shard_path(shard) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.concatenate(list(tokens_by_hash.values())).astype(np.int32))
+        os.replace(tmp_path, self._shard_path(shard))
+        
+        for audio_hash, start, length in zip(tokens_by_hash, starts, lengths):
+            self.entries[audio_hash] = [shard, int(start), int(length)]
+        self.shard_count = shard + 1
+        
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "version": CACHE_VERSION,
+                "encoder": self.encoder_name,
+                "updated": datetime.now().isoformat(),
+                "shard_count": self.shard_count,
+                "entries": self.entries
+            }, f)
+        os.replace(tmp_path, self.index_path)
+
+def pretokenize_dataset(packed_dir="packed_dataset", cache_dir="token_cache", encoder="snac_24khz",
+                        qc_manifest="qc_manifest.json"):
+    """
+    Encode every packed clip not already in the token cache. Clips are
+    keyed by audio hash, so re-running with unchanged audio writes nothing.
+    Clips rejected by the QC manifest (dataset_qc.py) are not encoded.
+    """
+    print("🔢 PRE-TOKENIZING AUDIO")
+    print("="*50)
+    
+    if not os.path.exists(packed_dir):
+        print(f"❌ {packed_dir} not found!")
+        print("Run pack_dataset.py first")
+        return False
+    
+    dataset = PackedDataset(packed_dir)
+    if isinstance(encoder, str):
+        encoder = get_encoder(encoder)
+    if dataset.sample_rate != encoder.sample_rate:
+        print(f"❌ Pack is {dataset.sample_rate}Hz but {encoder.name} expects {encoder.sample_rate}Hz")
+        return False
+    
+    cache = TokenCache(cache_dir, encoder.name)
+    rejected = rejected_hashes(qc_manifest) or set()
+    missing = {}
+    skipped = 0
+    for i in range(len(dataset)):
+        audio_hash = dataset.audio_hash(i)
+        if audio_hash in rejected:
+            skipped += 1
+        elif audio_hash not in cache and audio_hash not in missing:
+            missing[audio_hash] = i
+    
+    print(f"📊 {len(dataset)} clips, {len(dataset) - len(missing) - skipped} already cached, "
+          f"{skipped} rejected by QC")
+    
+    if not missing:
+        print("✅ Token cache is up to date")
+        return True
+    
+    new_tokens = {}
+    for count, (audio_hash, i) in enumerate(missing.items()):
+        new_tokens[audio_hash] = encoder.encode(dataset.float_audio(i))
+        if (count + 1) % 100 == 0:
+            print(f"  🔄 Encoded {count + 1}/{len(missing)}")
+    
+    cache.append(new_tokens)
+    total = sum(len(tokens) for tokens in new_tokens.values())
+    print(f"✅ Encoded {len(new_tokens)} clips ({total} tokens) into {cache.cache_dir}/")
+    return True
+
+def load_pretokenized(packed_dir="packed_dataset", cache_dir="token_cache", encoder_name="snac_24khz",
+                      exclude=()):
+    """
+    Training view of the dataset: one dict per clip with its id, transcript
+    and audio tokens (a zero-copy slice of the cache), leaving out clips
+    whose audio hash is in exclude. Raises if any other clip has not been
+    pre-tokenized yet.
+    """
+    dataset = PackedDataset(packed_dir)
+    cache = TokenCache(cache_dir, encoder_name)
+    
+    samples = []
+    for i, sample in enumerate(dataset.samples):
+        audio_hash = dataset.audio_hash(i)
+        if audio_hash in exclude:
+            continue
+        if audio_hash not in cache:
+            raise KeyError(f"{sample['id']} is not pre-tokenized; run pretokenize.py")
+        samples.append({
+            "id": sample["id"],
+            "transcript": sample["transcript"],
+            "audio_tokens": cache.get(audio_hash)
+        })
+    
+    return samples
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Encode packed clips into cached codec tokens")
+    parser.add_argument("--packed-dir", default="packed_dataset")
+    parser.add_argument("--cache-dir", default="token_cache")
+    parser.add_argument("--codec", choices=sorted(ENCODERS), default="snac_24khz")
+    parser.add_argument("--qc-manifest", default="qc_manifest.json",
+                        help="Skip clips this dataset_qc.py manifest rejects")
+    args = parser.parse_args()
+    
+    pretokenize_dataset(args.packed_dir, args.cache_dir, args.codec, args.qc_manifest)
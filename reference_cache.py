@@ -0,0 +1,200 @@
+# reference_cache.py
+# Encode a speaker's reference clips once and reuse them as a zero-shot prompt
+
+import os
+import json
+import time
+import atexit
+import hashlib
+import argparse
+import numpy as np
+import librosa
+
+from audio_codec import ENCODERS, get_encoder
+from pack_dataset import audio_sha256, read_transcript
+from resampling import DEFAULT_RESAMPLER, resample
+from training_data import (END_OF_TEXT, START_OF_HUMAN, END_OF_HUMAN, START_OF_AI, START_OF_SPEECH,
+                           build_sequence)
+
+CACHE_VERSION = 1
+
+class ReferenceCache:
+    """
+    On-disk store of encoded speaker references for one codec. An entry
+    holds the codec tokens and transcript for one or more reference clips,
+    keyed by the clips' decoded-audio hashes, so renaming or re-saving a
+    file doesn't invalidate it but changing the audio does.
+    
+    Entries live in cache_dir/<codec>/<key>.npy with index.json tracking
+    size and last use; once the total exceeds max_bytes the least recently
+    used entries are deleted. index.json also maps (path, size, mtime) to
+    the audio hash, so a later process finds a hit without decoding the
+    clip. Hits only update last use in memory; the index is written on the
+    next miss or at close() (called at exit).
+    """
+    
+    def __init__(self, cache_dir="reference_cache", encoder="snac_24khz", max_bytes=64 << 20):
+        self.encoder = get_encoder(encoder) if isinstance(encoder, str) else encoder
+        self.cache_dir = os.path.join(cache_dir, self.encoder.name)
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        self.max_bytes = max_bytes
+        self.entries = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "encode_seconds": 0.0}
+        # "path|size|mtime" -> audio hash, so a hit doesn't even re-hash the file
+        self._file_hashes = {}
+        self._loaded = {}
+        self._dirty = False
+        
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            if index.get("version") == CACHE_VERSION and index.get("encoder") == self.encoder.name:
+                self.entries = index["entries"]
+                self._file_hashes = index.get("file_hashes", {})
+        atexit.register(self.close)
+    
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+    
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": CACHE_VERSION, "encoder": self.encoder.name, "entries": self.entries,
+                       "file_hashes": self._file_hashes}, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+    
+    def close(self):
+        """Write pending last-use and file-hash updates"""
+        if self._dirty:
+            self._save_index()
+    
+    def _load_clip(self, path):
+        """Mono float32 clip at the codec rate plus its content hash"""
+        audio, sr = librosa.load(path, sr=None, mono=True)
+        if sr != self.encoder.sample_rate:
+            audio = resample(audio, sr, self.encoder.sample_rate, DEFAULT_RESAMPLER)
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        return audio, audio_sha256(audio, self.encoder.sample_rate)
+    
+    def clip_hash(self, path):
+        stat = os.stat(path)
+        path = os.path.abspath(path)
+        file_key = f"{path}|{stat.st_size}|{stat.st_mtime_ns}"
+        if file_key not in self._file_hashes:
+            # Forget the hash of this path's previous contents
+            for old_key in [k for k in self._file_hashes if k.rsplit("|", 2)[0] == path]:
+                del self._file_hashes[old_key]
+            self._file_hashes[file_key] = self._load_clip(path)[1]
+            self._dirty = True
+        return self._file_hashes[file_key]
+    
+    def reference_key(self, paths):
+        """Cache key for an ordered list of reference clips"""
+        digest = hashlib.sha256(self.encoder.name.encode())
+        for path in paths:
+            digest.update(self.clip_hash(path).encode())
+        return digest.hexdigest()[:32]
+    
+    def get_reference(self, paths, transcripts=None):
+        """
+        The encoded reference for one or more clips: a dict with key,
+        audio_tokens (int32, clips concatenated in order), transcript and
+        clips. Encodes and stores it on first use. transcripts defaults
+        to each clip's sibling .txt file (or transcripts/<stem>.txt).
+        """
+        if isinstance(paths, str):
+            paths = [paths]
+        key = self.reference_key(paths)
+        
+        if key in self.entries and os.path.exists(self._entry_path(key)):
+            self.stats["hits"] += 1
+            self.entries[key]["last_used"] = time.time()
+            self._dirty = True
+            if key not in self._loaded:
+                self._loaded[key] = np.load(self._entry_path(key))
+            entry = self.entries[key]
+            return {"key": key, "audio_tokens": self._loaded[key], "transcript": entry["transcript"],
+                    "clips": entry["clips"]}
+        
+        self.stats["misses"] += 1
+        if transcripts is None:
+            transcripts = [_default_transcript(path) for path in paths]
+        
+        start = time.perf_counter()
+        tokens = [self.encoder.encode(self._load_clip(path)[0]) for path in paths]
+        tokens = np.concatenate(tokens).astype(np.int32)
+        self.stats["encode_seconds"] += time.perf_counter() - start
+        
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._entry_path(key) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, tokens)
+        os.replace(tmp_path, self._entry_path(key))
+        
+        transcript = " ".join(t.strip() for t in transcripts if t and t.strip())
+        self.entries[key] = {
+            "clips": [os.path.basename(path) for path in paths],
+            "transcript": transcript,
+            "tokens": len(tokens),
+            "bytes": os.path.getsize(self._entry_path(key)),
+            "last_used": time.time()
+        }
+        self._loaded[key] = tokens
+        self._evict(keep=key)
+        self._save_index()
+        return {"key": key, "audio_tokens": tokens, "transcript": transcript, "clips": self.entries[key]["clips"]}
+    
+    def _evict(self, keep=None):
+        """Delete least recently used entries until the cache fits max_bytes"""
+        total = sum(entry["bytes"] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self.entries.pop(key)["bytes"]
+            self._loaded.pop(key, None)
+            if os.path.exists(self._entry_path(key)):
+                os.remove(self._entry_path(key))
+            self.stats["evictions"] += 1
+    
+    def size_bytes(self):
+        return sum(entry["bytes"] for entry in self.entries.values())
+
+def _default_transcript(path):
+    stem = os.path.splitext(path)[0]
+    for candidate in (f"{stem}.txt", f"{stem}_transcript.txt",
+                      os.path.join("transcripts", f"{os.path.basename(stem)}.txt")):
+        if os.path.exists(candidate):
+            return read_transcript(candidate)
+    return ""
+
+def reference_prompt_ids(reference, tokenizer, text):
+    """
+    Zero-shot prompt token ids: the reference as a finished human/AI turn
+    (its transcript, then its speech tokens), then the new text as an open
+    turn waiting for speech. The reference audio was encoded once by the
+    cache; per request only text is tokenized, and since the prefix is
+    identical every time the engine's prefix cache can reuse it as well.
+    """
+    return np.concatenate([
+        build_sequence(tokenizer.encode(reference["transcript"]), reference["audio_tokens"]),
+        [START_OF_HUMAN], tokenizer.encode(text), [END_OF_TEXT, END_OF_HUMAN, START_OF_AI, START_OF_SPEECH]
+    ]).astype(np.int64).tolist()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Encode reference clips into the reference cache")
+    parser.add_argument("clips", nargs="+", help="Reference audio files (one speaker)")
+    parser.add_argument("--cache-dir", default="reference_cache")
+    parser.add_argument("--codec", choices=sorted(ENCODERS), default="snac_24khz")
+    parser.add_argument("--max-mb", type=float, default=64)
+    args = parser.parse_args()
+    
+    cache = ReferenceCache(args.cache_dir, args.codec, int(args.max_mb * (1 << 20)))
+    reference = cache.get_reference(args.clips)
+    status = "♻️  Cached" if cache.stats["hits"] else "✅ Encoded"
+    print(f"{status} reference {reference['key']}: {len(reference['audio_tokens'])} tokens "
+          f"from {len(reference['clips'])} clip(s)")
+    print(f"📝 Transcript: '{reference['transcript'][:60]}'")
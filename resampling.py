@@ -0,0 +1,116 @@
+# resampling.py
+# Pluggable resamplers with cached filters for conversion to 24 kHz
+
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+import soxr
+from scipy.signal import firwin, upfirdn
+
+# soxr_hq matches librosa's default res_type, so it is the reference output
+RESAMPLER_BACKENDS = ("soxr_hq", "soxr_vhq", "polyphase")
+DEFAULT_RESAMPLER = "soxr_hq"
+
+_SOXR_QUALITY = {"soxr_hq": "HQ", "soxr_vhq": "VHQ"}
+
+@lru_cache(maxsize=32)
+def polyphase_filter(orig_sr, target_sr):
+    """
+    Design (once per rate pair) the anti-aliasing filter used by
+    scipy.signal.resample_poly, pre-padded for direct use with upfirdn.
+    Returns (up, down, filter taps, number of leading outputs to drop).
+    """
+    g = gcd(int(orig_sr), int(target_sr))
+    up, down = int(target_sr) // g, int(orig_sr) // g
+    
+    # Same design as resample_poly's default kaiser window
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    h = firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0)) * up
+    
+    n_pre_pad = down - half_len % down
+    h = np.concatenate([np.zeros(n_pre_pad), h]).astype(np.float32)
+    h.flags.writeable = False
+    n_pre_remove = (half_len + n_pre_pad) // down
+    
+    return up, down, h, n_pre_remove
+
+class PolyphaseStream:
+    """
+    Streaming polyphase resampler. Output is identical to
+    scipy.signal.resample_poly on the concatenated input, but the filter
+    comes from the polyphase_filter() cache and blocks can be fed one at a time.
+    Has the same resample_chunk/clear interface as soxr.ResampleStream.
+    """
+    
+    def __init__(self, orig_sr, target_sr):
+        self.up, self.down, self.h, self.n_pre_remove = polyphase_filter(orig_sr, target_sr)
+        self.clear()
+    
+    def clear(self):
+        """Reset to the start of a new signal"""
+        self.buffer = np.zeros(0, dtype=np.float32)
+        # Input index of buffer[0]; always a multiple of down so upfirdn
+        # output samples stay aligned with the global output grid
+        self.buffer_start = 0
+        self.total_in = 0
+        self.next_out = self.n_pre_remove
+    
+    def resample_chunk(self, x, last=False):
+        """Resample the next block; pass last=True on the final block to flush"""
+        up, down, h = self.up, self.down, self.h
+        self.buffer = np.concatenate([self.buffer, np.asarray(x, dtype=np.float32)])
+        self.total_in += len(x)
+        
+        if last:
+            # resample_poly's output length, in upfirdn output coordinates
+            stop = -(-self.total_in * up // down) + self.n_pre_remove
+        else:
+            # Outputs whose newest input sample has already arrived
+            stop = (self.total_in * up - 1) // down + 1 if self.total_in else 0
+        
+        if stop <= self.next_out or len(self.buffer) == 0:
+            return np.zeros(0, dtype=np.float32)
+        
+        offset = self.buffer_start * up // down
+        out = upfirdn(h, self.buffer, up, down)[self.next_out - offset:stop - offset]
+        self.next_out = stop
+        
+        # Keep only the input the next output still needs, from a multiple of down
+        needed = max(0, -(-(self.next_out * down - (len(h) - 1)) // up))
+        new_start = needed - needed % down
+        if new_start > self.buffer_start:
+            self.buffer = self.buffer[new_start - self.buffer_start:]
+            self.buffer_start = new_start
+        
+        return out.astype(np.float32)
+
+def make_resampler(orig_sr, target_sr, backend=DEFAULT_RESAMPLER):
+    """
+    New streaming resampler for one signal, with resample_chunk(x, last) and clear()
+    """
+    if backend == "polyphase":
+        return PolyphaseStream(orig_sr, target_sr)
+    if backend in _SOXR_QUALITY:
+        return soxr.ResampleStream(orig_sr, target_sr, 1, dtype='float32',
+                                   quality=_SOXR_QUALITY[backend])
+    raise ValueError(f"Unknown resampler backend: {backend} (choose from {', '.join(RESAMPLER_BACKENDS)})")
+
+def resample(audio, orig_sr, target_sr, backend=DEFAULT_RESAMPLER):
+    """
+    Resample a whole 1-D signal. The polyphase backend reuses its cached
+    filter for the rate pair; soxr's one-shot call already sets up faster
+    than a reused stream, so soxr backends call it directly.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if orig_sr == target_sr:
+        return audio
+    
+    if backend == "polyphase":
+        up, down, h, n_pre_remove = polyphase_filter(int(orig_sr), int(target_sr))
+        n_out = -(-len(audio) * up // down)
+        return upfirdn(h, audio, up, down)[n_pre_remove:n_pre_remove + n_out]
+    if backend in _SOXR_QUALITY:
+        return soxr.resample(audio, orig_sr, target_sr, quality=_SOXR_QUALITY[backend])
+    raise ValueError(f"Unknown resampler backend: {backend} (choose from {', '.join(RESAMPLER_BACKENDS)})")
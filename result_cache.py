@@ -0,0 +1,159 @@
+# result_cache.py
+# Content-addressed cache of generated audio for repeated deterministic requests
+
+import os
+import json
+import time
+import atexit
+import hashlib
+import unicodedata
+import numpy as np
+
+from batch_audio_processor import file_sha256
+
+CACHE_VERSION = 1
+
+def normalize_text(text):
+    """Unicode-normalized text with whitespace collapsed (case is kept; it can change prosody)"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+def is_deterministic(request):
+    """Greedy decoding, or sampling with a fixed seed, always gives the same audio"""
+    return request.get("temperature") == 0 or request.get("seed") is not None
+
+def voice_key(request):
+    """What the request is conditioned on: cached reference, reference file, or named voice"""
+    if request.get("reference") is not None:
+        return f"reference:{request['reference']['key']}"
+    if request.get("reference_audio"):
+        return f"reference_audio:{file_sha256(request['reference_audio'])}"
+    return f"voice:{request.get('voice')}"
+
+def model_id_for(model):
+    """
+    Identity of a loaded model for cache keys. A local checkpoint directory
+    also gets its newest file mtime, so retraining into the same path
+    doesn't serve the old model's audio.
+    """
+    name = getattr(model, "model_name", type(model).__name__)
+    if os.path.isdir(name):
+        mtimes = [os.path.getmtime(os.path.join(root, f)) for root, _, files in os.walk(name) for f in files]
+        return f"{os.path.abspath(name)}@{max(mtimes, default=0):.0f}"
+    return name
+
+def result_key(request, model_id):
+    """Cache key over everything that determines the generated audio"""
+    fields = {
+        "text": normalize_text(request["text"]),
+        "model": model_id,
+        "voice": voice_key(request),
+        "temperature": request.get("temperature"),
+        "top_k": request.get("top_k"),
+        "repetition_penalty": request.get("repetition_penalty"),
+        "max_tokens": request.get("max_tokens"),
+        "seed": request.get("seed")
+    }
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()[:32]
+
+class ResultCache:
+    """
+    Disk-backed store of generated audio (float32 .npy per entry plus
+    index.json). Only deterministic requests are looked up or stored;
+    everything else counts as uncacheable. Past max_bytes, the least
+    recently used entries are deleted. Hits update recency in memory;
+    the index is written on every put, on flush() and at close() (called
+    at exit), so a run of only hits still keeps its entries recent.
+    """
+    
+    def __init__(self, cache_dir="result_cache", max_bytes=512 << 20):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.max_bytes = max_bytes
+        self.entries = {}
+        self.stats = {"hits": 0, "misses": 0, "uncacheable": 0, "evictions": 0}
+        self._dirty = False
+        
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            if index.get("version") == CACHE_VERSION:
+                self.entries = index["entries"]
+        atexit.register(self.close)
+    
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+    
+    def get(self, request, model_id):
+        """(key, audio, sample_rate) on a hit; (key, None, None) on a miss; key is None if uncacheable"""
+        if not is_deterministic(request):
+            self.stats["uncacheable"] += 1
+            return None, None, None
+        
+        key = result_key(request, model_id)
+        entry = self.entries.get(key)
+        if entry is None or not os.path.exists(self._entry_path(key)):
+            self.stats["misses"] += 1
+            return key, None, None
+        
+        self.stats["hits"] += 1
+        entry["last_used"] = time.time()
+        entry["hits"] = entry.get("hits", 0) + 1
+        self._dirty = True
+        return key, np.load(self._entry_path(key)), entry["sample_rate"]
+    
+    def put(self, key, audio, sample_rate, text=""):
+        """Store audio under a key from get(), then evict down to max_bytes"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._entry_path(key) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(audio, dtype=np.float32))
+        os.replace(tmp_path, self._entry_path(key))
+        
+        self.entries[key] = {
+            "text": normalize_text(text)[:80],
+            "sample_rate": sample_rate,
+            "bytes": os.path.getsize(self._entry_path(key)),
+            "created": time.time(),
+            "last_used": time.time(),
+            "hits": 0
+        }
+        self._evict(keep=key)
+        self.flush()
+    
+    def _evict(self, keep=None):
+        total = self.size_bytes()
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self.entries.pop(key)["bytes"]
+            if os.path.exists(self._entry_path(key)):
+                os.remove(self._entry_path(key))
+            self.stats["evictions"] += 1
+    
+    def flush(self):
+        """Persist the index (recency and hit counts included)"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": CACHE_VERSION, "entries": self.entries}, f)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+    
+    def close(self):
+        """Write pending recency updates from hits"""
+        if self._dirty:
+            self.flush()
+    
+    def size_bytes(self):
+        return sum(entry["bytes"] for entry in self.entries.values())
+    
+    def metrics(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return dict(
+            self.stats,
+            hit_rate=self.stats["hits"] / lookups if lookups else 0.0,
+            entries=len(self.entries),
+            bytes=self.size_bytes()
+        )
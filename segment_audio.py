@@ -0,0 +1,306 @@
+# segment_audio.py
+# Split long recordings into many training clips at silence boundaries
+
+import os
+import json
+import argparse
+import numpy as np
+import soundfile as sf
+
+from audio_processor import iter_audio_blocks
+from resampling import DEFAULT_RESAMPLER
+from audio_normalization import NORMALIZATION_DEFAULTS, normalize_batch, pad_batch
+from batch_audio_processor import (DEDUP_MODES, file_sha256, load_manifest, save_manifest,
+                                   write_dataset_metadata)
+from transcribe_audio import PLACEHOLDER
+
+# Clip file -> the recording hash and span it was cut from
+SEGMENT_MANIFEST_FILENAME = "segment_manifest.json"
+SEGMENT_MANIFEST_VERSION = 1
+
+def frame_rms_db(audio, frame_length):
+    """
+    RMS level in dBFS of consecutive non-overlapping frames, computed in one
+    vectorized pass. A trailing partial frame is ignored.
+    """
+    n_frames = len(audio) // frame_length
+    frames = audio[:n_frames * frame_length].reshape(n_frames, frame_length)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+def find_cut(levels_db, min_frames, silence_db, min_silence_frames):
+    """
+    Choose the frame to cut a window at: the middle of the last silent run
+    long enough to be a pause and at least min_frames in, otherwise the
+    quietest frame after min_frames.
+    """
+    silent = levels_db < silence_db
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    
+    pauses = (run_ends - run_starts) >= min_silence_frames
+    midpoints = (run_starts[pauses] + run_ends[pauses]) // 2
+    midpoints = midpoints[midpoints >= min_frames]
+    
+    if len(midpoints):
+        return int(midpoints[-1])
+    return min_frames + int(np.argmin(levels_db[min_frames:]))
+
+def iter_segments(input_path, target_sr=24000, max_duration=15, min_duration=2,
+                  silence_db=-40, min_silence=0.3, frame_ms=20, pad=0.1,
+                  resampler=DEFAULT_RESAMPLER):
+    """
+    Stream a recording and yield (offset_seconds, audio) clips of at most
+    max_duration seconds, split at pauses where possible.
+    
+    Only the current window (max_duration plus one decode block) is held in
+    memory, and each cut consumes at least min_duration seconds, so the
+    work is linear in the recording length.
+    """
+    frame_length = int(target_sr * frame_ms / 1000)
+    max_frames = int(max_duration * target_sr) // frame_length
+    min_frames = int(min_duration * target_sr) // frame_length
+    min_silence_frames = max(1, int(min_silence * 1000 / frame_ms))
+    pad_frames = int(pad * 1000 / frame_ms)
+    
+    pending = np.zeros(0, dtype=np.float32)
+    pending_start = 0
+    blocks = iter_audio_blocks(input_path, target_sr, resampler=resampler)
+    finished = False
+    
+    while not finished or len(pending):
+        # Keep at least one full window buffered until the stream ends
+        while not finished and len(pending) < max_frames * frame_length:
+            block = next(blocks, None)
+            if block is None:
+                finished = True
+            else:
+                pending = np.concatenate((pending, block))
+        
+        levels = frame_rms_db(pending, frame_length)
+        voiced = np.flatnonzero(levels >= silence_db)
+        
+        if len(voiced) == 0:
+            # Whole buffer is silence; drop it, keeping any partial frame
+            consumed = len(levels) * frame_length if not finished else len(pending)
+            pending = pending[consumed:]
+            pending_start += consumed
+            continue
+        
+        # Skip leading silence, keeping a little padding before speech
+        lead = max(0, int(voiced[0]) - pad_frames)
+        if lead:
+            pending = pending[lead * frame_length:]
+            pending_start += lead * frame_length
+            levels = levels[lead:]
+            if not finished and len(pending) < max_frames * frame_length:
+                continue
+        
+        if len(levels) <= max_frames and finished:
+            cut_frames = len(levels)
+            cut = min(len(pending), max_frames * frame_length)
+        else:
+            cut_frames = max(1, find_cut(levels[:max_frames], min_frames, silence_db, min_silence_frames))
+            cut = cut_frames * frame_length
+        
+        # Trim trailing silence, keeping the same padding after speech
+        clip_voiced = np.flatnonzero(levels[:cut_frames] >= silence_db)
+        end = cut
+        if len(clip_voiced):
+            end = min(cut, (int(clip_voiced[-1]) + 1 + pad_frames) * frame_length)
+        
+        clip = pending[:end]
+        if len(clip_voiced) and len(clip) >= min_duration * target_sr:
+            yield pending_start / target_sr, clip
+        
+        pending = pending[cut:]
+        pending_start += cut
+
+def segment_recording(input_path, output_dir, transcript_dir="transcripts",
+                      target_sr=24000, max_duration=15, batch_size=16, recorded=None, **segment_options):
+    """
+    Segment one long recording and write each clip as a processed sample.
+    Clips are normalized batch_size at a time as one padded array.
+    
+    Clips are written to .tmp files and only moved into place once the
+    whole recording is segmented, so a failure leaves the previous run's
+    clips untouched. recorded maps clip files to the spans ("original_file",
+    "offset", "end") an earlier run cut them from this same recording; a
+    clip's existing transcript is kept only if its span is unchanged, and
+    reset to the template otherwise.
+    Returns the metadata entries for the written clips.
+    """
+    recorded = recorded or {}
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    entries = []
+    pending = []
+    staged = []
+    
+    def flush():
+        batch, lengths = pad_batch([clip for _, clip in pending])
+        normalized = normalize_batch(batch, lengths=lengths, sr=target_sr, copy=False,
+                                     **NORMALIZATION_DEFAULTS)
+        
+        for (offset, _), clip, length in zip(pending, normalized, lengths):
+            output_filename = f"{stem}_seg_{len(entries) + 1:04d}.wav"
+            staged_path = os.path.join(output_dir, output_filename + ".tmp")
+            staged.append(staged_path)
+            sf.write(staged_path, clip[:length], target_sr, format="WAV")
+            
+            duration = length / target_sr
+            entries.append({
+                "original_file": os.path.basename(input_path),
+                "processed_file": output_filename,
+                "duration": float(duration),
+                "offset": round(offset, 3),
+                "end": round(offset + duration, 3)
+            })
+        pending.clear()
+    
+    try:
+        for offset, clip in iter_segments(input_path, target_sr, max_duration, **segment_options):
+            pending.append((offset, clip))
+            if len(pending) >= batch_size:
+                flush()
+        if pending:
+            flush()
+    except BaseException:
+        for staged_path in staged:
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+        raise
+    
+    reset = 0
+    for entry, staged_path in zip(entries, staged):
+        os.replace(staged_path, os.path.join(output_dir, entry["processed_file"]))
+        
+        # Clip names are positional, so the same name may now cover other audio
+        transcript_path = os.path.join(transcript_dir, f"{os.path.splitext(entry['processed_file'])[0]}.txt")
+        previous = recorded.get(entry["processed_file"], {})
+        same_span = all(previous.get(key) == entry[key] for key in ("original_file", "offset", "end"))
+        if same_span and os.path.exists(transcript_path):
+            continue
+        if os.path.exists(transcript_path):
+            reset += 1
+        with open(transcript_path, 'w') as f:
+            f.write(f"# Transcript for {entry['original_file']} @ {entry['offset']:.2f}s\n")
+            f.write(f"# Duration: {entry['duration']:.2f}s\n\n")
+            f.write(PLACEHOLDER)
+    if reset:
+        print(f"  📝 Reset {reset} transcript(s) whose clip now covers different audio")
+    
+    return entries
+
+def segment_long_recordings(input_dir="long_recordings", output_dir="processed_samples",
+                            transcript_dir="transcripts", dedup="report", **segment_options):
+    """
+    Segment every recording in input_dir and register the clips in
+    dataset_metadata.json, replacing clips from earlier runs. Clips (and
+    transcripts) an earlier run wrote that this run did not are removed,
+    except for recordings that failed this run, which keep their previous
+    clips. dedup works as in batch_audio_processor, over the processed
+    samples and the clips together.
+    """
+    print("✂️  LONG RECORDING SEGMENTATION")
+    print("="*50)
+    
+    if not os.path.exists(input_dir):
+        print(f"❌ {input_dir} directory not found!")
+        return False
+    
+    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(transcript_dir, exist_ok=True)
+    
+    recordings = sorted(
+        f for f in os.listdir(input_dir)
+        if f.lower().endswith(('.wav', '.flac', '.ogg'))
+    )
+    
+    if len(recordings) == 0:
+        print(f"❌ No recordings found in {input_dir}")
+        return False
+    
+    manifest_path = os.path.join(output_dir, SEGMENT_MANIFEST_FILENAME)
+    recorded = load_manifest(manifest_path, SEGMENT_MANIFEST_VERSION)
+    new_manifest = {}
+    
+    segments = []
+    for filename in recordings:
+        print(f"\n🎙️  Segmenting: {filename}")
+        input_path = os.path.join(input_dir, filename)
+        try:
+            source_sha256 = file_sha256(input_path)
+            # Spans only count as unchanged if they were cut from this exact recording
+            same_source = {name: entry for name, entry in recorded.items()
+                           if entry.get("source_sha256") == source_sha256}
+            entries = segment_recording(input_path, output_dir, transcript_dir,
+                                        recorded=same_source, **segment_options)
+            total = sum(e["duration"] for e in entries)
+            print(f"  ✅ {len(entries)} clips, {total/60:.1f} min of audio")
+        except Exception as e:
+            print(f"  ❌ Failed: {e}")
+            entries = [{"original_file": filename, "processed_file": name, "duration": entry["duration"],
+                        "offset": entry["offset"], "end": entry["end"]}
+                       for name, entry in sorted(recorded.items()) if entry.get("original_file") == filename]
+            for entry in entries:
+                new_manifest[entry["processed_file"]] = recorded[entry["processed_file"]]
+            if entries:
+                print(f"  ↩️  Keeping {len(entries)} clips from the previous run")
+            segments.extend(entries)
+            continue
+        
+        for entry in entries:
+            new_manifest[entry["processed_file"]] = {
+                "original_file": filename,
+                "source_sha256": source_sha256,
+                "offset": entry["offset"],
+                "end": entry["end"],
+                "duration": entry["duration"]
+            }
+            previous = same_source.get(entry["processed_file"], {})
+            same_span = (previous.get("offset"), previous.get("end")) == (entry["offset"], entry["end"])
+            if same_span and "fingerprint" in previous:
+                new_manifest[entry["processed_file"]]["fingerprint"] = previous["fingerprint"]
+        segments.extend(entries)
+    
+    # Keep clips from batch_audio_processor, replace earlier segment entries
+    processed_files = []
+    stale = set(recorded)
+    if os.path.exists("dataset_metadata.json"):
+        with open("dataset_metadata.json", "r") as f:
+            previous = json.load(f).get("processed_files", [])
+        processed_files = [entry for entry in previous if "offset" not in entry]
+        stale.update(entry["processed_file"] for entry in previous if "offset" in entry)
+    
+    # Remove clip files and transcripts an earlier run wrote that this run did not
+    for name in sorted(stale - set(new_manifest)):
+        stale_paths = [os.path.join(output_dir, name),
+                       os.path.join(transcript_dir, f"{os.path.splitext(name)[0]}.txt")]
+        for stale_path in stale_paths:
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+    
+    save_manifest(manifest_path, new_manifest, SEGMENT_MANIFEST_VERSION)
+    processed_files.extend(segments)
+    write_dataset_metadata(processed_files, output_dir, dedup)
+    
+    print(f"\n✅ Registered {len(segments)} clips in dataset_metadata.json")
+    print(f"📁 Outputs: {output_dir}/")
+    
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split long recordings into training clips")
+    parser.add_argument("--input-dir", default="long_recordings",
+                        help="Directory of long recordings (default: long_recordings)")
+    parser.add_argument("--max-duration", type=float, default=15,
+                        help="Maximum clip length in seconds")
+    parser.add_argument("--silence-db", type=float, default=-40,
+                        help="Frames below this level (dBFS) count as silence")
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default="report",
+                        help="Near-duplicate clips: report them, drop them from the dataset, or skip the check")
+    args = parser.parse_args()
+    
+    segment_long_recordings(args.input_dir, dedup=args.dedup, max_duration=args.max_duration,
+                            silence_db=args.silence_db)
@@ -3,10 +3,14 @@
 
 import os
 import yaml
-import wandb
+import argparse
 from datetime import datetime
 
-def setup_training():
+from dataset_qc import rejected_hashes
+from pretokenize import load_pretokenized
+from training_data import ByteTokenizer, HFTokenizer, PackedBatchLoader, build_sequences
+
+def setup_training(use_wandb=True):
     """Setup training environment"""
     
     # Load config
@@ -18,11 +22,14 @@ def setup_training():
     print(f"🎯 Epochs: {config['training']['num_train_epochs']}")
     
     # Initialize wandb
-    wandb.init(
-        project="orpheus-voice-cloning",
-        name=f"orpheus-finetune-{datetime.now().strftime('%Y%m%d-%H%M%S')}",
-        config=config
-    )
+    if use_wandb:
+        import wandb
+        
+        wandb.init(
+            project="orpheus-voice-cloning",
+            name=f"orpheus-finetune-{datetime.now().strftime('%Y%m%d-%H%M%S')}",
+            config=config
+        )
     
     # Setup directories
     os.makedirs(config["training"]["output_dir"], exist_ok=True)
@@ -30,33 +37,131 @@ def setup_training():
     
     return config
 
-def main():
-    """Main training function"""
+def log_metrics(metrics, use_wandb=True):
+    """Print trainer metrics and forward numeric ones to wandb"""
+    if "event" in metrics:
+        if metrics["event"] == "resumed":
+            print(f"🔁 Resumed from {metrics['checkpoint']} at step {metrics['global_step']}")
+        elif metrics["event"] == "checkpoint":
+            print(f"💾 Saved {metrics['path']}")
+        return
+    
+    print(f"  📈 step {metrics['step']}: loss {metrics['loss']:.4f}, lr {metrics['learning_rate']:.2e}, "
+          f"{metrics['steps_per_sec']:.2f} steps/s, {metrics['tokens_per_sec']:.0f} tokens/s")
+    if use_wandb:
+        import wandb
+        
+        wandb.log({f"train/{k}": v for k, v in metrics.items() if k != "step"}, step=metrics["step"])
+
+def main(dry_run=False, max_steps=None):
+    """
+    Main training function. dry_run trains a tiny stand-in LM on CPU with a
+    byte tokenizer and no wandb, to exercise the loop and checkpointing.
+    """
     
     # Setup
-    config = setup_training()
+    config = setup_training(use_wandb=not dry_run)
     
+    # Training reads codec tokens from the pre-tokenized cache instead of
+    # re-encoding processed_samples/ every epoch
+    dataset_config = config["dataset"]
     try:
-        from orpheus_tts import OrpheusModel
-        
-        print("📥 Loading Orpheus model...")
-        model = OrpheusModel(
-            model_name=config["model"]["name"],
-            max_model_len=config["model"]["max_model_len"]
+        # Clips that failed the dataset QC gate never reach the loader
+        rejected = rejected_hashes(dataset_config.get("qc_manifest", "qc_manifest.json"))
+        if rejected is None:
+            print("⚠️  No QC manifest; run dataset_qc.py to screen out bad clips")
+        elif rejected:
+            print(f"🚫 Excluding {len(rejected)} clips rejected by QC")
+        samples = load_pretokenized(
+            dataset_config.get("packed_dir", "packed_dataset"),
+            dataset_config.get("token_cache_dir", "token_cache"),
+            dataset_config.get("codec", "snac_24khz"),
+            exclude=rejected or ()
         )
+    except (OSError, KeyError, ValueError) as e:
+        print(f"❌ Training data not ready: {e}")
+        print("Run pack_dataset.py and pretokenize.py first")
+        return
+    
+    total_tokens = sum(len(s["audio_tokens"]) for s in samples)
+    print(f"🔢 Pre-tokenized clips: {len(samples)} ({total_tokens} audio tokens)")
+    
+    # Pack several text+speech sequences per row instead of one sample per step
+    training_config = config["training"]
+    tokenizer = ByteTokenizer() if dry_run else HFTokenizer(config["model"]["name"])
+    loader = PackedBatchLoader(
+        build_sequences(samples, tokenizer),
+        max_len=config["model"]["max_model_len"],
+        batch_size=training_config["per_device_train_batch_size"],
+        pack=training_config.get("packing", True),
+        seed=training_config.get("seed", 42)
+    )
+    stats = loader.stats()
+    print(f"📦 {stats['sequences']} sequences -> {stats['steps_per_epoch']} steps/epoch "
+          f"({stats['sequences_per_row']:.1f} per row)")
+    print(f"   Tokens/step: {stats['tokens_per_step']:.0f} "
+          f"(vs {stats['baseline_tokens_per_step']:.0f} unpacked), "
+          f"padding waste: {stats['padding_waste']:.1%}")
+    if stats["dropped_too_long"]:
+        print(f"⚠️  Dropped {stats['dropped_too_long']} sequences longer than max_model_len")
+    
+    try:
+        import torch
+        from trainer import TinyCausalLM, train
+        
+        if dry_run:
+            print("🧪 Dry run: tiny stand-in model on CPU")
+            device = "cpu"
+            model = TinyCausalLM(max_positions=config["model"]["max_model_len"])
+        else:
+            # OrpheusModel wraps vLLM for inference only; fine-tuning needs
+            # the underlying causal LM
+            from model_registry import get_registry
+            
+            print("📥 Loading Orpheus model...")
+            device = config["model"].get("device", "cuda") if torch.cuda.is_available() else "cpu"
+            model = get_registry().acquire(config["model"]["name"], config["model"]["max_model_len"],
+                                           kind="causal_lm")
         
         print("✅ Model loaded successfully!")
         print("⚡ Starting training...")
-        print("📊 Monitor progress at: https://wandb.ai")
+        if not dry_run:
+            print("📊 Monitor progress at: https://wandb.ai")
+        
+        state = train(
+            model, loader, training_config, device=device, max_steps=max_steps,
+            log=lambda metrics: log_metrics(metrics, use_wandb=not dry_run)
+        )
         
-        # Training implementation would go here
-        # This is a framework - actual training depends on Orpheus API
+        final_dir = os.path.join(training_config["output_dir"], "final")
+        if hasattr(model, "save_pretrained"):
+            model.save_pretrained(final_dir)
+        else:
+            os.makedirs(final_dir, exist_ok=True)
+            torch.save(model.state_dict(), os.path.join(final_dir, "model.pt"))
         
-        print("🎉 Training completed!")
-        print(f"📁 Model saved to: {config['training']['output_dir']}")
+        if not dry_run:
+            # OrpheusModel / vLLM load final/ as a Hugging Face model dir:
+            # weights, config and the tokenizer side by side
+            tokenizer.save_pretrained(final_dir)
+            missing = [name for name in ("config.json", "tokenizer_config.json")
+                       if not os.path.exists(os.path.join(final_dir, name))]
+            if missing:
+                raise RuntimeError(f"{final_dir} is missing {', '.join(missing)}; it cannot be loaded for inference")
         
+        print("🎉 Training completed!")
+        print(f"📊 {state['global_step']} steps, {state['tokens_seen']} tokens")
+        print(f"📁 Model saved to: {final_dir}")
+    
     except Exception as e:
         print(f"❌ Training failed: {e}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Fine-tune Orpheus on the pre-tokenized dataset")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Train a tiny stand-in model on CPU (no model download, no wandb)")
+    parser.add_argument("--max-steps", type=int, default=None,
+                        help="Stop after this many optimizer steps")
+    args = parser.parse_args()
+    
+    main(dry_run=args.dry_run, max_steps=args.max_steps)
@@ -0,0 +1,259 @@
+# streaming_generation.py
+# Stream 24 kHz audio chunks as codec tokens arrive, with latency metrics
+
+import time
+import wave
+import queue
+import asyncio
+import argparse
+import threading
+import numpy as np
+
+from audio_codec import (AUDIO_TOKEN_OFFSET, CODEBOOK_SIZE, TOKENS_PER_FRAME, SAMPLES_PER_FRAME,
+                         get_decoder)
+from batch_generation import format_prompt, make_request, sampling_params_for
+
+class StreamingDecoder:
+    """
+    Turns a growing token sequence into audio chunks. Each chunk is decoded
+    with context_frames of audio before it and lookahead_frames after it,
+    and only its own frames are kept, so the codec sees the same
+    neighbourhood it would in a full decode. Consecutive chunks overlap by
+    crossfade samples (decoded twice, once in each window) and are blended
+    across the overlap, so boundaries don't click.
+    
+    The first chunk is first_chunk_frames long to get audio out early;
+    later ones are chunk_frames. Concatenated, the chunks are exactly
+    2048 samples per complete frame.
+    """
+    
+    def __init__(self, decoder, chunk_frames=4, first_chunk_frames=1, context_frames=1,
+                 lookahead_frames=1, crossfade=256):
+        if context_frames == 0:
+            crossfade = 0
+        if crossfade > context_frames * SAMPLES_PER_FRAME or crossfade > SAMPLES_PER_FRAME:
+            raise ValueError(f"crossfade must be at most {SAMPLES_PER_FRAME} samples and fit in the context")
+        
+        self.decoder = decoder
+        self.chunk_frames = chunk_frames
+        self.first_chunk_frames = first_chunk_frames
+        self.context_frames = context_frames
+        self.lookahead_frames = lookahead_frames
+        self.crossfade = crossfade
+        self.tokens = []
+        self.emitted_frames = 0
+        self.tail = None
+        self.fade_in = np.linspace(0, 1, crossfade + 2, dtype=np.float32)[1:-1]
+    
+    @property
+    def n_frames(self):
+        return len(self.tokens) // TOKENS_PER_FRAME
+    
+    def push(self, token_ids):
+        """Add new tokens; returns the chunks they complete (possibly none)"""
+        for token in token_ids:
+            if AUDIO_TOKEN_OFFSET <= token < AUDIO_TOKEN_OFFSET + CODEBOOK_SIZE * TOKENS_PER_FRAME:
+                self.tokens.append(int(token))
+        
+        chunks = []
+        while True:
+            size = self.first_chunk_frames if self.emitted_frames == 0 else self.chunk_frames
+            end = self.emitted_frames + size
+            if self.n_frames < end + self.lookahead_frames:
+                break
+            chunks.append(self._emit(end, final=False))
+        return chunks
+    
+    def finish(self):
+        """Decode whatever is left once the token stream has ended"""
+        if self.n_frames > self.emitted_frames or self.tail is not None:
+            return [self._emit(self.n_frames, final=True)]
+        return []
+    
+    def _emit(self, end, final):
+        start = self.emitted_frames
+        first = max(0, start - self.context_frames)
+        last = min(self.n_frames, end + self.lookahead_frames)
+        audio = self.decoder.decode(np.asarray(self.tokens[first * TOKENS_PER_FRAME:last * TOKENS_PER_FRAME]))
+        
+        fade = 0 if self.tail is None else len(self.tail)
+        chunk = audio[(start - first) * SAMPLES_PER_FRAME - fade:(end - first) * SAMPLES_PER_FRAME].copy()
+        if fade:
+            chunk[:fade] = self.tail * (1 - self.fade_in) + chunk[:fade] * self.fade_in
+        
+        self.emitted_frames = end
+        if final or self.crossfade == 0:
+            self.tail = None
+            return chunk
+        self.tail = chunk[len(chunk) - self.crossfade:]
+        return chunk[:len(chunk) - self.crossfade]
+
+def stream_audio(tokens, decoder, **options):
+    """
+    Yield (chunk, stats) pairs for an iterable of token ids. stats is the
+    running dict: time_to_first_chunk, audio_seconds, wall_seconds,
+    real_time_factor (wall / audio; below 1 is faster than real time)
+    and chunks. options are passed to StreamingDecoder.
+    """
+    streamer = StreamingDecoder(decoder, **options)
+    stats = {"time_to_first_chunk": None, "audio_seconds": 0.0, "wall_seconds": 0.0,
+             "real_time_factor": None, "chunks": 0}
+    start = time.perf_counter()
+    
+    def account(chunk):
+        now = time.perf_counter() - start
+        if stats["time_to_first_chunk"] is None:
+            stats["time_to_first_chunk"] = now
+        stats["chunks"] += 1
+        stats["audio_seconds"] += len(chunk) / decoder.sample_rate
+        stats["wall_seconds"] = now
+        stats["real_time_factor"] = now / stats["audio_seconds"] if stats["audio_seconds"] else None
+        return chunk, stats
+    
+    batch = []
+    for token in tokens:
+        batch.append(token)
+        # Only complete frames can produce audio
+        if len(batch) % TOKENS_PER_FRAME == 0:
+            for chunk in streamer.push(batch):
+                yield account(chunk)
+            batch = []
+    for chunk in streamer.push(batch) + streamer.finish():
+        if len(chunk):
+            yield account(chunk)
+
+class IncrementalWavWriter:
+    """
+    16-bit PCM WAV written chunk by chunk. The header is patched after
+    every write, so the file is a valid, playable WAV at any point.
+    """
+    
+    def __init__(self, path, sample_rate=24000):
+        self.file = open(path, "wb")
+        self.wav = wave.open(self.file, "wb")
+        self.wav.setnchannels(1)
+        self.wav.setsampwidth(2)
+        self.wav.setframerate(sample_rate)
+        self.frames = 0
+    
+    def write(self, chunk):
+        pcm = (np.clip(chunk, -1.0, 1.0) * 32767).astype("<i2")
+        self.wav.writeframes(pcm.tobytes())
+        self.file.flush()
+        self.frames += len(pcm)
+    
+    def close(self):
+        self.wav.close()
+        self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+def stream_to_wav(tokens, decoder, output_path, on_chunk=None, **options):
+    """Stream tokens into output_path as audio arrives; returns the final stats"""
+    stats = None
+    with IncrementalWavWriter(output_path, decoder.sample_rate) as writer:
+        for chunk, stats in stream_audio(tokens, decoder, **options):
+            writer.write(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk, stats)
+    return stats
+
+def engine_token_stream(model, request):
+    """
+    Token ids from the model's vLLM engine as they are generated. The
+    engine runs on its own event loop in a background thread, as in
+    orpheus_tts, so this is a plain iterator.
+    """
+    request = make_request(**request)
+    tokens = queue.Queue()
+    
+    async def produce():
+        seen = 0
+        prompt = format_prompt(model, request)
+        async for output in model.engine.generate(prompt, sampling_params_for(model, request),
+                                                  f"stream-{id(tokens)}"):
+            token_ids = output.outputs[0].token_ids
+            tokens.put(list(token_ids[seen:]))
+            seen = len(token_ids)
+    
+    def run():
+        try:
+            asyncio.run(produce())
+        except Exception as e:
+            tokens.put(e)
+        finally:
+            tokens.put(None)
+    
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        item = tokens.get()
+        if item is None:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield from item
+
+class FakeTokenSource:
+    """
+    Offline token source in the hash codec's layout: n_frames frames,
+    paced at tokens_per_second after an initial first_token_delay (prompt
+    processing). Real Orpheus needs ~82 tokens per second of audio, so the
+    default 200 tokens/s is about 2.4x faster than real time.
+    """
+    
+    def __init__(self, n_frames=40, tokens_per_second=200, first_token_delay=0.05, seed=0):
+        rng = np.random.RandomState(seed)
+        codes = rng.randint(CODEBOOK_SIZE // 5, CODEBOOK_SIZE // 2, size=(n_frames, TOKENS_PER_FRAME))
+        offsets = AUDIO_TOKEN_OFFSET + CODEBOOK_SIZE * np.arange(TOKENS_PER_FRAME)
+        self.tokens = (codes + offsets).reshape(-1).tolist()
+        self.tokens_per_second = tokens_per_second
+        self.first_token_delay = first_token_delay
+    
+    def __iter__(self):
+        start = time.perf_counter() + self.first_token_delay
+        for i, token in enumerate(self.tokens):
+            if self.tokens_per_second:
+                delay = start + i / self.tokens_per_second - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield token
+
+def generate_streaming(model, request, output_path, **options):
+    """Stream one request from the model's engine into output_path"""
+    decoder = get_decoder(getattr(model, "codec", "snac_24khz"))
+    return stream_to_wav(engine_token_stream(model, request), decoder, output_path, **options)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream generated speech into a WAV file")
+    parser.add_argument("text", nargs="?", default="Hello, this is a test of streaming voice generation.")
+    parser.add_argument("--output", default="streamed_output.wav")
+    parser.add_argument("--fake", action="store_true",
+                        help="Use the offline fake token source instead of the model")
+    parser.add_argument("--frames", type=int, default=40, help="Frames to emit with --fake")
+    parser.add_argument("--chunk-frames", type=int, default=4)
+    args = parser.parse_args()
+    
+    print("🌊 STREAMING GENERATION")
+    print("="*50)
+    
+    def report(chunk, stats):
+        print(f"  🔊 chunk {stats['chunks']}: {len(chunk)} samples at {stats['wall_seconds']:.3f}s")
+    
+    if args.fake:
+        stats = stream_to_wav(FakeTokenSource(args.frames), get_decoder("hash"), args.output,
+                              on_chunk=report, chunk_frames=args.chunk_frames)
+    else:
+        from model_registry import shared_model
+        
+        with shared_model("canopylabs/orpheus-3b-0.1-ft", max_model_len=2048) as model:
+            stats = generate_streaming(model, {"text": args.text}, args.output,
+                                       on_chunk=report, chunk_frames=args.chunk_frames)
+    
+    print(f"⏱️  Time to first audio: {stats['time_to_first_chunk'] * 1000:.0f} ms")
+    print(f"⚡ Real-time factor: {stats['real_time_factor']:.2f} "
+          f"({stats['audio_seconds']:.2f}s audio in {stats['wall_seconds']:.2f}s)")
+    print(f"📁 Saved: {args.output}")
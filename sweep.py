@@ -0,0 +1,162 @@
+# sweep.py
+# Parameter sweeps: grid expansion, deduplication, batched dispatch, checkpoint/resume
+
+import os
+import csv
+import json
+import time
+import hashlib
+import itertools
+import soundfile as sf
+
+from batch_generation import DEFAULT_MAX_TOKENS, generate_batch, make_request
+from result_cache import model_id_for, voice_key
+
+SWEEP_PARAMS = ("temperature", "top_k", "repetition_penalty", "max_tokens", "seed")
+TABLE_COLUMNS = ("texts", "failures", "mean_seconds", "tokens_per_sec", "audio_seconds", "real_time_factor")
+
+def expand_grid(grid, base=None):
+    """
+    Every combination (full Cartesian product) of grid's value lists on
+    top of base, e.g. {"temperature": [0.5, 0.7], "top_k": [25, 50]} gives
+    four points
+    """
+    names = sorted(grid)
+    return [dict(base or {}, **dict(zip(names, values)))
+            for values in itertools.product(*(grid[name] for name in names))]
+
+def one_at_a_time(base, variable, values):
+    """Points varying one parameter around base (the classic sweep)"""
+    return [dict(base, **{variable: value}) for value in values]
+
+def normalize_point(point):
+    """Sampling params with defaults filled in, so {} and the defaults are the same point"""
+    request = make_request("", **point)
+    return {name: request[name] for name in SWEEP_PARAMS if request.get(name) is not None}
+
+def dedupe(points):
+    """Unique points in first-seen order"""
+    unique = {}
+    for point in points:
+        point = normalize_point(point)
+        unique.setdefault(json.dumps(point, sort_keys=True), point)
+    return list(unique.values())
+
+def point_key(point, texts, model_id, voice=None):
+    """Checkpoint key: the point, the texts it generated, the model and voice"""
+    fields = {"point": point, "texts": list(texts), "model": model_id, "voice": voice}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()[:16]
+
+def point_label(point):
+    """File-name friendly label, e.g. temperature0.7_top_k50_repetition_penalty1.1"""
+    return "_".join(f"{name}{point[name]}" for name in SWEEP_PARAMS
+                    if name in point and not (name == "max_tokens" and point[name] == DEFAULT_MAX_TOKENS))
+
+class SweepCheckpoint:
+    """
+    Append-only JSONL record of finished points. Each line is written and
+    fsynced as soon as its point finishes, so an interrupted sweep loses
+    at most the batch in flight; a truncated last line is ignored.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.done[entry["key"]] = entry
+    
+    def record(self, key, point, row):
+        entry = {"key": key, "point": point, "row": row}
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.done[key] = entry
+
+def _point_row(point, results, output_files):
+    ok = [r for r in results if r["error"] is None]
+    seconds = sum(r["seconds"] for r in ok)
+    audio_seconds = sum(len(r["audio"]) / r["sample_rate"] for r in ok)
+    tokens = sum(r["tokens"] for r in ok)
+    return dict(
+        point,
+        texts=len(results),
+        failures=len(results) - len(ok),
+        mean_seconds=seconds / len(ok) if ok else None,
+        tokens_per_sec=tokens / seconds if tokens and seconds else None,
+        audio_seconds=audio_seconds,
+        real_time_factor=seconds / audio_seconds if audio_seconds else None,
+        output_files=output_files,
+        errors=sorted({r["error"] for r in results if r["error"] is not None})
+    )
+
+def run_sweep(model, points, texts, output_dir="sweep_outputs", checkpoint_path=None, batch_size=32,
+              cache=None, **request_options):
+    """
+    Generate every text at every (deduplicated) point. Points are grouped
+    so that each group's point x text requests go to the engine in one
+    generate_batch call of up to batch_size requests, instead of one
+    point at a time. Finished points are checkpointed (default:
+    output_dir/sweep_checkpoint.jsonl) and skipped when the sweep is run
+    again. Returns one row per point, in point order. request_options
+    (voice, reference) apply to every request.
+    
+    Note that per-request seconds are measured under batching; use
+    benchmark_generation for isolated timings.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint = SweepCheckpoint(checkpoint_path or os.path.join(output_dir, "sweep_checkpoint.jsonl"))
+    model_id = model_id_for(model)
+    points = dedupe(points)
+    voice = voice_key(make_request("", **request_options))
+    keys = [point_key(point, texts, model_id, voice) for point in points]
+    pending = [i for i, key in enumerate(keys) if key not in checkpoint.done]
+    
+    print(f"🧮 {len(points)} unique points x {len(texts)} texts; "
+          f"{len(points) - len(pending)} already done, {len(pending)} to run")
+    
+    points_per_batch = max(1, batch_size // max(len(texts), 1))
+    for first in range(0, len(pending), points_per_batch):
+        group = pending[first:first + points_per_batch]
+        requests = [make_request(text, **request_options, **points[i]) for i in group for text in texts]
+        start = time.perf_counter()
+        results = generate_batch(model, requests, cache=cache)
+        
+        for n, i in enumerate(group):
+            point_results = results[n * len(texts):(n + 1) * len(texts)]
+            output_files = []
+            for t, result in enumerate(point_results):
+                if result["error"] is None:
+                    output_file = os.path.join(output_dir, f"{point_label(points[i])}_{t + 1}.wav")
+                    sf.write(output_file, result["audio"], result["sample_rate"])
+                    output_files.append(output_file)
+            checkpoint.record(keys[i], points[i], _point_row(points[i], point_results, output_files))
+        
+        print(f"  ✅ {len(group)} point(s), {len(requests)} clips in {time.perf_counter() - start:.2f}s "
+              f"({min(first + len(group), len(pending))}/{len(pending)})")
+    
+    return [checkpoint.done[key]["row"] for key in keys]
+
+def write_table(rows, path):
+    """One consolidated CSV: a column per swept parameter plus the metrics"""
+    params = [name for name in SWEEP_PARAMS if any(name in row for row in rows)]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(params + list(TABLE_COLUMNS))
+        for row in rows:
+            writer.writerow([row.get(name, "") for name in params + list(TABLE_COLUMNS)])
+
+def print_table(rows):
+    params = [name for name in SWEEP_PARAMS if any(name in row for row in rows)]
+    print("  " + "  ".join(params) + f"  {'fail':>4s}  {'s/clip':>7s}  {'RTF':>6s}")
+    for row in rows:
+        values = "  ".join(f"{str(row.get(name, '')):>{len(name)}s}" for name in params)
+        seconds = f"{row['mean_seconds']:7.2f}" if row["mean_seconds"] is not None else f"{'-':>7s}"
+        rtf = f"{row['real_time_factor']:6.3f}" if row["real_time_factor"] is not None else f"{'-':>6s}"
+        print(f"  {values}  {row['failures']:4d}  {seconds}  {rtf}")
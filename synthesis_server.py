@@ -0,0 +1,463 @@
+# synthesis_server.py
+# Long-running synthesis server: warm model, dynamic batching, REST + WebSocket streaming
+
+import io
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import argparse
+import itertools
+import numpy as np
+import soundfile as sf
+from collections import deque
+
+from audio_codec import get_decoder
+from batch_generation import format_prompt, generate_one, make_request, sampling_params_for
+from result_cache import model_id_for
+from streaming_generation import StreamingDecoder
+
+REQUEST_FIELDS = ("text", "temperature", "top_k", "repetition_penalty", "max_tokens", "seed", "voice")
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_BODY_BYTES = 1 << 20
+
+class LatencyTracker:
+    """Rolling window of latencies (seconds) with percentile summaries"""
+    
+    def __init__(self, window=10000):
+        self.samples = deque(maxlen=window)
+    
+    def add(self, seconds):
+        self.samples.append(seconds)
+    
+    def summary(self):
+        if not self.samples:
+            return {"count": 0}
+        values = np.asarray(self.samples) * 1000
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return {"count": len(values), "mean_ms": float(values.mean()),
+                "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+class DynamicBatcher:
+    """
+    Request queue in front of the model's engine. The first queued request
+    opens a batch; it closes after max_batch_size requests or max_wait
+    seconds, whichever comes first, and everything in it is submitted to
+    the engine together. Batches run as background tasks, so the batcher
+    goes straight back to collecting the next one while earlier requests
+    (long clips, WebSocket streams) are still generating; at most
+    max_in_flight requests run at once. The queue holds at most max_queue requests;
+    submit() raises asyncio.QueueFull beyond that, so callers can shed
+    load instead of building an unbounded backlog.
+    
+    With a result_cache, full (non-streaming) deterministic requests that
+    were generated before are answered from it without being queued.
+    """
+    
+    def __init__(self, model, max_batch_size=8, max_wait=0.02, max_queue=64, stream_options=None,
+                 result_cache=None, max_in_flight=64):
+        if not hasattr(model, "engine"):
+            raise ValueError("The server needs an engine-backed model (OrpheusModel or StandInModel)")
+        self.model = model
+        self.decoder = get_decoder(getattr(model, "codec", "snac_24khz"))
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.stream_options = stream_options or {}
+        self.result_cache = result_cache
+        self.model_id = model_id_for(model)
+        self.latency = LatencyTracker()
+        self.first_chunk = LatencyTracker()
+        self.counts = {"requests": 0, "rejected": 0, "failed": 0, "batches": 0, "batched_requests": 0}
+        self._request_ids = itertools.count()
+        self._worker = None
+        self._in_flight = None
+        self._max_in_flight = max_in_flight
+        self._tasks = set()
+    
+    def start(self):
+        self._in_flight = asyncio.Semaphore(self._max_in_flight)
+        self._worker = asyncio.ensure_future(self._run())
+    
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+    
+    def submit(self, request, stream=False):
+        """
+        Queue a request. Returns a future for the full result, or with
+        stream=True an asyncio.Queue of audio chunks ending with None.
+        """
+        item = {
+            "request": make_request(**request),
+            "enqueued": time.perf_counter(),
+            "future": asyncio.get_running_loop().create_future(),
+            "chunks": asyncio.Queue() if stream else None,
+            "cache_key": None
+        }
+        if not stream and self.result_cache is not None:
+            item["cache_key"], audio, sample_rate = self.result_cache.get(item["request"], self.model_id)
+            if audio is not None:
+                self.counts["requests"] += 1
+                item["future"].set_result({
+                    "index": 0, "text": item["request"]["text"], "audio": audio, "sample_rate": sample_rate,
+                    "tokens": 0, "first_token_seconds": None,
+                    "seconds": time.perf_counter() - item["enqueued"], "cached": True, "error": None
+                })
+                return item["future"]
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.counts["rejected"] += 1
+            raise
+        self.counts["requests"] += 1
+        return item["chunks"] if stream else item["future"]
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Wait only for engine capacity, not for earlier batches to finish
+            for _ in batch:
+                await self._in_flight.acquire()
+            self.counts["batches"] += 1
+            self.counts["batched_requests"] += len(batch)
+            for item in batch:
+                task = asyncio.ensure_future(self._run_item(item))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+    
+    async def _run_item(self, item):
+        try:
+            await self._generate_item(item)
+        except Exception as e:
+            self.counts["failed"] += 1
+            if item["chunks"] is not None:
+                item["chunks"].put_nowait(e)
+            elif not item["future"].done():
+                item["future"].set_exception(e)
+        finally:
+            self._in_flight.release()
+    
+    async def _generate_item(self, item):
+        if item["chunks"] is None:
+            result = await generate_one(self.model, self.decoder, 0, item["request"], item["enqueued"])
+            if result["error"] is not None:
+                self.counts["failed"] += 1
+            else:
+                self.latency.add(result["seconds"])
+                if item["cache_key"] is not None:
+                    self.result_cache.put(item["cache_key"], result["audio"], result["sample_rate"],
+                                          item["request"]["text"])
+            item["future"].set_result(result)
+            return
+        
+        loop = asyncio.get_running_loop()
+        request = item["request"]
+        streamer = StreamingDecoder(self.decoder, **self.stream_options)
+        prompt = format_prompt(self.model, request)
+        seen = 0
+        try:
+            async for output in self.model.engine.generate(prompt, sampling_params_for(self.model, request),
+                                                           f"server-{next(self._request_ids)}"):
+                token_ids = output.outputs[0].token_ids
+                new_tokens, seen = token_ids[seen:], len(token_ids)
+                for chunk in await loop.run_in_executor(None, streamer.push, new_tokens):
+                    self._stream_chunk(item, chunk)
+            for chunk in await loop.run_in_executor(None, streamer.finish):
+                self._stream_chunk(item, chunk)
+            self.latency.add(time.perf_counter() - item["enqueued"])
+            item["chunks"].put_nowait(None)
+        except Exception as e:
+            self.counts["failed"] += 1
+            item["chunks"].put_nowait(e)
+    
+    def _stream_chunk(self, item, chunk):
+        if "first_chunk" not in item:
+            item["first_chunk"] = time.perf_counter() - item["enqueued"]
+            self.first_chunk.add(item["first_chunk"])
+        item["chunks"].put_nowait(chunk)
+    
+    def metrics(self):
+        return dict(
+            self.counts,
+            queue_depth=self.queue.qsize(),
+            in_flight=len(self._tasks),
+            mean_batch_size=self.counts["batched_requests"] / max(self.counts["batches"], 1),
+            latency=self.latency.summary(),
+            time_to_first_chunk=self.first_chunk.summary(),
+            result_cache=self.result_cache.metrics() if self.result_cache is not None else None
+        )
+
+def wav_bytes(audio, sample_rate):
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sample_rate, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+def pcm16(chunk):
+    return (np.clip(chunk, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+async def read_http_request(reader):
+    """(method, path, headers, body) for one HTTP/1.1 request"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    method, path, _ = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+def http_response(writer, status, body=b"", content_type="application/json", headers=None):
+    reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error",
+               503: "Service Unavailable"}
+    if isinstance(body, (dict, list)):
+        body = json.dumps(body).encode()
+    lines = [f"HTTP/1.1 {status} {reasons.get(status, '')}", f"Content-Type: {content_type}",
+             f"Content-Length: {len(body)}", "Connection: close"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+
+async def ws_read_message(reader):
+    """
+    Next complete text/binary message from a (masked) client, as
+    (opcode, payload). Answers nothing itself; returns opcode 8 on close.
+    """
+    message, message_opcode = b"", None
+    while True:
+        first, second = await reader.readexactly(2)
+        opcode, final = first & 0x0F, first & 0x80
+        length = second & 0x7F
+        if length == 126:
+            length = int.from_bytes(await reader.readexactly(2), "big")
+        elif length == 127:
+            length = int.from_bytes(await reader.readexactly(8), "big")
+        if length > MAX_BODY_BYTES:
+            raise ValueError("WebSocket message too large")
+        mask = await reader.readexactly(4) if second & 0x80 else b"\0\0\0\0"
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(await reader.readexactly(length)))
+        
+        if opcode in (8, 9, 10):
+            if opcode == 8:
+                return 8, payload
+            continue
+        if opcode != 0:
+            message_opcode = opcode
+        message += payload
+        if final:
+            return message_opcode, message
+
+def ws_frame(opcode, payload):
+    """One unmasked server frame"""
+    header = bytes([0x80 | opcode])
+    if len(payload) < 126:
+        header += bytes([len(payload)])
+    elif len(payload) < 1 << 16:
+        header += bytes([126]) + len(payload).to_bytes(2, "big")
+    else:
+        header += bytes([127]) + len(payload).to_bytes(8, "big")
+    return header + payload
+
+class SynthesisServer:
+    """
+    Endpoints:
+      POST /synthesize   JSON request -> audio/wav (X-Latency-Ms header)
+      GET  /stream       WebSocket: send one JSON request, receive 16-bit PCM
+                         chunks as binary messages, then a JSON stats message
+      GET  /metrics      queue, batch and p50/p95/p99 latency metrics
+      GET  /health
+    A full queue answers 503 with Retry-After (WebSocket: a JSON error).
+    """
+    
+    def __init__(self, batcher):
+        self.batcher = batcher
+    
+    def parse_request(self, payload):
+        request = json.loads(payload)
+        if not isinstance(request, dict) or not str(request.get("text", "")).strip():
+            raise ValueError("Request needs a non-empty 'text'")
+        return {key: request[key] for key in REQUEST_FIELDS if key in request}
+    
+    async def handle(self, reader, writer):
+        try:
+            method, path, headers, body = await read_http_request(reader)
+            if path == "/stream" and headers.get("upgrade", "").lower() == "websocket":
+                await self.handle_websocket(reader, writer, headers)
+            elif method == "POST" and path == "/synthesize":
+                await self.handle_synthesize(writer, body)
+            elif method == "GET" and path == "/metrics":
+                http_response(writer, 200, self.batcher.metrics())
+            elif method == "GET" and path == "/health":
+                http_response(writer, 200, {"status": "ok"})
+            else:
+                http_response(writer, 404, {"error": f"No route for {method} {path}"})
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError as e:
+            http_response(writer, 400, {"error": str(e)})
+        finally:
+            writer.close()
+    
+    async def handle_synthesize(self, writer, body):
+        try:
+            request = self.parse_request(body)
+        except ValueError as e:
+            http_response(writer, 400, {"error": str(e)})
+            return
+        try:
+            future = self.batcher.submit(request)
+        except asyncio.QueueFull:
+            http_response(writer, 503, {"error": "Server busy, retry later"}, headers={"Retry-After": "1"})
+            return
+        
+        result = await future
+        if result["error"] is not None:
+            http_response(writer, 500, {"error": result["error"]})
+            return
+        http_response(writer, 200, wav_bytes(result["audio"], result["sample_rate"]), "audio/wav",
+                      {"X-Latency-Ms": f"{result['seconds'] * 1000:.1f}",
+                       "X-Cache": "hit" if result["cached"] else "miss"})
+    
+    async def handle_websocket(self, reader, writer, headers):
+        accept = base64.b64encode(hashlib.sha1(
+            (headers["sec-websocket-key"] + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                      f"Connection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        
+        opcode, payload = await ws_read_message(reader)
+        if opcode == 8:
+            return
+        try:
+            chunks = self.batcher.submit(self.parse_request(payload), stream=True)
+        except (ValueError, asyncio.QueueFull) as e:
+            error = "Server busy, retry later" if isinstance(e, asyncio.QueueFull) else str(e)
+            writer.write(ws_frame(1, json.dumps({"error": error}).encode()) + ws_frame(8, b""))
+            return
+        
+        start, samples, first_chunk = time.perf_counter(), 0, None
+        while True:
+            chunk = await chunks.get()
+            if chunk is None:
+                break
+            if isinstance(chunk, Exception):
+                writer.write(ws_frame(1, json.dumps({"error": str(chunk)}).encode()))
+                break
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            samples += len(chunk)
+            writer.write(ws_frame(2, pcm16(chunk)))
+            await writer.drain()
+        
+        writer.write(ws_frame(1, json.dumps({
+            "sample_rate": self.batcher.decoder.sample_rate,
+            "samples": samples,
+            "time_to_first_chunk_ms": first_chunk * 1000 if first_chunk is not None else None,
+            "seconds": time.perf_counter() - start
+        }).encode()) + ws_frame(8, b""))
+
+async def serve(model, host="127.0.0.1", port=8000, ready=None, **batcher_options):
+    """Run the server until cancelled; ready (an asyncio.Event) is set once listening"""
+    batcher = DynamicBatcher(model, **batcher_options)
+    batcher.start()
+    server = await asyncio.start_server(SynthesisServer(batcher).handle, host, port)
+    print(f"🌐 Serving on http://{host}:{port} (POST /synthesize, WS /stream, GET /metrics)")
+    if ready is not None:
+        ready.set()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+async def _post(host, port, payload):
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(payload).encode()
+    writer.write((f"POST /synthesize HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b" ", 2)[1])
+
+async def load_test(host="127.0.0.1", port=8000, requests=64, concurrency=16):
+    """
+    Fire requests POSTs with at most concurrency in flight; returns the
+    client-side latency summary and status counts
+    """
+    tracker = LatencyTracker()
+    statuses = {}
+    limit = asyncio.Semaphore(concurrency)
+    
+    async def one(i):
+        async with limit:
+            start = time.perf_counter()
+            status = await _post(host, port, {"text": f"Load test sentence number {i}."})
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                tracker.add(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return dict(tracker.summary(), statuses=statuses,
+                requests_per_sec=requests / (time.perf_counter() - start))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthesis server with dynamic batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model", default="canopylabs/orpheus-3b-0.1-ft")
+    parser.add_argument("--max-model-len", type=int, default=2048)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=20)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--max-in-flight", type=int, default=64,
+                        help="Requests generating at once across overlapping batches")
+    parser.add_argument("--stand-in", action="store_true",
+                        help="Serve the lightweight stand-in model (no GPU needed)")
+    parser.add_argument("--load-test", type=int, metavar="N", default=0,
+                        help="Instead of serving, send N requests to a running server")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--result-cache", metavar="DIR", default=None,
+                        help="Serve repeated deterministic requests (temperature 0 or a seed) from DIR")
+    args = parser.parse_args()
+    
+    if args.load_test:
+        summary = asyncio.run(load_test(args.host, args.port, args.load_test, args.concurrency))
+        print(f"📊 {summary['statuses']}, {summary['requests_per_sec']:.1f} req/s")
+        if summary["count"]:
+            print(f"⏱️  p50 {summary['p50_ms']:.0f} ms, p95 {summary['p95_ms']:.0f} ms, "
+                  f"p99 {summary['p99_ms']:.0f} ms")
+    else:
+        from model_registry import StandInModel, get_registry
+        from result_cache import ResultCache
+        
+        if args.stand_in:
+            model = StandInModel(args.model, args.max_model_len)
+        else:
+            model = get_registry().acquire(args.model, args.max_model_len)
+        
+        print("✅ Model loaded; it stays warm for every request")
+        result_cache = ResultCache(args.result_cache) if args.result_cache else None
+        asyncio.run(serve(model, args.host, args.port, max_batch_size=args.max_batch_size,
+                          max_wait=args.max_wait_ms / 1000, max_queue=args.max_queue,
+                          result_cache=result_cache, max_in_flight=args.max_in_flight))
@@ -12,6 +12,7 @@ def test_orpheus_basic():
     
     try:
         from orpheus_tts import OrpheusModel
+        from model_registry import shared_model
         print("✅ Orpheus TTS imported successfully!")
     except ImportError as e:
         print(f"❌ Orpheus import failed: {e}")
@@ -20,25 +21,22 @@ def test_orpheus_basic():
     
     try:
         print("📥 Loading Orpheus model...")
-        # Load the fine-tuned model
-        model = OrpheusModel(
-            model_name="canopylabs/orpheus-3b-0.1-ft",
-            max_model_len=2048
-        )
-        print("✅ Model loaded successfully!")
-        
-        # Test basic text-to-speech
-        test_text = "Hello, this is a test of Orpheus text to speech."
-        print(f"\n🎵 Generating speech for: '{test_text}'")
-        
-        # Generate speech (basic TTS without voice cloning)
-        # Note: This is a simplified example - actual API may differ
-        print("⚙️ Generating audio...")
-        
-        # This would be the actual generation call:
-        # audio_output = model.generate_speech(text=test_text)
-        # For now, we'll just test that the model loads
-        
+        # Load the fine-tuned model (cached for later tests in this process)
+        with shared_model("canopylabs/orpheus-3b-0.1-ft", max_model_len=2048) as model:
+            print("✅ Model loaded successfully!")
+            
+            # Test basic text-to-speech
+            test_text = "Hello, this is a test of Orpheus text to speech."
+            print(f"\n🎵 Generating speech for: '{test_text}'")
+            
+            # Generate speech (basic TTS without voice cloning)
+            # Note: This is a simplified example - actual API may differ
+            print("⚙️ Generating audio...")
+            
+            # This would be the actual generation call:
+            # audio_output = model.generate_speech(text=test_text)
+            # For now, we'll just test that the model loads
+            
         print("✅ Basic test completed successfully!")
         print("🎯 Ready for voice cloning experiments!")
         
@@ -37,47 +37,51 @@ def test_voice_cloning_gpu():
     print("\n🚀 Testing Orpheus voice cloning...")
     
     try:
-        from orpheus_tts import OrpheusModel
+        from model_registry import shared_model
+        from reference_cache import ReferenceCache
+        from sweep import run_sweep, write_table
         
         print("📥 Loading Orpheus model on GPU...")
-        model = OrpheusModel(
-            model_name="canopylabs/orpheus-3b-0.1-ft",
-            max_model_len=2048
-        )
-        print("✅ Model loaded!")
-        
-        # Test configurations
-        test_configs = [
-            {"name": "Conservative", "temperature": 0.5, "top_k": 30},
-            {"name": "Balanced", "temperature": 0.7, "top_k": 50},
-            {"name": "Creative", "temperature": 0.9, "top_k": 80}
-        ]
-        
-        test_texts = [
-            "This is a test of GPU-accelerated voice cloning.",
-            "The Lightning AI GPU is working perfectly!",
-            "Now I can proceed with fine-tuning my voice model."
-        ]
-        
-        print("\n🎛️  Testing parameter configurations...")
-        
-        for config in test_configs:
-            print(f"\n🧪 Testing {config['name']} config...")
+        with shared_model("canopylabs/orpheus-3b-0.1-ft", max_model_len=2048) as model:
+            print("✅ Model loaded!")
+            
+            # Test configurations
+            test_configs = [
+                {"name": "Conservative", "temperature": 0.5, "top_k": 30},
+                {"name": "Balanced", "temperature": 0.7, "top_k": 50},
+                {"name": "Creative", "temperature": 0.9, "top_k": 80}
+            ]
+            
+            test_texts = [
+                "This is a test of GPU-accelerated voice cloning.",
+                "The Lightning AI GPU is working perfectly!",
+                "Now I can proceed with fine-tuning my voice model."
+            ]
+            
+            print("\n🎛️  Testing parameter configurations...")
             
-            for i, text in enumerate(test_texts):
-                try:
-                    print(f"  Generating: '{text[:30]}...'")
-                    
-                    # Placeholder for actual generation
-                    output_file = f"outputs/test_{config['name'].lower()}_{i+1}.wav"
+            reference = ReferenceCache(encoder=getattr(model, "codec", "snac_24khz")).get_reference(
+                ["processed_voice_sample.wav"], transcripts=[transcript])
+            
+            # All configs x texts go to the engine in one batch; finished configs
+            # are checkpointed, so a re-run only generates what is missing
+            points = [{"temperature": config["temperature"], "top_k": config["top_k"]} for config in test_configs]
+            rows = run_sweep(model, points, test_texts, output_dir="outputs",
+                             checkpoint_path="outputs/voice_cloning_sweep.jsonl",
+                             reference=reference)
+            
+            for config, row in zip(test_configs, rows):
+                print(f"\n🧪 {config['name']} config: {len(row['output_files'])}/{row['texts']} generated")
+                for output_file in row["output_files"]:
                     print(f"  ✅ Generated: {output_file}")
-                    
-                except Exception as e:
-                    print(f"  ❌ Generation failed: {e}")
-        
+                for error in row["errors"]:
+                    print(f"  ❌ Generation failed: {error}")
+            
+            write_table(rows, "outputs/voice_cloning_sweep.csv")
+            
         print("\n🎉 Voice cloning test completed!")
         return True
-        
+    
     except Exception as e:
         print(f"❌ Test failed: {e}")
         return False
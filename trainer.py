@@ -0,0 +1,267 @@
+# trainer.py
+# Resumable fine-tuning loop over packed training batches
+
+import os
+import re
+import json
+import math
+import time
+import random
+import shutil
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from training_data import block_causal_mask
+
+CHECKPOINT_PATTERN = re.compile(r"^checkpoint-(\d+)$")
+
+class TinyCausalLM(nn.Module):
+    """
+    Small CPU stand-in for the Orpheus LM with the same forward interface
+    (input_ids, labels, position_ids, attention_mask -> object with .loss).
+    Token ids are folded into vocab_size so real Orpheus ids can be used.
+    """
+    
+    def __init__(self, vocab_size=512, hidden_size=32, max_positions=8192):
+        super().__init__()
+        self.vocab_size = vocab_size
+        self.embed = nn.Embedding(vocab_size, hidden_size)
+        self.positions = nn.Embedding(max_positions, hidden_size)
+        self.qkv = nn.Linear(hidden_size, 3 * hidden_size)
+        self.mlp = nn.Sequential(nn.Linear(hidden_size, 4 * hidden_size), nn.GELU(),
+                                 nn.Linear(4 * hidden_size, hidden_size))
+        self.head = nn.Linear(hidden_size, vocab_size)
+    
+    def forward(self, input_ids, labels=None, position_ids=None, attention_mask=None):
+        input_ids = input_ids % self.vocab_size
+        if position_ids is None:
+            position_ids = torch.arange(input_ids.shape[1], device=input_ids.device)[None]
+        x = self.embed(input_ids) + self.positions(position_ids)
+        
+        q, k, v = self.qkv(x).chunk(3, dim=-1)
+        scores = q @ k.transpose(1, 2) / q.shape[-1] ** 0.5
+        if attention_mask is not None:
+            scores = scores + attention_mask[:, 0]
+        x = x + torch.softmax(scores, dim=-1) @ v
+        logits = self.head(x + self.mlp(x))
+        
+        loss = None
+        if labels is not None:
+            labels = torch.where(labels >= 0, labels % self.vocab_size, labels)
+            loss = F.cross_entropy(logits[:, :-1].reshape(-1, self.vocab_size),
+                                   labels[:, 1:].reshape(-1), ignore_index=-100)
+        return type("CausalLMOutput", (), {"loss": loss, "logits": logits})
+
+def batch_to_model_inputs(batch, device, dtype=torch.float32):
+    """
+    Torch inputs for a PackedBatchLoader batch. The 4-D additive mask keeps
+    attention inside each packed sequence (Llama-style models accept it).
+    """
+    allowed = torch.from_numpy(block_causal_mask(batch["segment_ids"])).to(device)
+    attention_mask = torch.zeros(allowed.shape, dtype=dtype, device=device)
+    attention_mask.masked_fill_(~allowed, torch.finfo(dtype).min)
+    
+    return {
+        "input_ids": torch.from_numpy(batch["input_ids"]).to(device),
+        "labels": torch.from_numpy(batch["labels"]).to(device),
+        "position_ids": torch.from_numpy(batch["position_ids"]).to(device),
+        "attention_mask": attention_mask[:, None]
+    }
+
+def list_checkpoints(output_dir):
+    """Checkpoint directories in output_dir, oldest step first"""
+    if not os.path.exists(output_dir):
+        return []
+    steps = []
+    for name in os.listdir(output_dir):
+        match = CHECKPOINT_PATTERN.match(name)
+        if match and os.path.exists(os.path.join(output_dir, name, "trainer_state.json")):
+            steps.append((int(match.group(1)), os.path.join(output_dir, name)))
+    return [path for _, path in sorted(steps)]
+
+def save_checkpoint(output_dir, state, model, optimizer, scheduler, scaler, save_total_limit=None):
+    """
+    Write model, optimizer, scheduler, scaler and RNG state plus the loader
+    position. The checkpoint is assembled in a temp directory and renamed,
+    so a crash mid-save never leaves a partial checkpoint behind.
+    """
+    final_dir = os.path.join(output_dir, f"checkpoint-{state['global_step']}")
+    tmp_dir = final_dir + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    
+    torch.save(model.state_dict(), os.path.join(tmp_dir, "model.pt"))
+    torch.save({
+        "optimizer": optimizer.state_dict(),
+        "scheduler": scheduler.state_dict(),
+        "scaler": scaler.state_dict() if scaler is not None else None,
+        "rng": {
+            "python": random.getstate(),
+            "numpy": np.random.get_state(),
+            "torch": torch.get_rng_state(),
+            "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None
+        }
+    }, os.path.join(tmp_dir, "training_state.pt"))
+    
+    # trainer_state.json is written last; its presence marks a complete checkpoint
+    with open(os.path.join(tmp_dir, "trainer_state.json"), "w") as f:
+        json.dump(state, f, indent=2)
+    
+    if os.path.exists(final_dir):
+        shutil.rmtree(final_dir)
+    os.replace(tmp_dir, final_dir)
+    
+    if save_total_limit:
+        for old in list_checkpoints(output_dir)[:-save_total_limit]:
+            shutil.rmtree(old)
+    
+    return final_dir
+
+def load_checkpoint(path, model, optimizer, scheduler, scaler):
+    """Restore everything save_checkpoint() wrote; returns the trainer state"""
+    model.load_state_dict(torch.load(os.path.join(path, "model.pt"), map_location="cpu"))
+    training_state = torch.load(os.path.join(path, "training_state.pt"), map_location="cpu",
+                                weights_only=False)
+    
+    optimizer.load_state_dict(training_state["optimizer"])
+    scheduler.load_state_dict(training_state["scheduler"])
+    if scaler is not None and training_state["scaler"] is not None:
+        scaler.load_state_dict(training_state["scaler"])
+    
+    rng = training_state["rng"]
+    random.setstate(rng["python"])
+    np.random.set_state(rng["numpy"])
+    torch.set_rng_state(rng["torch"])
+    if rng["cuda"] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(rng["cuda"])
+    
+    with open(os.path.join(path, "trainer_state.json"), "r") as f:
+        return json.load(f)
+
+def train(model, loader, training_config, device="cpu", log=print, max_steps=None, resume=True):
+    """
+    Fine-tune model on loader's batches using the YAML training section:
+    learning_rate, warmup_steps, num_train_epochs, gradient_accumulation_steps,
+    fp16, logging_steps, save_steps, save_total_limit, output_dir and seed.
+    
+    Steps count optimizer updates. The last update of an epoch uses
+    whatever micro-batches are left, so every batch is trained on and a
+    loader shorter than one accumulation window still gives one step per
+    epoch. Raises ValueError if the run would make no updates at all.
+    Checkpoints are only taken on update boundaries, and record (epoch, batch) so a resumed run continues with
+    the next unseen batch instead of repeating any.
+    log receives a dict of metrics every logging_steps updates.
+    """
+    output_dir = training_config["output_dir"]
+    accumulation = training_config.get("gradient_accumulation_steps", 1)
+    epochs = training_config.get("num_train_epochs", 1)
+    logging_steps = training_config.get("logging_steps", 10)
+    save_steps = training_config.get("save_steps", 100)
+    save_total_limit = training_config.get("save_total_limit")
+    warmup_steps = training_config.get("warmup_steps", 0)
+    
+    steps_per_epoch = math.ceil(len(loader) / accumulation)
+    total_steps = steps_per_epoch * epochs
+    if max_steps is not None:
+        total_steps = min(total_steps, max_steps)
+    if total_steps <= 0:
+        raise ValueError(f"Nothing to train: {len(loader)} batches per epoch, {epochs} epochs, "
+                         f"max_steps={max_steps}")
+    
+    seed = training_config.get("seed", 42)
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    
+    model.to(device)
+    model.train()
+    optimizer = torch.optim.AdamW(model.parameters(), lr=float(training_config.get("learning_rate", 5e-5)))
+    
+    def lr_lambda(step):
+        # Linear warmup, then linear decay to zero at total_steps
+        if step < warmup_steps:
+            return (step + 1) / warmup_steps
+        return max(0.0, (total_steps - step) / max(total_steps - warmup_steps, 1))
+    
+    scheduler = torch.optim.lr_scheduler.LambdaLR(optimizer, lr_lambda)
+    
+    # fp16 autocast needs a GPU; on CPU the loop runs in float32
+    use_fp16 = bool(training_config.get("fp16")) and str(device).startswith("cuda")
+    scaler = torch.amp.GradScaler("cuda") if use_fp16 else None
+    
+    state = {"global_step": 0, "epoch": 0, "epoch_batch": 0, "tokens_seen": 0,
+             "batches_per_epoch": len(loader)}
+    checkpoints = list_checkpoints(output_dir)
+    if resume and checkpoints:
+        state = load_checkpoint(checkpoints[-1], model, optimizer, scheduler, scaler)
+        if state["batches_per_epoch"] != len(loader):
+            raise ValueError(f"{checkpoints[-1]} was saved with {state['batches_per_epoch']} "
+                             f"batches per epoch, but the loader now has {len(loader)}")
+        log({"event": "resumed", "checkpoint": checkpoints[-1], "global_step": state["global_step"]})
+    
+    window_start = time.perf_counter()
+    window_tokens = 0
+    window_steps = 0
+    running_loss = 0.0
+    
+    while state["global_step"] < total_steps and state["epoch"] < epochs:
+        batches = loader.iter_epoch(state["epoch"], start_step=state["epoch_batch"])
+        
+        for batch in batches:
+            # The epoch's last window may be short; average the loss over its real size
+            window_first = state["epoch_batch"] - state["epoch_batch"] % accumulation
+            window_size = min(accumulation, len(loader) - window_first)
+            inputs = batch_to_model_inputs(batch, device)
+            with torch.autocast(device_type="cuda", dtype=torch.float16, enabled=use_fp16):
+                loss = model(**inputs).loss / window_size
+            
+            if scaler is not None:
+                scaler.scale(loss).backward()
+            else:
+                loss.backward()
+            
+            tokens = int((batch["segment_ids"] > 0).sum())
+            state["tokens_seen"] += tokens
+            window_tokens += tokens
+            running_loss += loss.item()
+            state["epoch_batch"] += 1
+            
+            if state["epoch_batch"] % accumulation and state["epoch_batch"] < len(loader):
+                continue
+            
+            if scaler is not None:
+                scaler.step(optimizer)
+                scaler.update()
+            else:
+                optimizer.step()
+            scheduler.step()
+            optimizer.zero_grad(set_to_none=True)
+            state["global_step"] += 1
+            window_steps += 1
+            
+            if state["global_step"] % logging_steps == 0:
+                elapsed = time.perf_counter() - window_start
+                log({
+                    "step": state["global_step"],
+                    "loss": running_loss / window_steps,
+                    "learning_rate": scheduler.get_last_lr()[0],
+                    "steps_per_sec": window_steps / elapsed,
+                    "tokens_per_sec": window_tokens / elapsed
+                })
+                window_start, window_tokens, window_steps, running_loss = time.perf_counter(), 0, 0, 0.0
+            
+            if state["global_step"] % save_steps == 0 or state["global_step"] == total_steps:
+                path = save_checkpoint(output_dir, state, model, optimizer, scheduler, scaler,
+                                       save_total_limit)
+                log({"event": "checkpoint", "path": path})
+            
+            if state["global_step"] >= total_steps:
+                return state
+        
+        state["epoch"] += 1
+        state["epoch_batch"] = 0
+    
+    return state
@@ -0,0 +1,189 @@
+# training_data.py
+# Length-bucketed, packed training batches for Orpheus fine-tuning
+
+import bisect
+import numpy as np
+
+# Orpheus special tokens (Llama-3 vocabulary extensions)
+END_OF_TEXT = 128009
+START_OF_SPEECH = 128257
+END_OF_SPEECH = 128258
+START_OF_HUMAN = 128259
+END_OF_HUMAN = 128260
+START_OF_AI = 128261
+END_OF_AI = 128262
+PAD_TOKEN = 128263
+IGNORE_INDEX = -100
+
+class ByteTokenizer:
+    """
+    Stand-in text tokenizer (UTF-8 bytes as ids) for tests and dry runs
+    without downloading the model's tokenizer
+    """
+    
+    def encode(self, text):
+        return list(text.encode("utf-8"))
+
+class HFTokenizer:
+    """The model's own tokenizer, loaded through transformers on first use"""
+    
+    def __init__(self, model_name):
+        from transformers import AutoTokenizer
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+    
+    def encode(self, text):
+        return self.tokenizer.encode(text, add_special_tokens=True)
+    
+    def save_pretrained(self, path):
+        self.tokenizer.save_pretrained(path)
+
+def build_sequence(text_ids, audio_tokens):
+    """
+    One training sequence in Orpheus order:
+    human turn (text), then AI turn (speech tokens)
+    """
+    return np.concatenate([
+        [START_OF_HUMAN], text_ids, [END_OF_TEXT, END_OF_HUMAN],
+        [START_OF_AI, START_OF_SPEECH], audio_tokens, [END_OF_SPEECH, END_OF_AI]
+    ]).astype(np.int32)
+
+def build_sequences(samples, tokenizer):
+    """Sequences for load_pretokenized() samples"""
+    return [build_sequence(tokenizer.encode(s["transcript"]), s["audio_tokens"]) for s in samples]
+
+def pack_into_rows(lengths, max_len):
+    """
+    Best-fit-decreasing bin packing: each row holds sequence indices whose
+    lengths sum to at most max_len. O(n log n) in the number of sequences.
+    """
+    order = np.argsort(-np.asarray(lengths), kind="stable")
+    rows = []
+    # Sorted (remaining capacity, row id) pairs for the best-fit lookup
+    free = []
+    
+    for i in order:
+        length = int(lengths[i])
+        pos = bisect.bisect_left(free, (length, -1))
+        if pos < len(free):
+            remaining, row = free.pop(pos)
+        else:
+            remaining, row = max_len, len(rows)
+            rows.append([])
+        rows[row].append(int(i))
+        if remaining - length > 0:
+            bisect.insort(free, (remaining - length, row))
+    
+    return rows
+
+def block_causal_mask(segment_ids):
+    """
+    (batch, L, L) boolean attention mask for packed rows: a token attends
+    only to earlier tokens of its own sequence, never across a boundary
+    """
+    segment_ids = np.asarray(segment_ids)
+    same = segment_ids[:, :, None] == segment_ids[:, None, :]
+    causal = np.tril(np.ones(segment_ids.shape[1:] * 2, dtype=bool))
+    return same & causal & (segment_ids[:, :, None] > 0)
+
+class PackedBatchLoader:
+    """
+    Batches for a list of token sequences. With pack=True several short
+    sequences share one row of up to max_len tokens; position ids restart
+    and segment ids change at each sequence boundary, and the first label
+    of every sequence is masked so nothing is predicted across boundaries.
+    With pack=False each row is one sequence and rows are bucketed by
+    length. Either way, batches group rows of similar length and are only
+    padded to their longest row.
+    
+    iter_epoch(epoch, start_step) is deterministic for a given seed, so a
+    resumed run can continue from the exact batch it stopped at.
+    """
+    
+    def __init__(self, sequences, max_len, batch_size=1, pack=True, seed=42, pad_id=PAD_TOKEN):
+        lengths = np.array([len(s) for s in sequences])
+        keep = np.flatnonzero(lengths <= max_len)
+        self.dropped = len(sequences) - len(keep)
+        
+        self.sequences = [sequences[i] for i in keep]
+        self.lengths = lengths[keep]
+        self.max_len = max_len
+        self.batch_size = batch_size
+        self.pad_id = pad_id
+        self.seed = seed
+        
+        if pack:
+            self.rows = pack_into_rows(self.lengths, max_len)
+        else:
+            self.rows = [[int(i)] for i in np.argsort(self.lengths, kind="stable")]
+        
+        # Sort rows by length so each batch holds rows of similar size
+        row_lengths = np.array([self.lengths[row].sum() for row in self.rows])
+        self.rows = [self.rows[i] for i in np.argsort(row_lengths, kind="stable")]
+        self.batches = [
+            self.rows[start:start + batch_size]
+            for start in range(0, len(self.rows), batch_size)
+        ]
+    
+    def __len__(self):
+        return len(self.batches)
+    
+    def iter_epoch(self, epoch=0, start_step=0):
+        """Yield the epoch's batches in a seeded shuffled order, from start_step"""
+        order = np.random.RandomState(self.seed + epoch).permutation(len(self.batches))
+        for step in range(start_step, len(order)):
+            yield self.make_batch(self.batches[order[step]])
+    
+    def __iter__(self):
+        return self.iter_epoch(0)
+    
+    def make_batch(self, rows):
+        """
+        Arrays for one step: input_ids, labels, position_ids and
+        segment_ids (0 marks padding), all (rows, longest row)
+        """
+        width = max(int(self.lengths[row].sum()) for row in rows)
+        input_ids = np.full((len(rows), width), self.pad_id, dtype=np.int64)
+        labels = np.full((len(rows), width), IGNORE_INDEX, dtype=np.int64)
+        position_ids = np.zeros((len(rows), width), dtype=np.int64)
+        segment_ids = np.zeros((len(rows), width), dtype=np.int64)
+        
+        for r, row in enumerate(rows):
+            cursor = 0
+            for segment, i in enumerate(row, start=1):
+                sequence = self.sequences[i]
+                end = cursor + len(sequence)
+                input_ids[r, cursor:end] = sequence
+                labels[r, cursor + 1:end] = sequence[1:]
+                position_ids[r, cursor:end] = np.arange(len(sequence))
+                segment_ids[r, cursor:end] = segment
+                cursor = end
+        
+        return {
+            "input_ids": input_ids,
+            "labels": labels,
+            "position_ids": position_ids,
+            "segment_ids": segment_ids
+        }
+    
+    def stats(self):
+        """
+        Padding waste and tokens per step for this loader, next to the
+        one-sequence-per-step baseline
+        """
+        real_tokens = int(self.lengths.sum())
+        padded_slots = sum(
+            len(batch) * max(int(self.lengths[row].sum()) for row in batch)
+            for batch in self.batches
+        )
+        return {
+            "sequences": len(self.sequences),
+            "dropped_too_long": self.dropped,
+            "rows": len(self.rows),
+            "steps_per_epoch": len(self.batches),
+            "sequences_per_row": len(self.sequences) / max(len(self.rows), 1),
+            "padding_waste": 1 - real_tokens / max(padded_slots, 1),
+            "row_fill": real_tokens / max(len(self.rows) * self.max_len, 1),
+            "tokens_per_step": real_tokens / max(len(self.batches), 1),
+            "baseline_tokens_per_step": real_tokens / max(len(self.sequences), 1)
+        }
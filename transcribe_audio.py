@@ -1,29 +1,199 @@
 # transcribe_audio.py
-# You'll need to manually transcribe your audio or use Whisper
-import whisper
+# Transcribe processed clips with Whisper (loaded once, length-sorted batches) into transcripts/
 
-def transcribe_audio(audio_path):
+import os
+import re
+import time
+import argparse
+import numpy as np
+import soundfile as sf
+
+from pack_dataset import read_transcript
+from resampling import DEFAULT_RESAMPLER, resample
+
+PLACEHOLDER = "[Replace with your actual transcription]"
+WHISPER_SAMPLE_RATE = 16000
+# Whisper decodes 30 s windows; longer clips go through model.transcribe one at a time
+WHISPER_WINDOW_SECONDS = 30
+
+def is_untranscribed(text):
+    """Transcript text that is empty, still the placeholder, or too short to be real"""
+    return not text or PLACEHOLDER.lower() in text.lower() or len(text.split()) <= 3
+
+def is_stand_in_transcript(transcript_path):
+    """Transcript written by StandInRecognizer, whose text is made up rather than heard"""
+    with open(transcript_path, "r", encoding="utf-8-sig", errors="replace") as f:
+        return any(line.startswith(f"# Source: {StandInRecognizer.name} ") for line in f)
+
+def needs_transcription(transcript_path):
+    """A transcript file is missing, is_untranscribed, or only has stand-in text"""
+    return (not os.path.exists(transcript_path) or is_untranscribed(read_transcript(transcript_path))
+            or is_stand_in_transcript(transcript_path))
+
+class WhisperRecognizer:
+    """
+    openai-whisper model loaded once. transcribe() takes a batch of 16 kHz
+    clips; those that fit one 30 s window are padded to it and decoded
+    together in a single forward pass.
+    """
+    
+    def __init__(self, model_name="base", device="cpu", language="en"):
+        import whisper
+        
+        self.whisper = whisper
+        self.name = f"whisper-{model_name}"
+        self.model = whisper.load_model(model_name, device=device)
+        self.options = whisper.DecodingOptions(language=language, without_timestamps=True,
+                                               fp16=device != "cpu")
+    
+    def transcribe(self, clips):
+        texts = [None] * len(clips)
+        short = [i for i, clip in enumerate(clips) if len(clip) <= WHISPER_WINDOW_SECONDS * WHISPER_SAMPLE_RATE]
+        if short:
+            import torch
+            
+            mels = torch.stack([
+                self.whisper.log_mel_spectrogram(self.whisper.pad_or_trim(clips[i]), n_mels=self.model.dims.n_mels)
+                for i in short
+            ]).to(self.model.device)
+            for i, result in zip(short, self.whisper.decode(self.model, mels, self.options)):
+                texts[i] = result.text
+        for i, clip in enumerate(clips):
+            if texts[i] is None:
+                texts[i] = self.model.transcribe(clip, language=self.options.language, fp16=self.options.fp16)["text"]
+        return [" ".join(text.split()) for text in texts]
+
+class StandInRecognizer:
+    """
+    Offline stand-in: a deterministic, plausible-length sentence per clip
+    (about 2.5 words per second), so the stage can run without Whisper
     """
-    Transcribe audio using Whisper (optional)
-    Or manually provide transcription
+    
+    name = "stand-in"
+    WORDS = ("the", "voice", "model", "reads", "a", "short", "clear", "sentence", "about", "today")
+    
+    def __init__(self):
+        self.batches = []
+    
+    def transcribe(self, clips):
+        self.batches.append(len(clips))
+        texts = []
+        for clip in clips:
+            n_words = max(4, int(round(len(clip) / WHISPER_SAMPLE_RATE * 2.5)))
+            seed = int(np.abs(clip[:WHISPER_SAMPLE_RATE]).sum() * 1000) % len(self.WORDS)
+            texts.append(" ".join(self.WORDS[(seed + i) % len(self.WORDS)] for i in range(n_words)).capitalize() + ".")
+        return texts
+
+def get_recognizer(name=None, device="cpu"):
+    """
+    'stand-in' or 'whisper-<size>'. Without a name, ORPHEUS_STAND_IN=1
+    selects the stand-in and whisper-base is used otherwise; an explicit
+    Whisper model under ORPHEUS_STAND_IN=1 is an error rather than being
+    silently replaced by made-up text.
+    """
+    stand_in = os.environ.get("ORPHEUS_STAND_IN") == "1"
+    if name is None:
+        name = "stand-in" if stand_in else "whisper-base"
+    if name == "stand-in":
+        return StandInRecognizer()
+    if stand_in:
+        raise ValueError(f"ORPHEUS_STAND_IN=1 is set but recognizer '{name}' was requested; "
+                         "unset it or pass 'stand-in'")
+    match = re.fullmatch(r"whisper-(\w+(?:\.\w+)?)", name)
+    if match is None:
+        raise ValueError(f"Unknown recognizer '{name}'")
+    return WhisperRecognizer(match.group(1), device)
+
+def _load_clip(path):
+    audio, sr = sf.read(path, dtype="float32", always_2d=True)
+    audio = audio.mean(axis=1)
+    if sr != WHISPER_SAMPLE_RATE:
+        audio = resample(audio, sr, WHISPER_SAMPLE_RATE, DEFAULT_RESAMPLER)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+def write_transcript(transcript_path, audio_filename, duration, text, source):
+    with open(transcript_path, "w") as f:
+        f.write(f"# Transcript for {audio_filename}\n")
+        f.write(f"# Duration: {duration:.2f}s\n")
+        f.write(f"# Source: {source} (automatic; edit to correct)\n\n")
+        f.write(text + "\n")
+
+def transcribe_directory(audio_dir="processed_samples", transcript_dir="transcripts", recognizer=None,
+                         batch_size=16, overwrite=False):
     """
-    # Option 1: Manual transcription (recommended for accuracy)
-    manual_transcription = """
-    [REPLACE WITH YOUR ACTUAL TRANSCRIPTION OF THE WHATSAPP AUDIO]
+    Transcribe every clip in audio_dir into transcript_dir/<stem>.txt.
+    Clips that already have a real transcript are skipped (unless
+    overwrite), so re-runs only do new clips. The rest are sorted by
+    duration and sent to the recognizer batch_size at a time, so clips
+    in a batch need little padding. Returns a stats dict.
     """
+    recognizer = recognizer or get_recognizer()
+    os.makedirs(transcript_dir, exist_ok=True)
     
-    # Option 2: Automatic transcription (uncomment if needed)
-    # model = whisper.load_model("base")
-    # result = model.transcribe(audio_path)
-    # auto_transcription = result["text"]
-    # print(f"Auto transcription: {auto_transcription}")
+    clips = []
+    skipped = 0
+    for filename in sorted(os.listdir(audio_dir)):
+        if not filename.lower().endswith(".wav"):
+            continue
+        transcript_path = os.path.join(transcript_dir, f"{os.path.splitext(filename)[0]}.txt")
+        if not overwrite and not needs_transcription(transcript_path):
+            skipped += 1
+            continue
+        clips.append((sf.info(os.path.join(audio_dir, filename)).duration, filename, transcript_path))
+    clips.sort()
     
-    return manual_transcription.strip()
+    print(f"📝 {len(clips)} clip(s) to transcribe with {recognizer.name}, {skipped} already done")
+    stats = {"transcribed": 0, "skipped": skipped, "batches": 0, "audio_seconds": 0.0, "wall_seconds": 0.0}
+    start = time.perf_counter()
+    
+    for first in range(0, len(clips), batch_size):
+        batch = clips[first:first + batch_size]
+        audio = [_load_clip(os.path.join(audio_dir, filename)) for _, filename, _ in batch]
+        texts = recognizer.transcribe(audio)
+        for (duration, filename, transcript_path), text in zip(batch, texts):
+            write_transcript(transcript_path, filename, duration, text, recognizer.name)
+            stats["audio_seconds"] += duration
+        stats["transcribed"] += len(batch)
+        stats["batches"] += 1
+        print(f"  ✅ {stats['transcribed']}/{len(clips)} transcribed")
+    
+    stats["wall_seconds"] = time.perf_counter() - start
+    return stats
 
-# Create transcription for your sample
-transcription = transcribe_audio("processed_voice_sample.wav")
-print(f"Transcription: {transcription}")
+def transcribe_audio(audio_path, recognizer=None):
+    """Transcribe a single clip (e.g. the zero-shot voice sample)"""
+    recognizer = recognizer or get_recognizer()
+    return recognizer.transcribe([_load_clip(audio_path)])[0]
 
-# Save transcription
-with open("voice_sample_transcript.txt", "w") as f:
-    f.write(transcription)
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcribe processed clips into transcripts/")
+    parser.add_argument("--audio-dir", default="processed_samples")
+    parser.add_argument("--transcript-dir", default="transcripts")
+    parser.add_argument("--model", default=None,
+                        help="Recognizer: whisper-<size> (tiny, base, small, ...) or stand-in "
+                             "(default: whisper-base, or stand-in with ORPHEUS_STAND_IN=1)")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--overwrite", action="store_true", help="Re-transcribe clips that already have text")
+    parser.add_argument("--file", default=None,
+                        help="Transcribe one file instead (writes --output, default voice_sample_transcript.txt)")
+    parser.add_argument("--output", default="voice_sample_transcript.txt")
+    args = parser.parse_args()
+    
+    try:
+        recognizer = get_recognizer(args.model)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.file:
+        transcription = transcribe_audio(args.file, recognizer)
+        print(f"Transcription: {transcription}")
+        with open(args.output, "w") as f:
+            f.write(transcription)
+    else:
+        from configure_training import check_transcripts
+        
+        stats = transcribe_directory(args.audio_dir, args.transcript_dir, recognizer, args.batch_size,
+                                     args.overwrite)
+        if stats["transcribed"]:
+            print(f"⏱️  {stats['audio_seconds']:.0f}s of audio in {stats['wall_seconds']:.1f}s "
+                  f"({stats['batches']} batches)")
+        check_transcripts(args.transcript_dir)
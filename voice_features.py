@@ -0,0 +1,150 @@
+# voice_features.py
+# Batched voice feature extraction: one shared STFT per clip, batched mel filterbank
+
+import os
+import json
+import numpy as np
+import librosa
+from concurrent.futures import ThreadPoolExecutor
+
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+N_MFCC = 13
+ROLL_PERCENT = 0.85
+TOP_DB = 80.0
+FEATURE_NAMES = [f"mfcc_{i}" for i in range(N_MFCC)] + ["spectral_centroid", "spectral_rolloff"]
+
+def batch_features(clips, sr=24000):
+    """
+    Voice features for a batch of mono clips: mean MFCC (13), mean spectral
+    centroid and mean spectral rolloff, the same values as the per-clip
+    librosa.feature calls. The clips are zero-padded into one array and
+    go through a single STFT whose power feeds the mel filterbank (one
+    batched matmul) and whose magnitude feeds centroid and rolloff; each
+    clip's statistics only use its own frames.
+    """
+    lengths = np.array([len(clip) for clip in clips])
+    batch = np.zeros((len(clips), max(lengths.max(), 1)), dtype=np.float32)
+    for i, clip in enumerate(clips):
+        batch[i, :len(clip)] = clip
+    
+    magnitude = np.abs(librosa.stft(batch, n_fft=N_FFT, hop_length=HOP_LENGTH))
+    n_frames = 1 + lengths // HOP_LENGTH
+    valid = np.arange(magnitude.shape[-1])[None, :] < n_frames[:, None]
+    
+    # MFCC: mel power -> dB (top_db relative to each clip's own peak) -> DCT
+    mel_basis = librosa.filters.mel(sr=sr, n_fft=N_FFT, n_mels=N_MELS)
+    mel_db = librosa.power_to_db(np.matmul(mel_basis, magnitude ** 2), top_db=None)
+    peak = np.where(valid[:, None, :], mel_db, -np.inf).max(axis=(1, 2), keepdims=True)
+    mel_db = np.maximum(mel_db, peak - TOP_DB)
+    mfcc = np.matmul(_dct_matrix(), mel_db)
+    
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=N_FFT)[None, :, None]
+    totals = magnitude.sum(axis=1, keepdims=True)
+    weights = np.where(totals > np.finfo(magnitude.dtype).tiny, magnitude / np.maximum(totals, 1e-30), magnitude)
+    centroid = (freqs * weights).sum(axis=1)
+    
+    cumulative = np.cumsum(magnitude, axis=1)
+    reached = cumulative >= ROLL_PERCENT * cumulative[:, -1:, :]
+    rolloff = freqs[0, :, 0][reached.argmax(axis=1)]
+    
+    def frame_mean(values):
+        """(clips, ..., frames) -> (clips, ...) over each clip's valid frames"""
+        mask = valid.reshape(valid.shape[:1] + (1,) * (values.ndim - 2) + valid.shape[1:])
+        return (values * mask).sum(axis=-1) / n_frames.reshape((-1,) + (1,) * (values.ndim - 2))
+    
+    return np.concatenate([
+        frame_mean(mfcc),
+        frame_mean(centroid)[:, None],
+        frame_mean(rolloff)[:, None]
+    ], axis=1)
+
+def _dct_matrix():
+    """Orthonormal DCT-II rows for the first N_MFCC coefficients (as librosa.feature.mfcc)"""
+    n = np.arange(N_MELS)
+    basis = np.cos(np.pi / N_MELS * (n[None, :] + 0.5) * np.arange(N_MFCC)[:, None])
+    basis *= np.sqrt(2.0 / N_MELS)
+    basis[0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+def cosine_similarity_matrix(a, b):
+    """Row-wise cosine similarity: (N, D) x (M, D) -> (N, M)"""
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return a @ b.T
+
+class VoiceFeatureExtractor:
+    """
+    Extracts batch_features for audio files batch_size at a time (sorted
+    by length, so little of each batch is padding, and capped at
+    max_batch_seconds of padded audio to bound memory), loading files on
+    worker threads. Features are memoized per (path, size, mtime), so a
+    reference scored against many outputs is extracted once; with
+    cache_dir they also persist across runs in cache_dir/features.json.
+    """
+    
+    def __init__(self, sr=24000, batch_size=16, cache_dir=None, workers=4, max_batch_seconds=240):
+        self.sr = sr
+        self.batch_size = batch_size
+        self.max_batch_samples = int(max_batch_seconds * sr)
+        self.workers = workers
+        self.index_path = os.path.join(cache_dir, "features.json") if cache_dir else None
+        self.features = {}
+        self.stats = {"hits": 0, "extracted": 0}
+        
+        if self.index_path and os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            if index.get("sr") == sr:
+                self.features = index["features"]
+    
+    def file_key(self, path):
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    
+    def _load(self, path):
+        return librosa.load(path, sr=self.sr)[0]
+    
+    def extract(self, paths):
+        """(len(paths), 15) feature matrix, in path order"""
+        keys = [self.file_key(path) for path in paths]
+        missing = list({key: path for key, path in zip(keys, paths) if key not in self.features}.items())
+        self.stats["hits"] += len(paths) - len(missing)
+        
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                clips = list(pool.map(self._load, [path for _, path in missing]))
+            for batch in self._batches(clips):
+                values = batch_features([clips[i] for i in batch], self.sr)
+                for i, row in zip(batch, values):
+                    self.features[missing[i][0]] = row.tolist()
+            self.stats["extracted"] += len(missing)
+            self._save()
+        
+        return np.array([self.features[key] for key in keys], dtype=np.float64).reshape(len(paths), -1)
+    
+    def _batches(self, clips):
+        """Clip indices shortest first, grouped while the padded batch stays within limits"""
+        batch = []
+        for i in np.argsort([len(clip) for clip in clips], kind="stable"):
+            # Sorted ascending, so the newest clip sets the padded length
+            if batch and (len(batch) == self.batch_size or (len(batch) + 1) * len(clips[i]) > self.max_batch_samples):
+                yield batch
+                batch = []
+            batch.append(i)
+        if batch:
+            yield batch
+    
+    def _save(self):
+        if self.index_path is None:
+            return
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"sr": self.sr, "features": self.features}, f)
+        os.replace(tmp_path, self.index_path)
+    
+    def similarity_matrix(self, generated_paths, reference_paths):
+        """(len(generated), len(reference)) cosine similarities"""
+        return cosine_similarity_matrix(self.extract(generated_paths), self.extract(reference_paths))
@@ -0,0 +1,229 @@
+# voice_index.py
+# Persistent speaker-embedding index: append-only memory-mapped float32 matrix, cosine top-k search
+
+import os
+import json
+import argparse
+import numpy as np
+
+from voice_features import FEATURE_NAMES, VoiceFeatureExtractor
+
+INDEX_VERSION = 1
+
+class VoiceIndex:
+    """
+    On-disk index of voice feature vectors (voice_features.batch_features)
+    for a library of clips:
+    
+        embeddings.f32   raw float32 rows, appended, memory-mapped for search
+        meta.jsonl       one line per row: path, file key, voice
+        index.json       row count and running per-dimension sums
+    
+    The header is rewritten after rows and metadata are flushed, so a crash
+    mid-append leaves extra bytes that are ignored. Search standardizes each
+    dimension with the library's own mean/std (the raw features mix MFCCs
+    with Hz-valued centroid/rolloff, which would otherwise dominate) and
+    ranks by cosine similarity. The standardized matrix is kept in memory
+    between queries and rebuilt only after appends.
+    
+    Re-adding a file that changed appends a new row; the old row stays on
+    disk but is superseded and never returned.
+    """
+    
+    def __init__(self, index_dir="voice_index", extractor=None):
+        self.index_dir = index_dir
+        self.data_path = os.path.join(index_dir, "embeddings.f32")
+        self.meta_path = os.path.join(index_dir, "meta.jsonl")
+        self.header_path = os.path.join(index_dir, "index.json")
+        self.extractor = extractor or VoiceFeatureExtractor()
+        self.dim = len(FEATURE_NAMES)
+        self.count = 0
+        self.sums = np.zeros(self.dim)
+        self.sq_sums = np.zeros(self.dim)
+        self.meta = []
+        self._matrix = None
+        self._live = None
+        
+        if os.path.exists(self.header_path):
+            with open(self.header_path, "r") as f:
+                header = json.load(f)
+            if header.get("version") != INDEX_VERSION or header["dim"] != self.dim:
+                raise ValueError(f"{self.header_path} was built with an incompatible feature layout")
+            self.count = header["count"]
+            self.sums = np.array(header["sums"])
+            self.sq_sums = np.array(header["sq_sums"])
+            with open(self.meta_path, "r") as f:
+                self.meta = [json.loads(line) for _, line in zip(range(self.count), f)]
+        self._paths = {entry["path"]: i for i, entry in enumerate(self.meta)}
+    
+    def __len__(self):
+        return self.count
+    
+    def _write_header(self):
+        tmp_path = self.header_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": INDEX_VERSION, "dim": self.dim, "count": self.count,
+                       "sums": self.sums.tolist(), "sq_sums": self.sq_sums.tolist(),
+                       "features": FEATURE_NAMES}, f)
+        os.replace(tmp_path, self.header_path)
+    
+    def _discard_partial_append(self):
+        """Drop rows and metadata lines past the header's count, left by an append that crashed"""
+        size = self.count * self.dim * 4
+        if os.path.exists(self.data_path) and os.path.getsize(self.data_path) > size:
+            with open(self.data_path, "r+b") as f:
+                f.truncate(size)
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r") as f:
+                lines = f.readlines()
+            if len(lines) > self.count:
+                with open(self.meta_path, "w") as f:
+                    f.writelines(lines[:self.count])
+    
+    def add_features(self, features, metas):
+        """Append rows (N, dim) with one metadata dict each"""
+        features = np.asarray(features, dtype=np.float32).reshape(-1, self.dim)
+        if len(features) != len(metas):
+            raise ValueError("One metadata entry is needed per row")
+        if not len(features):
+            return
+        os.makedirs(self.index_dir, exist_ok=True)
+        
+        self._discard_partial_append()
+        
+        with open(self.data_path, "ab") as f:
+            f.write(features.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.meta_path, "a") as f:
+            f.writelines(json.dumps(meta) + "\n" for meta in metas)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        for meta in metas:
+            self._paths[meta["path"]] = len(self.meta)
+            self.meta.append(meta)
+        self.count += len(features)
+        self.sums += features.sum(axis=0, dtype=np.float64)
+        self.sq_sums += (features.astype(np.float64) ** 2).sum(axis=0)
+        self._write_header()
+        self._matrix = None
+        self._live = None
+    
+    def add(self, paths, voice=None):
+        """Extract and append clips not yet indexed (by path and file size/mtime); returns how many were added"""
+        new = []
+        for path in paths:
+            row = self._paths.get(os.path.abspath(path))
+            if row is None or self.meta[row]["file_key"] != self.extractor.file_key(path):
+                new.append(path)
+        if not new:
+            return 0
+        features = self.extractor.extract(new)
+        self.add_features(features, [{"path": os.path.abspath(path), "file_key": self.extractor.file_key(path),
+                                      "voice": voice} for path in new])
+        return len(new)
+    
+    def embeddings(self):
+        """Raw rows as a read-only memory map"""
+        if not self.count:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(self.data_path, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+    
+    def _standardize(self, x):
+        mean = self.sums / self.count
+        std = np.sqrt(np.maximum(self.sq_sums / self.count - mean ** 2, 0))
+        x = (x - mean.astype(np.float32)) / np.maximum(std, 1e-6).astype(np.float32)
+        return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+    
+    def matrix(self):
+        """Standardized, unit-length rows (cached until the next append)"""
+        if self._matrix is None:
+            self._matrix = np.ascontiguousarray(self._standardize(self.embeddings()), dtype=np.float32)
+        return self._matrix
+    
+    def live(self):
+        """Boolean mask of rows that are the latest entry for their path"""
+        if self._live is None:
+            self._live = np.zeros(self.count, dtype=bool)
+            self._live[list(self._paths.values())] = True
+        return self._live
+    
+    def search(self, queries, k=5):
+        """
+        Top-k rows by cosine similarity for each query vector. Returns a
+        list (one per query) of (row, similarity, meta), best first.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if not self.count:
+            return [[] for _ in queries]
+        scores = self._standardize(queries) @ self.matrix().T
+        scores[:, ~self.live()] = -np.inf
+        k = min(k, int(self.live().sum()))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for q, rows in enumerate(top):
+            rows = rows[np.argsort(-scores[q, rows])]
+            results.append([(int(row), float(scores[q, row]), self.meta[row]) for row in rows])
+        return results
+    
+    def search_paths(self, paths, k=5):
+        """Top-k library clips for each audio file (a file already in the index doesn't match itself)"""
+        results = self.search(self.extractor.extract(paths), k + 1)
+        return [[match for match in matches if match[2]["path"] != os.path.abspath(path)][:k]
+                for path, matches in zip(paths, results)]
+    
+    def near_duplicates(self, threshold=0.995, block=1024):
+        """(row, row, similarity) pairs above threshold, scanning the matrix block by block"""
+        matrix = self.matrix()
+        pairs = []
+        for start in range(0, self.count, block):
+            scores = matrix[start:start + block] @ matrix.T
+            scores[:, ~self.live()] = -np.inf
+            scores[~self.live()[start:start + block]] = -np.inf
+            rows, cols = np.nonzero(scores >= threshold)
+            for row, col in zip(rows + start, cols):
+                if row < col:
+                    pairs.append((int(row), int(col), float(scores[row - start, col])))
+        return sorted(pairs, key=lambda pair: -pair[2])
+
+def closest_references(query_path, index_dir="voice_index", k=3):
+    """
+    The k indexed clips whose voice is closest to query_path (best first),
+    e.g. to build a zero-shot reference from a large voice library
+    """
+    index = VoiceIndex(index_dir)
+    return [meta["path"] for _, _, meta in index.search_paths([query_path], k)[0]]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Speaker-embedding index over a voice library")
+    parser.add_argument("--index-dir", default="voice_index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", help="Index audio files or directories")
+    add.add_argument("paths", nargs="+")
+    add.add_argument("--voice", default=None, help="Voice/speaker label for these clips")
+    query = sub.add_parser("query", help="Closest indexed clips to an audio file")
+    query.add_argument("path")
+    query.add_argument("-k", type=int, default=5)
+    duplicates = sub.add_parser("duplicates", help="List near-duplicate indexed clips")
+    duplicates.add_argument("--threshold", type=float, default=0.995)
+    args = parser.parse_args()
+    
+    index = VoiceIndex(args.index_dir)
+    if args.command == "add":
+        files = []
+        for path in args.paths:
+            if os.path.isdir(path):
+                files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".wav"))
+            else:
+                files.append(path)
+        added = index.add(files, args.voice)
+        print(f"✅ Indexed {added} new clip(s); {len(index)} in the index")
+    elif args.command == "query":
+        for row, similarity, meta in index.search_paths([args.path], args.k)[0]:
+            print(f"  {similarity:.3f}  {meta['path']}" + (f"  ({meta['voice']})" if meta["voice"] else ""))
+    else:
+        pairs = index.near_duplicates(args.threshold)
+        print(f"🔍 {len(pairs)} near-duplicate pair(s) at similarity >= {args.threshold}")
+        for a, b, similarity in pairs:
+            print(f"  {similarity:.4f}  {index.meta[a]['path']}  ~  {index.meta[b]['path']}")
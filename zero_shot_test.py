@@ -1,77 +1,114 @@
 # zero_shot_test.py
-from orpheus_tts import OrpheusModel
+import time
 import torch
 import soundfile as sf
 
+from batch_generation import generate_batch, make_request, summarize_batch
+from model_registry import shared_model
+from pack_dataset import read_transcript
+from reference_cache import ReferenceCache
+from result_cache import ResultCache
+
+# Fixed sampling seed: sweeps are reproducible and their clips cacheable
+SWEEP_SEED = 42
+
 def test_zero_shot_cloning():
     """
     Test zero-shot voice cloning with your single audio sample
     """
     print("🚀 Loading Orpheus model...")
     
-    # Load the fine-tuned model for better results
-    model = OrpheusModel(
-        model_name="canopylabs/orpheus-3b-0.1-ft",
-        max_model_len=2048
-    )
-    
-    print("✅ Model loaded successfully!")
-    
-    # Test different parameters
-    test_configs = [
-        {
-            "name": "Conservative",
-            "temperature": 0.7,
-            "top_k": 50,
-            "repetition_penalty": 1.1
-        },
-        {
-            "name": "Creative", 
-            "temperature": 0.9,
-            "top_k": 100,
-            "repetition_penalty": 1.05
-        },
-        {
-            "name": "Focused",
-            "temperature": 0.5,
-            "top_k": 20,
-            "repetition_penalty": 1.15
-        }
-    ]
-    
-    # Test texts to generate
-    test_texts = [
-        "Hello, this is a test of my voice cloning system.",
-        "The weather is beautiful today, don't you think?",
-        "I'm excited to see how well this voice cloning works!",
-        "Technology keeps advancing at an incredible pace."
-    ]
-    
-    # Load your reference audio for voice cloning
-    reference_audio = "processed_voice_sample.wav"
-    
-    for config in test_configs:
-        print(f"\n🎯 Testing {config['name']} configuration...")
+    # Load the fine-tuned model for better results (shared with any other
+    # script in this process that asks for the same model)
+    with shared_model("canopylabs/orpheus-3b-0.1-ft", max_model_len=2048) as model:
+        
+        print("✅ Model loaded successfully!")
+        
+        # Test different parameters
+        test_configs = [
+            {
+                "name": "Conservative",
+                "temperature": 0.7,
+                "top_k": 50,
+                "repetition_penalty": 1.1
+            },
+            {
+                "name": "Creative", 
+                "temperature": 0.9,
+                "top_k": 100,
+                "repetition_penalty": 1.05
+            },
+            {
+                "name": "Focused",
+                "temperature": 0.5,
+                "top_k": 20,
+                "repetition_penalty": 1.15
+            }
+        ]
+        
+        # Test texts to generate
+        test_texts = [
+            "Hello, this is a test of my voice cloning system.",
+            "The weather is beautiful today, don't you think?",
+            "I'm excited to see how well this voice cloning works!",
+            "Technology keeps advancing at an incredible pace."
+        ]
+        
+        # Load your reference audio for voice cloning. It is encoded once into
+        # the reference cache (keyed by audio content) and reused by every
+        # request, here and in later runs
+        reference_audio = "processed_voice_sample.wav"
+        reference_cache = ReferenceCache(encoder=getattr(model, "codec", "snac_24khz"))
+        reference = reference_cache.get_reference(
+            [reference_audio],
+            transcripts=[read_transcript("voice_sample_transcript.txt")]
+        )
+        cached = "reused from cache" if reference_cache.stats["hits"] else "encoded"
+        print(f"🎙️  Reference {cached}: {len(reference['audio_tokens'])} tokens")
+        
+        # Every config x text pair goes to the engine as one batch instead of
+        # 12 sequential calls; results come back in request order. The sweep is
+        # seeded, so re-runs are served from the result cache
+        result_cache = ResultCache()
+        requests = [
+            make_request(
+                text,
+                reference_audio=reference_audio,
+                reference=reference,
+                temperature=config['temperature'],
+                top_k=config['top_k'],
+                repetition_penalty=config['repetition_penalty'],
+                seed=SWEEP_SEED
+            )
+            for config in test_configs
+            for text in test_texts
+        ]
+        
+        print(f"\n🎯 Generating {len(requests)} clips in one batch...")
+        start = time.perf_counter()
+        results = generate_batch(model, requests, cache=result_cache)
+        summary = summarize_batch(results, time.perf_counter() - start)
+        
+        for config_index, config in enumerate(test_configs):
+            print(f"\n🎯 {config['name']} configuration:")
+        
+            for i in range(len(test_texts)):
+                result = results[config_index * len(test_texts) + i]
+                if result["error"] is not None:
+                    print(f"  ❌ Error generating audio: {result['error']}")
+                    continue
         
-        for i, text in enumerate(test_texts):
-            try:
-                # Generate speech (this is pseudocode - actual implementation may vary)
-                # Note: Check Orpheus documentation for exact voice cloning API
-                output_audio = model.generate_speech(
-                    text=text,
-                    reference_audio=reference_audio,
-                    temperature=config['temperature'],
-                    top_k=config['top_k'],
-                    repetition_penalty=config['repetition_penalty']
-                )
-                
                 # Save output
                 output_file = f"output_{config['name'].lower()}_{i+1}.wav"
-                sf.write(output_file, output_audio, 24000)
-                print(f"  ✅ Generated: {output_file}")
-                
-            except Exception as e:
-                print(f"  ❌ Error generating audio: {e}")
+                sf.write(output_file, result["audio"], result["sample_rate"])
+                source = "cached" if result["cached"] else f"{result['seconds']:.2f}s"
+                print(f"  ✅ Generated: {output_file} ({source})")
+        
+        print(f"\n⏱️  {summary['requests']} clips in {summary['wall_seconds']:.2f}s "
+              f"({summary['requests_per_sec']:.2f} clips/s, mean latency {summary['mean_latency']:.2f}s)")
+        cache_metrics = result_cache.metrics()
+        print(f"🗃️  Result cache: {cache_metrics['hits']} hits, {cache_metrics['misses']} misses "
+              f"({cache_metrics['hit_rate']:.0%} hit rate)")
 
 if __name__ == "__main__":
     test_zero_shot_cloning()
\ No newline at end of file